@@ -4,17 +4,27 @@ initializing a terminal view
 """
 
 import os
-import threading
 import time
 
 import sublime
 import sublime_plugin
 
 from . import sublime_terminal_buffer
+from . import emulator_worker
 from . import linux_pty
+from . import io_hub
+from . import output_ring
 from . import utils
 
 
+# Max number of bytes of shell output fed to the terminal emulator at once
+FLOOD_BATCH_SIZE = 2**14
+
+# Shell output buffered between the I/O thread and the parser thread. The
+# shell is only held back once this is full.
+OUTPUT_RING_SIZE = 2**22
+
+
 class TerminalViewManager():
     """
     A manager to control all TerminalView instances so they can be looked up
@@ -117,16 +127,31 @@ class TerminalView:
         self._cmd = cmd
         self._cwd = cwd
         self._keep_open = keep_open
-
-        # Start the underlying shell
-        self._shell = linux_pty.LinuxPty(self._cmd.split(), self._cwd)
+        settings = sublime.load_settings('TerminalView.sublime-settings')
+
+        # Start the underlying shell, in a worker process together with its
+        # terminal emulator if enabled
+        term_emulator = None
+        if settings.get("terminal_view_worker_process", False) and emulator_worker.available():
+            python = settings.get("terminal_view_worker_python", None)
+            options = emulator_worker.worker_options(settings)
+            try:
+                self._shell = emulator_worker.EmulatorWorker(self._cmd.split(), self._cwd,
+                                                             options, python)
+                term_emulator = self._shell
+            except ValueError as e:
+                print("TerminalView: Failed to start worker process ({}). "
+                      "Running the terminal in process.".format(e))
+        if term_emulator is None:
+            self._shell = linux_pty.LinuxPty(self._cmd.split(), self._cwd)
         self._shell_is_running = True
 
         # Initialize the sublime view
         self._terminal_buffer = \
-            sublime_terminal_buffer.SublimeTerminalBuffer(self.view, title, syntax)
+            sublime_terminal_buffer.SublimeTerminalBuffer(self.view, title, syntax, term_emulator)
         self._terminal_buffer.set_keypress_callback(self.keypress_callback)
         self._terminal_buffer_is_open = True
+        self._view_closed = False
         self._terminal_rows = 0
         self._terminal_columns = 0
 
@@ -139,8 +164,10 @@ class TerminalView:
         # Register the terminal view instance in the manager
         TerminalViewManager.register(self.view.id(), self)
 
-        # Start the main loop
-        threading.Thread(target=self._main_update_loop).start()
+        # Let the shared I/O thread service the shell from now on
+        io_hub.get_hub().set_max_fps(settings.get("terminal_view_max_fps", 30))
+        self._start_time = time.time()
+        self._start_output_pipeline()
 
     def keypress_callback(self, key, ctrl=False, alt=False, shift=False,
                           meta=False, app_mode=False):
@@ -159,52 +186,154 @@ class TerminalView:
     def send_string_to_shell(self, string):
         self._shell.send_string(string)
 
-    def _main_update_loop(self):
-        """
-        This is the main update function. It attempts to run at a certain number
-        of frames per second, and keeps input and output synchronized.
-        """
-        # 30 frames per second should be responsive enough
-        ideal_delta = 1.0 / 30.0
-        current = time.time()
-        start_time = current
-        while True:
-            self._poll_shell_output()
-            self._terminal_buffer.update_view()
-            self._resize_screen_if_needed()
-            if not self._shell.is_running():
-                self._poll_shell_output()
-                break
+    def fileno(self):
+        """
+        The fd the I/O hub waits on for shell output
+        """
+        return self._shell.fileno()
 
-            if not self._terminal_buffer.is_open():
-                break
+    def on_readable(self):
+        """
+        Called by the I/O hub when the shell has output. Returns False once the
+        shell closed its output.
+        """
+        if self._output_ring is None:
+            # The worker process did the reading and parsing already
+            self._shell.receive_frames()
+            return not self._shell.output_closed()
 
-            # We use hard sleep here instead of any fancy timeout on the polling
-            # to avoid excessive amounts of updates. When you hit enter for
-            # example, the shell sends 2 bytes first (\r\n) and then the new
-            # prompt. We do not want to trigger two updates in this case as the
-            # bottom line of terminal will appear to blink quickly.
-            previous = current
-            current = time.time()
-            actual_delta = current - previous
-            time_left = ideal_delta - actual_delta
-            if time_left > 0.0:
-                time.sleep(time_left)
+        self._read_shell_output()
+        return not self._shell.output_closed() and not self._output_ring.closed()
+
+    def on_frame(self):
+        """
+        Called by the I/O hub when there was shell output. We do not update the
+        view on every read to avoid excessive amounts of updates. When you hit
+        enter for example, the shell sends 2 bytes first (\\r\\n) and then the
+        new prompt. We do not want to trigger two updates in this case as the
+        bottom line of terminal will appear to blink quickly.
+        """
+        self._terminal_buffer.update_view()
+        self._resize_screen_if_needed()
+
+    def on_tick(self):
+        """
+        Called by the I/O hub when woken up, a couple of times per second while
+        idle and more often while the shell is exiting. Returns False when the
+        terminal is done.
+        """
+        self._terminal_buffer.update_view()
+        self._resize_screen_if_needed()
+        if self._view_closed or not self._terminal_buffer.is_open():
+            if self._output_ring is not None:
+                self._output_ring.close(discard=True)
+        elif not self._shell.is_running():
+            # The output written before the shell exited is still shown. When
+            # the ring is full the rest is read once the parser made room.
+            if self._output_ring is not None:
+                if self._shell.pending_output() > 0:
+                    self._read_shell_output()
+                    if self._shell.pending_output() > 0:
+                        return True
+                self._output_ring.close()
+        else:
+            return True
+
+        if self._output_ring is not None and not self._output_parsed:
+            # The parser wakes us up once it is done
+            return True
+
+        if self._output_ring is not None:
+            utils.ConsoleLogger.log("Shell output stats: %s" % (self._output_ring.stats(), ))
+        utils.ConsoleLogger.log("Frame stats: %s" % (self._terminal_buffer.frame_stats(), ))
 
         # Notify user that cmd has exitted
-        run_time = time.time() - start_time
+        run_time = time.time() - self._start_time
         self._show_close_message_in_terminal(run_time)
         self._stop()
+        return False
 
-    def _poll_shell_output(self, timeout=0):
+    def wake(self):
+        """
+        Have the I/O hub check on the terminal, e.g. for a resize
         """
-        Poll the output of the shell
+        io_hub.get_hub().wake(self)
+
+    def view_closed(self):
         """
-        max_read_size = 2**12
-        data = self._shell.receive_output(max_read_size, timeout=timeout)
-        if data is not None:
-            utils.ConsoleLogger.log("Got %u bytes of data from shell" % (len(data), ))
+        Called when the view is closed to stop the terminal
+        """
+        self._view_closed = True
+        self.wake()
+
+    def _start_output_pipeline(self):
+        """
+        The shell output goes through three stages, so a slow stage does not
+        hold back the others:
+
+            reader - the I/O hub reads the shell output into the output ring
+            parser - the parser thread feeds the ring to the emulator
+            render - the I/O hub renders the latest state of the emulator
+
+        Like the I/O thread, the parser thread is shared by all terminals. The
+        shell is only held back when the ring is full. A terminal running
+        in a worker process does the reading and parsing there, the I/O hub
+        only receives its frames.
+        """
+        hub = io_hub.get_hub()
+        if isinstance(self._shell, emulator_worker.EmulatorWorker):
+            self._output_ring = None
+            hub.register(self)
+            return
+
+        parser = output_ring.get_parser()
+        self._output_parsed = False
+        self._output_ring = output_ring.OutputRing(
+            OUTPUT_RING_SIZE,
+            pause_producer=lambda: hub.pause_reading(self),
+            resume_producer=lambda: hub.resume_reading(self),
+            notify_consumer=lambda: parser.notify(self._output_ring))
+        parser.register(self._output_ring, self)
+        hub.register(self)
+
+    def _read_shell_output(self):
+        """
+        Reader stage, move all output the shell has right away to the ring
+        """
+        buffers = self._output_ring.writable_views()
+        if not buffers:
+            return
+
+        size = self._shell.receive_output_into(buffers)
+        if size > 0:
+            utils.ConsoleLogger.log("Got %u bytes of data from shell" % (size, ))
+            self._output_ring.commit_write(size)
+
+    def parse(self, buffers):
+        """
+        Parser stage, called by the parser thread to feed a batch of the
+        output in the ring to the emulator. Rendering happens in the I/O
+        thread, which only draws the latest state so frames in between are
+        skipped when the output floods in. A frame the I/O thread asked for
+        while a batch was fed is taken by the parser.
+        """
+        size = 0
+        for data in buffers:
+            data = data[:FLOOD_BATCH_SIZE - size]
             self._terminal_buffer.insert_data(data)
+            size += len(data)
+            if size == FLOOD_BATCH_SIZE:
+                break
+
+        self._output_ring.commit_read(size)
+        io_hub.get_hub().request_frame(self)
+
+    def parsed(self):
+        """
+        Called by the parser thread once the ring is closed and drained
+        """
+        self._output_parsed = True
+        io_hub.get_hub().wake(self)
 
     def _resize_screen_if_needed(self):
         """
@@ -275,6 +404,24 @@ class ProjectSwitchWatcher(sublime_plugin.EventListener):
         restart_terminal_view_session(view)
 
 
+class TerminalViewWatcher(sublime_plugin.EventListener):
+    """
+    The I/O hub only checks on idle terminals a couple of times per second, so
+    let it know right away when something happened to a terminal view that it
+    has to react to
+    """
+    def on_activated(self, view):
+        # The view may have been resized while it was in the background
+        terminal_view = TerminalViewManager.load_from_id(view.id())
+        if terminal_view is not None:
+            terminal_view.wake()
+
+    def on_close(self, view):
+        terminal_view = TerminalViewManager.load_from_id(view.id())
+        if terminal_view is not None:
+            terminal_view.view_closed()
+
+
 def restart_terminal_view_session(view):
     settings = view.settings()
     if settings.has("terminal_view_activate_args"):
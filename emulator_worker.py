@@ -0,0 +1,599 @@
+"""
+Optional mode that runs the shell of a terminal view together with its terminal
+emulator in a worker process. Parsing a flood of shell output then no longer
+competes with the editor for the GIL of the plugin host. The worker writes the
+text and colors of the changed screen lines into a shared memory grid and only
+sends the line numbers, scrolls and cursor of each frame over a pipe, the
+plugin only maps the grid and renders.
+"""
+import shutil
+import struct
+import threading
+import time
+
+try:
+    import multiprocessing
+    from multiprocessing import shared_memory
+except ImportError:
+    # Shared memory needs Python 3.8, ST3 embeds Python 3.3 so there
+    # terminals always run in the plugin host
+    shared_memory = None
+
+from . import io_hub
+from . import linux_pty
+from . import pyte_terminal_emulator
+from . import utils
+
+
+# Max number of bytes of shell output the worker parses before handling the
+# messages of the plugin again
+BATCH_SIZE = 2**14
+
+# Max time to wait for the worker to show the output fed to it by the plugin
+FLUSH_TIMEOUT = 1.0
+
+
+def available():
+    """
+    Check if terminals can run in a worker process with this Python
+    """
+    return shared_memory is not None
+
+
+def worker_options(settings):
+    """
+    The settings the worker needs, it can not load them itself
+    """
+    return {
+        "history": settings.get("terminal_view_scroll_history", 0),
+        "history_mb": settings.get("terminal_view_scroll_history_mb", 16),
+        "history_spill": settings.get("terminal_view_scroll_history_spill", False),
+        "ratio": settings.get("terminal_view_scroll_ratio", 0.5),
+        "parser": settings.get("terminal_view_parser", "vt500"),
+        "colors": settings.get("terminal_view_show_colors", False),
+        "max_fps": settings.get("terminal_view_max_fps", 30),
+        "debug": settings.get("terminal_view_print_debug", False),
+    }
+
+
+# Number of distinct colors a grid can refer to, the index of a color is a 16
+# bit number
+MAX_COLORS = 0x10000
+
+
+def _row_size(width):
+    # Size of the text, the text, number of color fields, the color fields
+    return 4 + 4 * width + 2 + 6 * width
+
+
+class ScreenGrid():
+    """
+    Screen lines in shared memory. Every row holds the size of the line in
+    bytes and the line encoded as UTF-32, followed by the number of colored
+    fields of the line and the fields as (start, length, color) 16 bit
+    numbers, so any line can be read without decoding the others.
+
+    The color of a field is an index into a table of (bg, fg) colors, which is
+    only ever appended to. The worker sends the colors it added along with
+    each frame (see take_new_colors), the table carries over to the next grid
+    when the grid is replaced.
+    """
+    def __init__(self, shm, rows, width, colors=None):
+        self._shm = shm
+        self._rows = rows
+        self._width = width
+        self._row_size = _row_size(width)
+        self._colors = [] if colors is None else colors
+        self._color_indices = dict((color, index) for index, color in enumerate(self._colors))
+        self._new_colors = []
+
+    @classmethod
+    def create(cls, rows, width, colors=None):
+        """
+        Allocate a grid of rows lines of up to width characters, using the
+        color table of the grid it replaces
+        """
+        shm = shared_memory.SharedMemory(create=True, size=rows * _row_size(width))
+        return cls(shm, rows, width, colors)
+
+    @classmethod
+    def attach(cls, name, rows, width, colors=None):
+        """
+        Map a grid created by another process
+        """
+        return cls(shared_memory.SharedMemory(name), rows, width, colors)
+
+    def name(self):
+        return self._shm.name
+
+    def rows(self):
+        return self._rows
+
+    def width(self):
+        return self._width
+
+    def colors(self):
+        return self._colors
+
+    def write_line(self, row, text, line_colors=None):
+        """
+        Write a line and its color map, as in the color map of a frame
+        """
+        data = text.encode("utf-32-le")[:4 * self._width]
+        offset = row * self._row_size
+        struct.pack_into("<I", self._shm.buf, offset, len(data))
+        self._shm.buf[offset + 4:offset + 4 + len(data)] = data
+
+        fields = []
+        if line_colors:
+            for start, field in sorted(line_colors.items())[:self._width]:
+                fields += (start, field["field_length"], self._color_index(field["color"]))
+        struct.pack_into("<%uH" % (1 + len(fields)), self._shm.buf,
+                         offset + 4 + 4 * self._width, len(fields) // 3, *fields)
+
+    def read_line(self, row):
+        offset = row * self._row_size
+        (size, ) = struct.unpack_from("<I", self._shm.buf, offset)
+        return str(self._shm.buf[offset + 4:offset + 4 + size], "utf-32-le")
+
+    def read_colors(self, row):
+        """
+        Read the color map of a line, as in the color map of a frame
+        """
+        offset = row * self._row_size + 4 + 4 * self._width
+        (count, ) = struct.unpack_from("<H", self._shm.buf, offset)
+        fields = struct.unpack_from("<%uH" % (3 * count), self._shm.buf, offset + 2)
+        colors = self._colors
+        return dict((fields[i], {"color": colors[fields[i + 2]], "field_length": fields[i + 1]})
+                    for i in range(0, len(fields), 3))
+
+    def take_new_colors(self):
+        """
+        Get the colors added to the table since the last call
+        """
+        new_colors = self._new_colors
+        self._new_colors = []
+        return new_colors
+
+    def add_colors(self, new_colors):
+        """
+        Add the colors the grid of the worker added to its table
+        """
+        self._colors.extend(new_colors)
+
+    def _color_index(self, color):
+        index = self._color_indices.get(color)
+        if index is None:
+            if len(self._colors) == MAX_COLORS:
+                # Full, new colors fall back to the first one
+                return 0
+            index = self._color_indices[color] = len(self._colors)
+            self._colors.append(color)
+            self._new_colors.append(color)
+        return index
+
+    def close(self):
+        self._shm.close()
+
+    def unlink(self):
+        self._shm.unlink()
+
+
+class EmulatorWorker():
+    """
+    Plugin side of a terminal running in a worker process. It stands in for
+    both the LinuxPty of the terminal view and the terminal emulator of the
+    sublime buffer, keypresses and resizes are sent to the worker and the
+    frames it publishes are handed out by take_frame.
+
+    The worker publishes the next frame once the previous one was read from
+    the grid, so it never overwrites lines that were not read yet. Workers
+    share the resource tracker of the plugin host, which unlinks the grid of
+    a worker that got killed.
+    """
+    def __init__(self, cmd, cwd, options, python=None):
+        context = multiprocessing.get_context("spawn")
+        if python:
+            # The plugin host can not run the worker itself. Spawn does not
+            # search the PATH so a bare interpreter name is resolved here.
+            executable = shutil.which(python)
+            if executable is None:
+                raise ValueError("Python interpreter not found: %s" % (python, ))
+            context.set_executable(executable)
+
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(target=_worker_main,
+                                        args=(child_conn, cmd, cwd, options),
+                                        name="TerminalView worker", daemon=True)
+        self._process.start()
+        child_conn.close()
+
+        self._send_lock = threading.Lock()
+        self._grid = None
+        self._frame = None
+        self._flushed = False
+        self._closed = False
+        self._exit_status = None
+        self._app_mode = False
+        self._bracketed_paste_mode = False
+
+    # Shell interface
+
+    def fileno(self):
+        """
+        The fd of the pipe the worker publishes its frames on
+        """
+        return self._conn.fileno()
+
+    def receive_frames(self):
+        """
+        Handle all messages of the worker that arrived, frames are merged
+        until they are taken
+        """
+        try:
+            while self._conn.poll():
+                self._handle(self._conn.recv())
+        except (EOFError, OSError):
+            self._closed = True
+
+    def output_closed(self):
+        """
+        Check if the worker is done, it does not publish any more frames after
+        this
+        """
+        return self._closed
+
+    def pending_output(self):
+        return 0
+
+    def is_running(self):
+        return not self._closed
+
+    def exit_status(self):
+        if self._exit_status is not None:
+            return self._exit_status
+
+        # The worker died before it could send the exit status of the shell
+        exitcode = self._process.exitcode
+        if exitcode is None:
+            return 0, 0
+        if exitcode < 0:
+            return 0, -exitcode
+        return exitcode, 0
+
+    def send_keypress(self, key, ctrl=False, alt=False, shift=False, meta=False,
+                      app_mode=False):
+        self._send("keypress", key, ctrl, alt, shift, meta, app_mode)
+
+    def send_string(self, string):
+        self._send("string", string)
+
+    def update_screen_size(self, lines, columns):
+        """
+        Resize both the PTY and the terminal emulator of the worker
+        """
+        self._send("resize", lines, columns)
+
+    def stop(self):
+        """
+        Stop the shell and the worker
+        """
+        self._send("stop")
+        self._process.join(1.0)
+        if self._process.is_alive():
+            utils.ConsoleLogger.log("Terminating worker process")
+            self._process.terminate()
+            self._process.join()
+
+        # The pipe is closed along with this object, the I/O hub may still
+        # need its fd to stop waiting on it
+        self._closed = True
+        if self._grid is not None:
+            self._grid.close()
+            self._grid = None
+
+    # Terminal emulator interface
+
+    def feed(self, data):
+        """
+        Have the worker feed data (e.g. the close message) to its emulator and
+        wait for the frame showing it
+        """
+        self._flushed = False
+        self._send("feed", bytes(data))
+        deadline = time.time() + FLUSH_TIMEOUT
+        try:
+            while not self._flushed:
+                timeout = deadline - time.time()
+                if timeout <= 0 or not self._conn.poll(timeout):
+                    break
+                self._handle(self._conn.recv())
+        except (EOFError, OSError):
+            self._closed = True
+
+    def close(self):
+        # Done by the worker when it is stopped
+        pass
+
+    def resize(self, lines, cols):
+        # Done by the worker together with the PTY in update_screen_size
+        pass
+
+    def prev_line(self):
+        self._send("scroll", "prev_line")
+
+    def next_line(self):
+        self._send("scroll", "next_line")
+
+    def prev_page(self):
+        self._send("scroll", "prev_page")
+
+    def next_page(self):
+        self._send("scroll", "next_page")
+
+    def search(self, query, regex=False):
+        # The matches show up in the hits of the frames
+        self._send("search", "search", query, regex)
+
+    def search_prev(self):
+        self._send("search", "search_prev")
+
+    def search_next(self):
+        self._send("search", "search_next")
+
+    def clear_search(self):
+        self._send("search", "clear_search")
+
+    def modified(self):
+        return self._frame is not None
+
+    def take_frame(self, colors=True):
+        """
+        Take the frames published since the last call as one frame, whether it
+        has colors is up to the options of the worker
+        """
+        frame = self._frame
+        self._frame = None
+        return frame
+
+    def bracketed_paste_mode_enabled(self):
+        return self._bracketed_paste_mode
+
+    def application_mode_enabled(self):
+        return self._app_mode
+
+    def _send(self, *message):
+        with self._send_lock:
+            try:
+                self._conn.send(message)
+            except (OSError, ValueError):
+                # The worker is gone or was stopped
+                self._closed = True
+
+    def _handle(self, message):
+        op = message[0]
+        if op == "grid":
+            colors = None
+            if self._grid is not None:
+                colors = self._grid.colors()
+                self._grid.close()
+            self._grid = ScreenGrid.attach(*message[1:], colors=colors)
+        elif op == "frame":
+            (frame, new_colors, self._app_mode, self._bracketed_paste_mode) = message[1:]
+            grid = self._grid
+            grid.add_colors(new_colors)
+            lines = {}
+            colors = {}
+            for line in frame.lines:
+                lines[line] = grid.read_line(line)
+                line_colors = grid.read_colors(line)
+                if line_colors:
+                    colors[line] = line_colors
+            self._send("ack")
+
+            frame = frame._replace(lines=lines, colors=colors)
+            if self._frame is not None:
+                frame = pyte_terminal_emulator.merge_frames(self._frame, frame)
+            self._frame = frame
+        elif op == "flushed":
+            self._flushed = True
+        elif op == "exit":
+            self._exit_status = message[1:]
+            self._closed = True
+
+
+def _worker_main(conn, cmd, cwd, options):
+    """
+    Entry point of the worker process. The shell output and the messages of
+    the plugin are handled by an I/O hub of its own, which also paces the
+    frames like the hub of the plugin does.
+    """
+    utils.ConsoleLogger.enabled = options["debug"]
+    stopped = threading.Event()
+    hub = io_hub.IOHub(options["max_fps"])
+    session = _ShellSession(conn, hub, cmd, cwd, options, stopped)
+    hub.register(session)
+    hub.register(_ControlChannel(conn, session))
+    stopped.wait()
+
+
+class _ShellSession():
+    """
+    Worker side of a terminal, reads the shell output into the terminal
+    emulator and publishes frames of it to the plugin
+    """
+    def __init__(self, conn, hub, cmd, cwd, options, stopped):
+        self._conn = conn
+        self._hub = hub
+        self._stopped = stopped
+        self._colors = options["colors"]
+        self._shell = linux_pty.LinuxPty(cmd, cwd)
+        self._emulator = pyte_terminal_emulator.PyteTerminalEmulator(
+            80, 24, options["history"], options["ratio"], options["parser"],
+            options["history_mb"], options["history_spill"])
+        self._grid = None
+        self._awaiting_ack = False
+        self._flush = False
+        self._exited = False
+
+    def fileno(self):
+        return self._shell.fileno()
+
+    def on_readable(self):
+        data = self._shell.receive_all_output(BATCH_SIZE)
+        if data is not None:
+            self._emulator.feed(data)
+        return not self._shell.output_closed()
+
+    def on_frame(self):
+        self._publish()
+
+    def on_tick(self):
+        if not self._shell.output_closed() or self._shell.is_running():
+            return True
+
+        # Make sure the plugin got all output before telling it the shell is
+        # done
+        self._publish()
+        if self._awaiting_ack or self._emulator.modified():
+            return True
+
+        self._exited = True
+        self._send("exit", *self._shell.exit_status())
+        return False
+
+    def handle(self, message):
+        """
+        Handle a message of the plugin, returns False when the worker should
+        stop
+        """
+        op = message[0]
+        if op == "ack":
+            self._awaiting_ack = False
+            self._next_frame()
+        elif op == "keypress":
+            self._shell.send_keypress(*message[1:])
+        elif op == "string":
+            self._shell.send_string(message[1])
+        elif op == "resize":
+            self._shell.update_screen_size(*message[1:])
+            self._emulator.resize(*message[1:])
+            self._next_frame()
+        elif op == "scroll":
+            getattr(self._emulator, message[1])()
+            self._next_frame()
+        elif op == "search":
+            getattr(self._emulator, message[1])(*message[2:])
+            self._next_frame()
+        elif op == "feed":
+            self._emulator.feed(message[1])
+            self._flush = True
+            self._publish()
+        elif op == "stop":
+            return False
+        return True
+
+    def stop(self):
+        self._hub.unregister(self)
+        self._shell.stop()
+        self._emulator.close()
+        if self._grid is not None:
+            self._grid.close()
+            self._grid.unlink()
+            self._grid = None
+        self._stopped.set()
+
+    def _next_frame(self):
+        if self._exited:
+            # No longer serviced by the hub
+            self._publish()
+        else:
+            self._hub.request_frame(self)
+
+    def _publish(self):
+        """
+        Write the changed lines and their colors to the grid and send the rest
+        of the frame, unless the plugin did not read the previous frame yet
+        """
+        if self._awaiting_ack:
+            # The ack requests the next frame
+            return
+
+        if self._emulator.modified():
+            frame = self._emulator.take_frame(self._colors)
+            self._ensure_grid(frame.lines)
+            for line, text in frame.lines.items():
+                self._grid.write_line(line, text, frame.colors.get(line))
+
+            frame = frame._replace(lines=sorted(frame.lines), colors={})
+            self._send("frame", frame, self._grid.take_new_colors(),
+                       self._emulator.application_mode_enabled(),
+                       self._emulator.bracketed_paste_mode_enabled())
+            self._awaiting_ack = True
+
+        if self._flush:
+            self._flush = False
+            self._send("flushed")
+
+    def _ensure_grid(self, lines):
+        """
+        Replace the grid with a larger one when the lines do not fit, the old
+        one is no longer read as the plugin acked all frames in it
+        """
+        rows = max(lines, default=-1) + 1
+        width = max((len(text) for text in lines.values()), default=0)
+        grid = self._grid
+        if grid is not None and rows <= grid.rows() and width <= grid.width():
+            return
+
+        colors = None
+        if grid is not None:
+            rows = max(rows, grid.rows())
+            width = max(width, grid.width())
+            colors = grid.colors()
+            grid.close()
+            grid.unlink()
+
+        rows = max(rows, self._emulator.nb_lines())
+        self._grid = ScreenGrid.create(rows, width, colors)
+        self._send("grid", self._grid.name(), rows, width)
+
+    def _send(self, *message):
+        try:
+            self._conn.send(message)
+        except OSError:
+            # The plugin is gone, the control channel stops us
+            pass
+
+
+class _ControlChannel():
+    """
+    I/O hub client for the messages of the plugin
+    """
+    def __init__(self, conn, session):
+        self._conn = conn
+        self._session = session
+        self._stopped = False
+
+    def fileno(self):
+        return self._conn.fileno()
+
+    def on_readable(self):
+        try:
+            while not self._stopped and self._conn.poll():
+                if not self._session.handle(self._conn.recv()):
+                    self._stop()
+        except (EOFError, OSError):
+            # The plugin host exited without stopping us
+            self._stop()
+        return not self._stopped
+
+    def on_frame(self):
+        pass
+
+    def on_tick(self):
+        return not self._stopped
+
+    def _stop(self):
+        self._stopped = True
+        self._session.stop()
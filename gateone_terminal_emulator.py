@@ -33,6 +33,13 @@ class GateOneTerminalEmulator():
         # convert_go_renditions_to_colormap(self._term.renditions, self._term.renditions_store, [])
         return dirty_lines
 
+    def dirty_spans(self):
+        # Damage is not tracked per column, so whole lines are replaced
+        return {}
+
+    def dirty_scrolls(self):
+        return []
+
     def clear_dirty(self):
         self._modified = False
 
@@ -0,0 +1,196 @@
+"""
+Full-text search through the terminal history. The lines are indexed as they
+scroll off the screen: the trigrams in the words of every CHUNK_LINES lines
+are hashed into a bitmap, so a query only scans the chunks that can hold a
+match instead of the whole history.
+"""
+from collections import deque
+import re
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+
+# Number of lines indexed together
+CHUNK_LINES = 256
+
+# Size of the trigram bitmap of a chunk, about 3000 distinct trigrams of
+# shell output fill a third of it
+BITMAP_BITS = 8192
+
+# Memory the index takes per history line, counted against the history budget
+INDEX_BYTES_PER_LINE = BITMAP_BITS // 8 // CHUNK_LINES
+
+_MASK = BITMAP_BITS - 1
+
+
+def compile_query(query, regex=False, ignore_case=True):
+    """
+    Compile a search query, a substring or a regular expression. Returns the
+    pattern and the literal strings that every match of it contains, raises
+    re.error for invalid expressions.
+    """
+    flags = re.IGNORECASE if ignore_case else 0
+    if not regex:
+        return re.compile(re.escape(query), flags), [query]
+
+    pattern = re.compile(query, flags)
+    return pattern, _required_literals(query, flags)
+
+
+def _required_literals(query, flags):
+    """
+    The runs of literal characters at the top level of a regular expression,
+    anything else in the expression (alternations, repeats, classes) ends a
+    run
+    """
+    literals = []
+    run = []
+    for op, value in sre_parse.parse(query, flags):
+        if op == sre_parse.LITERAL:
+            run.append(chr(value))
+        elif run:
+            literals.append("".join(run))
+            run = []
+    if run:
+        literals.append("".join(run))
+    return literals
+
+
+# Words, output repeats the same ones over and over
+_WORD = re.compile(r"\S+")
+
+
+def _trigram_hashes(text):
+    """
+    Hashes of the trigrams within the words of text. Every word of a literal
+    is part of a word of the text it is found in, so the trigrams across
+    words are left out.
+    """
+    trigrams = set(word[i:i + 3] for word in set(_WORD.findall(text))
+                   for i in range(len(word) - 2))
+    return set(hash(trigram) & _MASK for trigram in trigrams)
+
+
+class TrigramIndex():
+    """
+    Index of the history lines by their number (see Scrollback.first). Every
+    chunk of CHUNK_LINES lines gets a bitmap of the hashes of the trigrams in
+    the words of its case folded text. A chunk may only hold a match of a query if the bits
+    of all trigrams of the query are set, with a few false positives.
+
+    The lines of the chunk being filled are not indexed yet, they are always
+    scanned. Chunks of lines dropped from the history are pruned as lines are
+    added, so the index stays in proportion to the history.
+    """
+    def __init__(self, start=0):
+        # (first line, end line, bitmap) tuples, oldest first
+        self._chunks = deque()
+        self._pending = []
+        self._start = start
+
+    def clear(self, start=0):
+        """
+        Forget all lines, the next line added has number start
+        """
+        self._chunks.clear()
+        self._pending = []
+        self._start = start
+
+    def add(self, text, first=0):
+        """
+        Add the text of the next line, lines before first were dropped from
+        the history
+        """
+        self._pending.append(text)
+        if len(self._pending) == CHUNK_LINES:
+            self._index_pending()
+        self.prune(first)
+
+    def prune(self, first):
+        """
+        Forget the chunks of the lines before first
+        """
+        while self._chunks and self._chunks[0][1] <= first:
+            self._chunks.popleft()
+
+    def memory(self):
+        """
+        Number of bytes taken by the bitmaps
+        """
+        return len(self._chunks) * (BITMAP_BITS // 8)
+
+    def truncate(self, end):
+        """
+        Forget the lines from number end on, they were popped from the history
+        and their numbers are used again. Chunks that reach past end are kept,
+        they only make for more candidates.
+        """
+        if end >= self._start:
+            del self._pending[end - self._start:]
+        else:
+            self._pending = []
+            self._start = end
+
+    def candidates(self, literals, first, end):
+        """
+        Return the (start, stop) ranges of line numbers that may hold all of
+        the literals, newest first. Lines before first were dropped from the
+        history, lines from end on are not in it.
+        """
+        hashes = set()
+        for literal in literals:
+            hashes.update(_trigram_hashes(literal.casefold()))
+
+        self.prune(first)
+
+        ranges = []
+        stop = min(self._start + len(self._pending), end)
+        if self._pending and self._start < stop:
+            ranges.append((max(self._start, first), stop))
+        stop = min(self._start, end)
+        for start, chunk_end, bitmap in reversed(self._chunks):
+            if all(bitmap[bit >> 3] & (1 << (bit & 7)) for bit in hashes):
+                # Chunks from before a truncate overlap newer lines
+                chunk_stop = min(chunk_end, stop)
+                if max(start, first) < chunk_stop:
+                    ranges.append((max(start, first), chunk_stop))
+            stop = min(stop, start)
+        return ranges
+
+    def _index_pending(self):
+        bitmap = bytearray(BITMAP_BITS // 8)
+        for bit in _trigram_hashes("\n".join(self._pending).casefold()):
+            bitmap[bit >> 3] |= 1 << (bit & 7)
+
+        end = self._start + len(self._pending)
+        self._chunks.append((self._start, end, bytes(bitmap)))
+        self._pending = []
+        self._start = end
+
+
+def last_match(pattern, text, before=None):
+    """
+    Return the (start, stop) of the last non-empty match of pattern in text
+    that starts before column before, None if there is none
+    """
+    found = None
+    for match in pattern.finditer(text):
+        if before is not None and match.start() >= before:
+            break
+        if match.end() > match.start():
+            found = match.span()
+    return found
+
+
+def first_match(pattern, text, after=None):
+    """
+    Return the (start, stop) of the first non-empty match of pattern in text
+    that starts after column after, None if there is none
+    """
+    for match in pattern.finditer(text):
+        if (after is None or match.start() > after) and match.end() > match.start():
+            return match.span()
+    return None
@@ -0,0 +1,379 @@
+"""
+Shared I/O thread for all terminal views. Instead of one polling thread per
+terminal, a single thread waits on the PTYs of every terminal at once and only
+wakes up when one of them has output, a frame or tick is due or it is woken
+up.
+"""
+import os
+import select
+import threading
+import time
+import traceback
+
+try:
+    import selectors
+except ImportError:
+    # Python 3.3 (as embedded in ST3) does not have the selectors module
+    selectors = None
+
+try:
+    import fcntl
+except ImportError:
+    pass
+
+from . import utils
+
+
+class IOHub():
+    """
+    Multiplexes the PTYs of all registered clients in one thread. A client
+    (normally a TerminalView) provides:
+
+        fileno()      - the fd to wait on for output
+        on_readable() - read and parse the output, returns False when the
+                        fd is closed and should no longer be waited on
+        on_frame()    - render the output parsed since the last frame
+        on_tick()     - housekeeping, returns False when the client is done
+                        and should be unregistered
+
+    Frames are scheduled from the output itself. Output arriving after an idle
+    period is rendered once the client has been quiet for the settle delay, so
+    a keystroke echo shows up right away while e.g. a "\\r\\n" followed by a
+    prompt still ends up in one frame. Under sustained output frames are
+    coalesced to at most max_fps per client. Ticks run right away when a
+    client is woken up, every tick_interval once its output is closed (to
+    notice the shell exiting) and otherwise every idle_interval. The idle
+    ticks catch what happens without output or a wake up, like a view resized
+    while the program in it waits for input or a shell exiting while a
+    background job keeps its PTY open. All clients share the deadline of the
+    idle ticks, so the thread wakes up once per idle_interval however many
+    terminals there are.
+    """
+    def __init__(self, max_fps=30, settle_delay=0.002, tick_interval=0.2,
+                 idle_interval=0.5):
+        self._frame_interval = 1.0 / max_fps
+        self._settle_delay = settle_delay
+        self._tick_interval = tick_interval
+        self._idle_interval = idle_interval
+        self._idle_tick = 0.0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._clients = []
+        self._changes = []
+        self._poller = None
+        self._wake_fds = None
+
+    def set_max_fps(self, max_fps):
+        """
+        Set the maximum number of frames per second rendered for a client
+        """
+        self._frame_interval = 1.0 / max_fps
+
+    def register(self, client):
+        """
+        Start servicing a client, the I/O thread is started if needed
+        """
+        with self._lock:
+            self._changes.append((_ADD, client))
+            if self._thread is None:
+                self._poller = _make_poller()
+                self._wake_fds = _make_wake_pipe()
+                self._poller.register(self._wake_fds[0], None)
+                self._thread = threading.Thread(target=self._main_loop,
+                                                name="TerminalView I/O")
+                self._thread.start()
+            else:
+                self._wake()
+
+    def unregister(self, client):
+        """
+        Stop servicing a client, the I/O thread ends with the last client
+        """
+        with self._lock:
+            self._changes.append((_REMOVE, client))
+            self._wake()
+
+    def wake(self, client=None):
+        """
+        Make the I/O thread run the housekeeping of a client (or all clients)
+        right away, e.g. after a scroll was requested in a view
+        """
+        with self._lock:
+            self._changes.append((_WAKE, client))
+            self._wake()
+
+    def pause_reading(self, client):
+        """
+        Stop waiting for output of a client, e.g. when it can not keep up
+        """
+        with self._lock:
+            self._changes.append((_PAUSE, client))
+            self._wake()
+
+    def resume_reading(self, client):
+        """
+        Wait for output of a client again after pause_reading
+        """
+        with self._lock:
+            self._changes.append((_RESUME, client))
+            self._wake()
+
+    def request_frame(self, client):
+        """
+        Schedule a frame for a client like when it had output, e.g. once the
+        output was parsed in another thread
+        """
+        with self._lock:
+            self._changes.append((_FRAME, client))
+            self._wake()
+
+    def _wake(self):
+        if self._thread is None:
+            return
+
+        try:
+            os.write(self._wake_fds[1], b"x")
+        except OSError:
+            # The pipe is full so a wake up is pending anyway
+            pass
+
+    def _apply_changes(self):
+        """
+        Apply the (un)registrations and wake ups, returns False when there are
+        no more clients and the thread should end
+        """
+        now = time.time()
+        with self._lock:
+            for op, client in self._changes:
+                if op == _ADD:
+                    self._clients.append(_ClientState(client, now))
+                    self._poller.register(client.fileno(), client)
+                elif op == _REMOVE:
+                    self._remove(client)
+                else:
+                    for state in self._clients:
+                        if client is None or state.client is client:
+                            self._apply_change(state, op, now)
+            self._changes = []
+
+            if self._clients:
+                return True
+
+            # Last client is gone, clean up while holding the lock so a
+            # register() in the mean time starts a new thread
+            self._poller.close()
+            for fd in self._wake_fds:
+                os.close(fd)
+            self._thread = None
+            return False
+
+    def _apply_change(self, state, op, now):
+        if op == _WAKE:
+            state.next_tick = now
+        elif op == _FRAME:
+            self._output(state, now)
+        elif op == _PAUSE:
+            if state.reading:
+                self._poller.unregister(state.client.fileno())
+                state.reading = False
+        elif op == _RESUME:
+            if not state.reading and not state.closed:
+                self._poller.register(state.client.fileno(), state.client)
+                state.reading = True
+
+    def _remove(self, client):
+        for state in self._clients:
+            if state.client is client:
+                self._clients.remove(state)
+                if state.reading:
+                    self._poller.unregister(client.fileno())
+                return
+
+    def _output(self, state, now):
+        if state.pending_since is None:
+            state.pending_since = now
+        state.last_output = now
+
+    def _frame_due(self, state):
+        """
+        Time the next frame of a client is due, None if it has no new output
+        """
+        if state.pending_since is None:
+            return None
+
+        due = min(state.last_output + self._settle_delay,
+                  state.pending_since + self._frame_interval)
+        return max(due, state.last_frame + self._frame_interval)
+
+    def _timeout(self, now):
+        """
+        Time to wait for output before the next frame or tick is due, None
+        when no client has one scheduled
+        """
+        deadline = None
+        for state in self._clients:
+            for due in (self._frame_due(state), state.next_tick):
+                if due is not None and (deadline is None or due < deadline):
+                    deadline = due
+
+        if deadline is None:
+            return None
+        return max(0.0, deadline - now)
+
+    def _main_loop(self):
+        while self._apply_changes():
+            for fd, client in self._poller.select(self._timeout(time.time())):
+                if client is None:
+                    _drain(fd)
+                    continue
+
+                state = self._state(client)
+                if state is None:
+                    continue
+
+                now = time.time()
+                if not self._call(state, client.on_readable):
+                    # No more output, check on the client until it is done
+                    if state.reading:
+                        with self._lock:
+                            self._poller.unregister(fd)
+                    state.reading = False
+                    state.closed = True
+                    state.next_tick = now
+
+                self._output(state, now)
+
+            now = time.time()
+            for state in list(self._clients):
+                due = self._frame_due(state)
+                if due is not None and now >= due:
+                    state.pending_since = None
+                    state.last_frame = now
+                    self._call(state, state.client.on_frame)
+
+                if state.next_tick is not None and now >= state.next_tick:
+                    if state.closed:
+                        state.next_tick = now + self._tick_interval
+                    else:
+                        state.next_tick = self._next_idle_tick(now)
+                    if not self._call(state, state.client.on_tick):
+                        self.unregister(state.client)
+
+    def _next_idle_tick(self, now):
+        """
+        Time of the next idle tick, the same for all clients
+        """
+        if self._idle_tick <= now:
+            self._idle_tick = now + self._idle_interval
+        return self._idle_tick
+
+    def _state(self, client):
+        for state in self._clients:
+            if state.client is client:
+                return state
+        return None
+
+    def _call(self, state, callback):
+        """
+        Run a client callback, a client raising an exception is dropped so
+        it can not take down the other terminals
+        """
+        try:
+            return callback() is not False
+        except Exception:
+            traceback.print_exc()
+            utils.ConsoleLogger.log("Dropping I/O client after exception")
+            self.unregister(state.client)
+            return False
+
+
+_ADD, _REMOVE, _WAKE, _FRAME, _PAUSE, _RESUME = range(6)
+
+
+class _ClientState():
+    def __init__(self, client, now):
+        self.client = client
+        self.reading = True
+        self.closed = False
+        self.pending_since = None
+        self.last_output = 0.0
+        self.last_frame = 0.0
+        self.next_tick = now
+
+
+class _SelectorsPoller():
+    """
+    Poller using the best selector of the platform (epoll on Linux)
+    """
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+
+    def register(self, fd, data):
+        self._selector.register(fd, selectors.EVENT_READ, data)
+
+    def unregister(self, fd):
+        self._selector.unregister(fd)
+
+    def select(self, timeout):
+        return [(key.fd, key.data) for key, _ in self._selector.select(timeout)]
+
+    def close(self):
+        self._selector.close()
+
+
+class _SelectPoller():
+    """
+    Fallback poller using select.select for when selectors is not available
+    """
+    def __init__(self):
+        self._fds = {}
+
+    def register(self, fd, data):
+        self._fds[fd] = data
+
+    def unregister(self, fd):
+        del self._fds[fd]
+
+    def select(self, timeout):
+        (ready, _, _) = select.select(list(self._fds), [], [], timeout)
+        return [(fd, self._fds[fd]) for fd in ready]
+
+    def close(self):
+        self._fds = {}
+
+
+def _make_poller():
+    if selectors is not None:
+        return _SelectorsPoller()
+    return _SelectPoller()
+
+
+def _make_wake_pipe():
+    fds = os.pipe()
+    for fd in fds:
+        flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+        fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+    return fds
+
+
+def _drain(fd):
+    try:
+        while os.read(fd, 4096):
+            pass
+    except OSError:
+        pass
+
+
+def get_hub():
+    """
+    Get the I/O hub shared by all terminal views
+    """
+    global _HUB
+    with _HUB_LOCK:
+        if _HUB is None:
+            _HUB = IOHub()
+        return _HUB
+
+
+_HUB = None
+_HUB_LOCK = threading.Lock()
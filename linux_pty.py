@@ -26,6 +26,8 @@ class LinuxPty():
     def __init__(self, cmd, cwd):
         self._cmd_return_code = 0
         self._cmd_kill_signal = 0
+        self._output_closed = False
+        self._read_buffer = bytearray()
         self._shell_pid, self._master_fd = pty.fork()
         if self._shell_pid == pty.CHILD:
             os.environ["TERM"] = "linux"
@@ -65,10 +67,83 @@ class LinuxPty():
         try:
             data = os.read(self._master_fd, max_read_size)
         except OSError:
+            # Linux reports the shell closing its side of the PTY as EIO
+            self._output_closed = True
             return None
 
+        if not data:
+            self._output_closed = True
         return data
 
+    def receive_all_output(self, max_size, timeout=0):
+        """
+        Read the shell output until there is nothing more to read right away
+        or max_size bytes were read, so a flood of output can be handled in
+        large batches. The output is read into a buffer that is reused between
+        calls, the returned memoryview is only valid until the next call.
+        """
+        (ready, _, _) = select.select([self._master_fd], [], [], timeout)
+        if not ready:
+            return None
+
+        if len(self._read_buffer) < max_size:
+            self._read_buffer = bytearray(max_size)
+        view = memoryview(self._read_buffer)
+
+        size = self.receive_output_into([view[:max_size]])
+        if size == 0:
+            return None
+        return view[:size]
+
+    def receive_output_into(self, buffers):
+        """
+        Read the shell output into a list of writable buffers (e.g. the free
+        space of a ring buffer) until there is nothing more to read right away
+        or the buffers are full. Returns the number of bytes read. Blocks if
+        there is no output at all, so only call this when the PTY is readable.
+        """
+        size = 0
+        while buffers:
+            try:
+                nb_read = os.readv(self._master_fd, buffers)
+            except OSError:
+                self._output_closed = True
+                break
+
+            if nb_read == 0:
+                self._output_closed = True
+                break
+
+            size += nb_read
+            buffers = _skip_bytes(buffers, nb_read)
+            if self.pending_output() == 0:
+                break
+
+        return size
+
+    def pending_output(self):
+        """
+        Number of bytes of shell output that can be read right away
+        """
+        try:
+            size = fcntl.ioctl(self._master_fd, termios.FIONREAD, b"\0\0\0\0")
+        except OSError:
+            return 0
+        return struct.unpack("i", size)[0]
+
+    def output_closed(self):
+        """
+        Check if the shell closed its output, the PTY will not have any more
+        data after this
+        """
+        return self._output_closed
+
+    def fileno(self):
+        """
+        The PTY master fd, which can be used to wait for output
+        """
+        return self._master_fd
+
     def update_screen_size(self, lines, columns):
         """
         Notify the shell of a terminal screen resize
@@ -214,3 +289,15 @@ _LINUX_ALT_KEY_MAP = {
     "right": "\x1b[1;3C",
     "left": "\x1b[1;3D",
 }
+
+
+def _skip_bytes(buffers, size):
+    """
+    Drop the first size bytes from a list of memoryviews
+    """
+    while buffers and size >= len(buffers[0]):
+        size -= len(buffers[0])
+        buffers = buffers[1:]
+    if buffers and size:
+        buffers = [buffers[0][size:]] + buffers[1:]
+    return buffers
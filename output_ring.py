@@ -0,0 +1,282 @@
+"""
+Bounded ring buffer connecting the stages of the shell output pipeline. The
+I/O hub reads the shell output into it and the parser thread shared by all
+terminal views feeds it from there to the terminal emulator.
+"""
+import collections
+import threading
+import traceback
+
+from . import utils
+
+
+class OutputRing():
+    """
+    Single producer, single consumer ring buffer of bytes. The producer reads
+    straight into the free space and the consumer parses straight from the
+    filled space, the lock is only held to move the positions.
+
+    Backpressure is handled with two callbacks: pause_producer is called when
+    the ring is full and resume_producer once the consumer emptied half of it.
+    Both are called with the lock held, so they are always seen in order. A
+    consumer not waiting on the ring itself gets notify_consumer called when
+    data is written or the ring is closed.
+    """
+    def __init__(self, capacity, pause_producer=None, resume_producer=None,
+                 notify_consumer=None):
+        self._capacity = capacity
+        self._view = memoryview(bytearray(capacity))
+        self._start = 0
+        self._size = 0
+        self._closed = False
+        self._producer_paused = False
+        self._pause_producer = pause_producer
+        self._resume_producer = resume_producer
+        self._notify_consumer = notify_consumer
+        self._lock = threading.Lock()
+        self._readable = threading.Condition(self._lock)
+
+        # Counters
+        self._bytes_written = 0
+        self._bytes_read = 0
+        self._max_depth = 0
+        self._nb_full = 0
+
+    def capacity(self):
+        return self._capacity
+
+    def depth(self):
+        """
+        Number of bytes waiting for the consumer
+        """
+        with self._lock:
+            return self._size
+
+    def closed(self):
+        with self._lock:
+            return self._closed
+
+    def stats(self):
+        """
+        Counters of the ring, nb_full is the number of times the producer had
+        to be paused
+        """
+        with self._lock:
+            return {
+                "depth": self._size,
+                "max_depth": self._max_depth,
+                "bytes_written": self._bytes_written,
+                "bytes_read": self._bytes_read,
+                "nb_full": self._nb_full,
+            }
+
+    def writable_views(self):
+        """
+        Memoryviews of the free space, two when it wraps around the end of the
+        buffer. They may be written to until the next commit_write.
+        """
+        with self._lock:
+            if self._closed:
+                return []
+            end = (self._start + self._size) % self._capacity
+            free = self._capacity - self._size
+
+        return self._views(end, free)
+
+    def commit_write(self, size):
+        """
+        Hand the first size bytes written to the writable views over to the
+        consumer
+        """
+        with self._lock:
+            if self._closed:
+                return
+
+            self._size += size
+            self._bytes_written += size
+            self._max_depth = max(self._max_depth, self._size)
+            if self._size == self._capacity and not self._producer_paused:
+                self._nb_full += 1
+                self._producer_paused = True
+                if self._pause_producer is not None:
+                    self._pause_producer()
+
+            self._readable.notify()
+            if self._notify_consumer is not None:
+                self._notify_consumer()
+
+    def wait_readable(self, timeout=None):
+        """
+        Wait until there is data or the ring is closed. Returns memoryviews of
+        the data, which are valid until the next commit_read. Nothing is
+        returned when the ring is closed and drained (or on a timeout).
+        """
+        with self._lock:
+            if self._size == 0 and not self._closed:
+                self._readable.wait(timeout)
+            start = self._start
+            size = self._size
+
+        return self._views(start, size)
+
+    def readable_views(self):
+        """
+        Memoryviews of the data without waiting for it, valid until the next
+        commit_read
+        """
+        with self._lock:
+            start = self._start
+            size = self._size
+
+        return self._views(start, size)
+
+    def commit_read(self, size):
+        """
+        Give the first size bytes of the readable views back to the producer
+        """
+        with self._lock:
+            if self._size == 0:
+                # Discarded by close
+                return
+
+            self._start = (self._start + size) % self._capacity
+            self._size -= size
+            self._bytes_read += size
+            if self._producer_paused and self._size <= self._capacity // 2:
+                self._producer_paused = False
+                if self._resume_producer is not None:
+                    self._resume_producer()
+
+    def close(self, discard=False):
+        """
+        Stop accepting data, the consumer still gets the data in the ring
+        unless it is discarded
+        """
+        with self._lock:
+            self._closed = True
+            if discard:
+                self._start = 0
+                self._size = 0
+            self._readable.notify_all()
+            if self._notify_consumer is not None:
+                self._notify_consumer()
+
+    def _views(self, start, size):
+        if size == 0:
+            return []
+
+        first = min(size, self._capacity - start)
+        views = [self._view[start:start + first]]
+        if first < size:
+            views.append(self._view[:size - first])
+        return views
+
+
+class OutputParser():
+    """
+    One thread feeding the rings of all terminal views to their terminal
+    emulators, so the number of threads stays the same however many
+    terminals there are. A client (normally a TerminalView) provides:
+
+        parse(buffers) - feed a batch of the readable views of its ring and
+                         commit what was read
+        parsed()       - called once its ring is closed and drained
+
+    Rings with data take turns, each gets one batch parsed before the next
+    one, so a flooding terminal does not hold back the others.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._thread = None
+        self._clients = {}
+        self._queue = collections.deque()
+
+    def register(self, ring, client):
+        """
+        Start parsing a ring, which must notify its consumer with notify().
+        The parser thread is started if needed.
+        """
+        with self._lock:
+            self._clients[ring] = client
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._main_loop,
+                                                name="TerminalView parser")
+                self._thread.start()
+            self._enqueue(ring)
+
+    def notify(self, ring):
+        """
+        Have the ring parsed, it got data or was closed
+        """
+        with self._lock:
+            self._enqueue(ring)
+
+    def _enqueue(self, ring):
+        if ring in self._clients and ring not in self._queue:
+            self._queue.append(ring)
+            self._ready.notify()
+
+    def _next(self):
+        """
+        Wait for a ring to parse, None when there are no more rings and the
+        thread should end
+        """
+        with self._lock:
+            while not self._queue and self._clients:
+                self._ready.wait()
+            if not self._clients:
+                self._thread = None
+                return None
+            ring = self._queue.popleft()
+            return ring, self._clients[ring]
+
+    def _main_loop(self):
+        while True:
+            item = self._next()
+            if item is None:
+                return
+
+            ring, client = item
+            buffers = ring.readable_views()
+            if not buffers:
+                if ring.closed():
+                    self._remove(ring, client)
+                continue
+
+            try:
+                client.parse(buffers)
+            except Exception:
+                # A broken terminal can not take down the others
+                traceback.print_exc()
+                utils.ConsoleLogger.log("Dropping parser client after exception")
+                ring.close(discard=True)
+                self._remove(ring, client)
+                continue
+
+            # Take turns with the other rings, a closed ring comes back once
+            # more to be removed
+            if ring.depth() > 0 or ring.closed():
+                self.notify(ring)
+
+    def _remove(self, ring, client):
+        with self._lock:
+            del self._clients[ring]
+            if ring in self._queue:
+                self._queue.remove(ring)
+        client.parsed()
+
+
+def get_parser():
+    """
+    Get the parser shared by all terminal views
+    """
+    global _PARSER
+    with _PARSER_LOCK:
+        if _PARSER is None:
+            _PARSER = OutputParser()
+        return _PARSER
+
+
+_PARSER = None
+_PARSER_LOCK = threading.Lock()
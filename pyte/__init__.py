@@ -24,10 +24,12 @@
 from __future__ import absolute_import
 
 __all__ = ("Screen", "DiffScreen", "HistoryScreen",
-           "Stream", "ByteStream", "DebugStream")
+           "Stream", "ByteStream", "DebugStream",
+           "VT500Stream", "VT500ByteStream")
 
 from .screens import Screen, DiffScreen, HistoryScreen
-from .streams import Stream, ByteStream, DebugStream
+from .streams import (Stream, ByteStream, DebugStream,
+                      VT500Stream, VT500ByteStream)
 
 
 if __debug__:
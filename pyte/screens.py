@@ -27,10 +27,14 @@
 from __future__ import absolute_import, unicode_literals, division
 
 import copy
+import marshal
 import math
 import operator
+import re
+import sys
+from array import array
 from collections import deque, namedtuple
-from itertools import islice, repeat
+from itertools import groupby, islice, repeat
 
 from .wcwidth import wcwidth
 
@@ -48,6 +52,11 @@ def take(n, iterable):
     return list(islice(iterable, n))
 
 
+#: Splits a run of text into printable ASCII runs, which are drawn in
+#: bulk by :meth:`Screen.draw_text`, and single other characters.
+_ASCII_RUN_OR_CHAR = re.compile("([\x20-\x7e]+)|(.)", re.DOTALL)
+
+
 #: A container for screen's scroll margins.
 Margins = namedtuple("Margins", "top bottom")
 
@@ -75,6 +84,14 @@ _Char = namedtuple("_Char", [
 ])
 
 
+#: A run of consecutive cells on a line with the same colors, see
+#: :class:`AttributeRuns`.
+Run = namedtuple("Run", "start length fg bg reverse")
+
+#: Attributes, which make up a :data:`Run`.
+_run_key = operator.attrgetter("fg", "bg", "reverse")
+
+
 class Char(_Char):
     """A wrapper around :class:`_Char`, providing some useful defaults
     for most of the attributes.
@@ -88,6 +105,339 @@ class Char(_Char):
                                         underscore, strikethrough, reverse)
 
 
+#: Number of entries a :class:`Renditions` table keeps, before it
+#: starts over.
+_MAX_RENDITIONS = 1024
+
+
+class Renditions(object):
+    """Table of the cursor attributes of a screen, so that the same
+    graphic rendition is always the same :class:`Char` object.
+
+    Attributes are looked up by the attributes before and the
+    parameters of an SGR sequence, which the usual few transitions of
+    colorful output repeat over and over. Each rendition also has the
+    cells drawn with it, see :meth:`Screen.draw_text`.
+
+    The tables are bounded: once one is full, it is cleared and
+    filled again, objects handed out earlier stay valid.
+
+    :param int size: number of entries each table keeps.
+    """
+    def __init__(self, size=_MAX_RENDITIONS):
+        self.size = size
+        self._styles = {}
+        self._transitions = {}
+        self._cells = {}
+
+    def intern(self, char):
+        """Returns the shared object for the attributes of ``char``."""
+        try:
+            return self._styles[char]
+        except KeyError:
+            if len(self._styles) >= self.size:
+                self._styles.clear()
+            self._styles[char] = char
+            return char
+
+    def select(self, char, params, default):
+        """Returns the attributes of ``char`` after the SGR ``params``;
+        ``default`` are the attributes SGR 0 resets to.
+        """
+        key = char, params
+        try:
+            return self._transitions[key]
+        except KeyError:
+            pass
+
+        replace = {}
+        for attr in params or [0]:
+            if attr in g.FG:
+                replace["fg"] = g.FG[attr]
+            elif attr in g.BG:
+                replace["bg"] = g.BG[attr]
+            elif attr in g.TEXT:
+                attr = g.TEXT[attr]
+                replace[attr[1:]] = attr.startswith("+")
+            elif not attr:
+                replace = default._asdict()
+
+        selected = self.intern(char._replace(**replace))
+        if len(self._transitions) >= self.size:
+            self._transitions.clear()
+        self._transitions[key] = selected
+        return selected
+
+    def cells(self, char):
+        """Returns the dict of cells drawn with the attributes of
+        ``char``, by their data.
+        """
+        entry = self._cells.get(id(char))
+        if entry is None or entry[0] is not char:
+            if len(self._cells) >= self.size:
+                self._cells.clear()
+            entry = self._cells[id(char)] = char, {}
+        return entry[1]
+
+
+#: Array type for code points, which don't fit in a byte.
+_WIDE_CODE = "I" if array("I").itemsize == 4 else "L"
+
+#: Encoding of text as an array of :data:`_WIDE_CODE` items.
+_UTF32 = "utf-32-le" if sys.byteorder == "little" else "utf-32-be"
+
+#: Number of distinct attributes a :class:`CellAttributes` table holds.
+_MAX_ATTRIBUTES = 0x10000
+
+
+class CellAttributes(object):
+    """Table of the distinct cell attributes of a screen, which the
+    cells of :class:`CompactLine` refer to by index.
+
+    Attributes are everything in a :class:`Char` but its data; once
+    the table is full, new attributes fall back to the first entry.
+    """
+    def __init__(self):
+        #: A blank :class:`Char` with the attributes of each index.
+        self.chars = []
+        #: The :data:`Run` attributes of each index.
+        self.run_keys = []
+        self._indices = {}
+
+        # Most recently looked up character, which is usually the
+        # cursor attributes again.
+        self._last = None, 0
+
+    def index(self, char):
+        """Returns the index of the attributes of ``char``."""
+        last = self._last
+        if char is last[0]:
+            return last[1]
+
+        key = char[1:]
+        index = self._indices.get(key)
+        if index is None:
+            if len(self.chars) == _MAX_ATTRIBUTES:
+                index = 0
+            else:
+                index = self._indices[key] = len(self.chars)
+                self.chars.append(char._replace(data=" "))
+                self.run_keys.append(_run_key(char))
+        self._last = char, index
+        return index
+
+    def char(self, code, index):
+        """Returns a :class:`Char` for a code point and attribute
+        index.
+        """
+        return self.chars[index]._replace(data=chr(code))
+
+
+class CompactLine(object):
+    """A line of cells kept as two arrays: the code point of each cell
+    and the index of its attributes in a :class:`CellAttributes` table.
+    Both arrays use a byte per cell, until a code point or index needs
+    more.
+
+    The line behaves like a :func:`list` of :class:`Char`, which are
+    created on access; the screen writes the arrays directly.
+
+    :param pyte.screens.CellAttributes table: attributes of the screen.
+    :param array codes: code point of each cell.
+    :param array attrs: attribute index of each cell.
+    """
+    __slots__ = ("table", "codes", "attrs")
+    __hash__ = None
+
+    def __init__(self, table, codes, attrs):
+        self.table = table
+        self.codes = codes
+        self.attrs = attrs
+
+    @classmethod
+    def filled(cls, table, char, count):
+        """Returns a line of ``count`` copies of ``char``."""
+        line = cls(table, array("B"), array("B"))
+        line.extend([char])
+        line.codes *= count
+        line.attrs *= count
+        return line
+
+    def __repr__(self):
+        return "{0}({1!r})".format(self.__class__.__name__, list(self))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        char = self.table.char
+        for code, index in zip(self.codes, self.attrs):
+            yield char(code, index)
+
+    def __eq__(self, other):
+        try:
+            return len(self) == len(other) and list(self) == list(other)
+        except TypeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __add__(self, other):
+        line = self[:]
+        line.extend(other)
+        return line
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return CompactLine(self.table, self.codes[index],
+                               self.attrs[index])
+        return self.table.char(self.codes[index], self.attrs[index])
+
+    def __setitem__(self, index, value):
+        if not isinstance(index, slice):
+            self.put(index, value.data, value)
+        elif isinstance(value, CompactLine) and value.table is self.table:
+            if index == slice(None):
+                self.codes, self.attrs = value.codes[:], value.attrs[:]
+            else:
+                self._assign(index, value.codes, value.attrs)
+        else:
+            value = list(value)
+            self._assign(index, [ord(char.data) for char in value],
+                         [self.table.index(char) for char in value])
+
+    def __delitem__(self, index):
+        del self.codes[index]
+        del self.attrs[index]
+
+    def append(self, char):
+        self.extend([char])
+
+    def extend(self, chars):
+        end = len(self)
+        self[end:end] = chars
+
+    def insert(self, index, char):
+        self[index:index] = [char]
+
+    def pop(self, index=-1):
+        char = self[index]
+        del self[index]
+        return char
+
+    def map_attrs(self, mapping):
+        """Replace the attribute index of each cell by its entry in the
+        ``mapping`` dict, keeping the code points.
+        """
+        attrs = [mapping[index] for index in self.attrs]
+        typecode = self.attrs.typecode
+        if typecode == "B" and attrs and max(attrs) > 0xff:
+            typecode = "H"
+        self.attrs = array(typecode, attrs)
+
+    def put(self, x, data, attrs):
+        """Set cell ``x`` to the character ``data`` with the attributes
+        of the :class:`Char` ``attrs``.
+        """
+        code = ord(data)
+        if code > 0xff and self.codes.typecode == "B":
+            self.codes = array(_WIDE_CODE, self.codes)
+        index = self.table.index(attrs)
+        if index > 0xff and self.attrs.typecode == "B":
+            self.attrs = array("H", self.attrs)
+        self.codes[x] = code
+        self.attrs[x] = index
+
+    def put_text(self, x, text, attrs):
+        """Set the cells from ``x`` on to the characters of ``text``
+        with the attributes of the :class:`Char` ``attrs``.
+        """
+        codes = None
+        if self.codes.typecode == "B":
+            try:
+                codes = array("B", text.encode("latin-1"))
+            except UnicodeEncodeError:
+                self.codes = array(_WIDE_CODE, self.codes)
+        if codes is None:
+            codes = array(self.codes.typecode, text.encode(_UTF32))
+        index = self.table.index(attrs)
+        if index > 0xff and self.attrs.typecode == "B":
+            self.attrs = array("H", self.attrs)
+
+        stop = x + len(text)
+        self.codes[x:stop] = codes
+        self.attrs[x:stop] = array(self.attrs.typecode, [index]) * len(text)
+
+    def fill(self, start, stop, char):
+        """Set the cells from ``start`` up to ``stop`` to ``char``."""
+        count = max(stop - start, 0)
+        self.put_text(start, char.data * count, char)
+
+    def text(self):
+        """Returns the characters of the line as a string."""
+        if self.codes.typecode == "B":
+            return self.codes.tobytes().decode("latin-1")
+        return self.codes.tobytes().decode(_UTF32)
+
+    def freeze(self):
+        """Returns the line encoded as :func:`bytes`, its text and the
+        runs of its attribute indices; see :meth:`thaw`.
+        """
+        runs = array("I")
+        for index, cells in groupby(self.attrs):
+            runs.append(index)
+            runs.append(sum(1 for _ in cells))
+        return marshal.dumps((self.text(), runs.tobytes()))
+
+    @staticmethod
+    def frozen_text(data):
+        """Returns the text of a line from the :func:`bytes` of
+        :meth:`freeze`, without thawing it.
+        """
+        return marshal.loads(data)[0]
+
+    @classmethod
+    def thaw(cls, table, data):
+        """Returns a line of the attributes ``table`` from the
+        :func:`bytes` of :meth:`freeze`.
+        """
+        text, runs = marshal.loads(data)
+        runs = array("I", runs)
+        try:
+            codes = array("B", text.encode("latin-1"))
+        except UnicodeEncodeError:
+            codes = array(_WIDE_CODE, text.encode(_UTF32))
+
+        indices = runs[::2]
+        attrs = array("B" if not indices or max(indices) <= 0xff else "H")
+        for index, count in zip(indices, runs[1::2]):
+            attrs += array(attrs.typecode, [index]) * count
+        return cls(table, codes, attrs)
+
+    def _assign(self, index, codes, attrs):
+        if self.codes.typecode == "B" and codes and max(codes) > 0xff:
+            self.codes = array(_WIDE_CODE, self.codes)
+        if self.attrs.typecode == "B" and attrs and max(attrs) > 0xff:
+            self.attrs = array("H", self.attrs)
+
+        if not isinstance(codes, array) or \
+                codes.typecode != self.codes.typecode:
+            codes = array(self.codes.typecode, codes)
+        if not isinstance(attrs, array) or \
+                attrs.typecode != self.attrs.typecode:
+            attrs = array(self.attrs.typecode, attrs)
+        self.codes[index] = codes
+        self.attrs[index] = attrs
+
+
+def _line_text(line):
+    """Returns the text of a line of the buffer."""
+    if isinstance(line, CompactLine):
+        return line.text()
+    return "".join([char.data for char in line])
+
+
 class Cursor(object):
     """Screen cursor.
 
@@ -106,6 +456,368 @@ class Cursor(object):
         self.hidden = False
 
 
+class Damage(object):
+    """Damaged cells of a screen, see :class:`DiffScreen`.
+
+    Damage is kept as sorted, non-overlapping ``(start, stop)`` column
+    ranges per line; ranges are merged, when they overlap or touch.
+    Damaging the whole screen only sets the :attr:`everything` flag.
+
+    Scrolling is recorded in :attr:`scrolls` as ``(top, bottom, count)``
+    operations, so that a renderer can move lines instead of redrawing
+    them; spans are always given in coordinates *after* all recorded
+    scrolls were applied.
+
+    For compatibility with the set of dirty line numbers this used to
+    be, iterating over damage yields the damaged line numbers, and
+    :meth:`add`, :meth:`update` and :meth:`clear` work like their
+    :class:`set` counterparts.
+
+    :param int lines: number of lines on the screen.
+    :param int columns: number of columns on the screen.
+    """
+    __hash__ = None
+
+    def __init__(self, lines, columns):
+        self.lines = lines
+        self.columns = columns
+        self.everything = False
+        self.spans = {}
+        self.scrolls = []
+
+        # Scrolling region, which is damaged completely, so that more
+        # scrolling in it needs no bookkeeping.
+        self._flooded = None
+
+    def __repr__(self):
+        return "{0}({1})".format(self.__class__.__name__, sorted(self))
+
+    def __iter__(self):
+        if self.everything:
+            return iter(range(self.lines))
+        return iter(self.spans)
+
+    def __len__(self):
+        return self.lines if self.everything else len(self.spans)
+
+    def __contains__(self, line):
+        if self.everything:
+            return 0 <= line < self.lines
+        return line in self.spans
+
+    def __eq__(self, other):
+        if isinstance(other, Damage):
+            return self.line_spans() == other.line_spans()
+        return set(self) == set(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def add(self, line, start=0, stop=None):
+        """Damage columns ``start`` to ``stop`` (exclusive) of a line,
+        the whole line by default.
+        """
+        if self.everything:
+            return
+
+        if stop is None or stop > self.columns:
+            stop = self.columns
+        if start < 0:
+            start = 0
+        if start >= stop:
+            return
+
+        spans = self.spans.get(line)
+        if spans is None:
+            self.spans[line] = [(start, stop)]
+            return
+
+        merged = []
+        for span in spans:
+            if span[1] < start or span[0] > stop:
+                merged.append(span)
+            else:
+                start, stop = min(start, span[0]), max(stop, span[1])
+        merged.append((start, stop))
+        merged.sort()
+        self.spans[line] = merged
+
+    def update(self, lines):
+        """Damage every line in ``lines`` completely."""
+        if not self.everything:
+            for line in lines:
+                self.spans[line] = [(0, self.columns)]
+
+    def scroll(self, top, bottom, count):
+        """Record lines ``top`` to ``bottom`` (inclusive) moving up by
+        ``count`` lines, or down if ``count`` is negative. Damage moves
+        along and the lines scrolled in are damaged completely.
+        """
+        if self.everything or self._flooded == (top, bottom):
+            return
+
+        self._flooded = None
+        size = bottom - top + 1
+        if self.scrolls and self.scrolls[-1][:2] == (top, bottom) and \
+                (self.scrolls[-1][2] > 0) == (count > 0):
+            # Merge with the previous scroll of the same region, it
+            # only holds the total.
+            top, bottom, total = self.scrolls.pop()
+            total += count
+        else:
+            total = count
+
+        if len(self.scrolls) >= self.lines:
+            self.mark_all()
+            return
+        elif abs(total) >= size:
+            # Every line in the region is replaced anyway.
+            if size == self.lines:
+                self.mark_all()
+            else:
+                self.update(range(top, bottom + 1))
+                self._flooded = top, bottom
+            return
+
+        spans = self.spans
+        moved = [(line - count, spans.pop(line))
+                 for line in [line for line in spans if top <= line <= bottom]]
+        spans.update((line, span) for line, span in moved
+                     if top <= line <= bottom)
+
+        if count > 0:
+            self.update(range(bottom - count + 1, bottom + 1))
+        else:
+            self.update(range(top, top - count))
+        self.scrolls.append((top, bottom, total))
+
+    def mark_all(self):
+        """Damage the whole screen in constant time."""
+        self.everything = True
+        self.spans.clear()
+        del self.scrolls[:]
+
+    def clear(self):
+        """Forget all damage."""
+        self.everything = False
+        self.spans.clear()
+        del self.scrolls[:]
+        self._flooded = None
+
+    def resize(self, lines, columns):
+        """Update screen dimensions and damage the whole screen."""
+        self.lines, self.columns = lines, columns
+        self.mark_all()
+
+    def line_spans(self):
+        """Returns a :func:`dict` mapping each damaged line to a list
+        of damaged ``(start, stop)`` column ranges.
+        """
+        if self.everything:
+            whole = [(0, self.columns)]
+            return dict((line, list(whole)) for line in range(self.lines))
+        return dict((line, list(spans)) for line, spans in
+                    self.spans.items() if line < self.lines)
+
+
+def _scan_runs(line, start=0, stop=None):
+    """Returns the runs of cells ``start`` to ``stop`` of a line."""
+    if isinstance(line, CompactLine):
+        return _scan_compact_runs(line, start, stop)
+
+    runs = []
+    for key, cells in groupby(islice(line, start, stop), _run_key):
+        length = sum(1 for _ in cells)
+        runs.append(Run(start, length, *key))
+        start += length
+    return runs
+
+
+def _scan_compact_runs(line, start, stop):
+    """Same as :func:`_scan_runs` for a :class:`CompactLine`, going by
+    the attribute indices instead of creating characters.
+    """
+    keys = line.table.run_keys
+    runs = []
+    for index, cells in groupby(line.attrs[start:stop]):
+        length = sum(1 for _ in cells)
+        key = keys[index]
+        if runs and runs[-1][2:] == key:
+            # Different attributes, but the same colors.
+            runs[-1] = runs[-1]._replace(length=runs[-1].length + length)
+        else:
+            runs.append(Run(start, length, *key))
+        start += length
+    return runs
+
+
+def _splice_runs(runs, start, stop, new):
+    """Returns a copy of ``runs`` with columns ``start`` to ``stop``
+    replaced by ``new`` runs; neighbouring runs with the same
+    attributes are merged.
+    """
+    spliced, after = [], []
+    for run in runs:
+        end = run.start + run.length
+        if end <= start:
+            spliced.append(run)
+        elif run.start >= stop:
+            after.append(run)
+        else:
+            if run.start < start:
+                spliced.append(run._replace(length=start - run.start))
+            if end > stop:
+                after.append(run._replace(start=stop, length=end - stop))
+
+    for run in new + after:
+        if spliced and spliced[-1][2:] == run[2:]:
+            spliced[-1] = spliced[-1]._replace(
+                length=spliced[-1].length + run.length)
+        else:
+            spliced.append(run)
+    return spliced
+
+
+def _scroll_lines(lines, top, bottom, count, blank):
+    """Move items ``top`` to ``bottom`` (inclusive) of a list up by
+    ``count``, or down if ``count`` is negative, the same way the lines
+    of the buffer move; the items scrolled in are ``blank``.
+    """
+    size = bottom - top + 1
+    count = max(-size, min(size, count))
+    if count == 1:
+        lines.pop(top)
+        lines.insert(bottom, blank)
+    elif count == -1:
+        lines.pop(bottom)
+        lines.insert(top, blank)
+    elif count > 0:
+        lines[top:bottom + 1] = lines[top + count:bottom + 1] + \
+            [blank] * count
+    elif count < 0:
+        lines[top:bottom + 1] = [blank] * -count + \
+            lines[top:bottom + 1 + count]
+
+
+class AttributeRuns(object):
+    """Colors of the cells of a screen, see :class:`DiffScreen`.
+
+    Every line is kept as a list of :data:`Run` tuples, which cover
+    all of its columns; consecutive runs always differ in attributes.
+    Runs are updated along with the screen, so that reading the colors
+    of a line takes time in the number of runs, not columns.
+
+    :param int columns: number of columns on the screen.
+    """
+    def __init__(self, columns):
+        self.columns = columns
+        self.lines = []
+
+        # Runs of the most recent blank line, see :meth:`scroll`.
+        self._blank = None, None
+
+    def __getitem__(self, line):
+        return self.lines[line]
+
+    def __len__(self):
+        return len(self.lines)
+
+    def rebuild(self, buffer, columns=None):
+        """Scan every line of the buffer again, optionally for a new
+        number of columns.
+        """
+        if columns is not None:
+            self.columns = columns
+        self.lines = [_scan_runs(line) for line in buffer]
+
+    def scan(self, line, cells, start=0, stop=None):
+        """Update columns ``start`` to ``stop`` of a line from its
+        ``cells``; for changes, which aren't uniform.
+        """
+        if stop is None and start <= 0:
+            self.lines[line] = _scan_runs(cells)
+            return
+
+        if stop is None or stop > len(cells):
+            stop = len(cells)
+        start = max(start, 0)
+        if start < stop:
+            self.lines[line] = _splice_runs(
+                self.lines[line], start, stop, _scan_runs(cells, start, stop))
+
+    def set(self, line, start, stop, char):
+        """Columns ``start`` to ``stop`` of a line changed to cells with
+        the attributes of ``char``.
+        """
+        stop = min(stop, self.columns)
+        if start >= stop:
+            return
+
+        key = _run_key(char)
+        runs = self.lines[line]
+        for run in runs:
+            if run.start + run.length > start:
+                # Nothing changes, if a single run already covers it.
+                if run.start + run.length >= stop and run[2:] == key:
+                    return
+                break
+
+        self.lines[line] = _splice_runs(
+            runs, start, stop, [Run(start, stop - start, *key)])
+
+    def scroll(self, top, bottom, count, char):
+        """Move lines ``top`` to ``bottom`` (inclusive) up by ``count``
+        lines, or down if ``count`` is negative, just like the buffer.
+        The lines scrolled in are blank with the attributes of ``char``.
+        """
+        blank = self._blank[1]
+        if self._blank[0] is not char or blank[0].length != self.columns:
+            blank = [Run(0, self.columns, *_run_key(char))]
+            self._blank = char, blank
+        _scroll_lines(self.lines, top, bottom, count, blank)
+
+
+class DisplayCache(object):
+    """Text of the lines of a screen, see :class:`DiffScreen`.
+
+    A line is joined from its characters only when its text is asked
+    for after the line changed; scrolling moves the cached text along
+    with the lines.
+    """
+    def __init__(self):
+        self.lines = []
+
+    def reset(self, lines):
+        """Forget the text of all lines, for a screen of ``lines``
+        lines.
+        """
+        self.lines = [None] * lines
+
+    def invalidate(self, line):
+        """Forget the text of a line, which changed."""
+        self.lines[line] = None
+
+    def scroll(self, top, bottom, count):
+        """Move the text of lines ``top`` to ``bottom`` (inclusive) up
+        by ``count`` lines, or down if ``count`` is negative.
+        """
+        _scroll_lines(self.lines, top, bottom, count, None)
+
+    def text(self, buffer, line):
+        """Returns the text of a line of the buffer."""
+        text = self.lines[line]
+        if text is None:
+            text = self.lines[line] = _line_text(buffer[line])
+        return text
+
+    def display(self, buffer):
+        """Returns the text of every line of the buffer."""
+        for line, text in enumerate(self.lines):
+            if text is None:
+                self.text(buffer, line)
+        return list(self.lines)
+
+
 class Screen(object):
     """
     A screen is an in-memory matrix of characters that represents the
@@ -132,6 +844,12 @@ class Screen(object):
        Current charset number; can be either ``0`` or ``1`` for `G0`
        and `G1` respectively, note that `G0` is activated by default.
 
+    .. attribute:: wrapped
+
+       A :func:`list` with a flag for each line of :attr:`buffer`,
+       which is ``True`` if the line was soft-wrapped: the text drawn
+       past its right margin continues on the next line.
+
     .. note::
 
        According to ``ECMA-48`` standard, **lines and columns are
@@ -151,6 +869,13 @@ class Screen(object):
        **beginning** of the next line, which is the behaviour described
        in ``man console_codes``.
 
+    .. versionchanged:: 0.5.3
+
+       With :attr:`compact` set, the lines of :attr:`buffer` are
+       :class:`CompactLine` arrays instead of lists of
+       :class:`~pyte.screens.Char`. Soft-wrapped lines are flagged in
+       :attr:`wrapped`.
+
     .. seealso::
 
        `Standard ECMA-48, Section 6.1.1 \
@@ -166,11 +891,22 @@ class Screen(object):
     #: new lines and columns.
     default_line = repeat(default_char)
 
+    #: Keep the lines of :attr:`buffer` as :class:`CompactLine` arrays,
+    #: which take a fraction of the memory of lists of characters.
+    compact = False
+
     def __init__(self, columns, lines):
+        #: The :class:`CellAttributes` of the lines, when :attr:`compact`.
+        self.attributes = CellAttributes() if self.compact else None
+        #: The :class:`Renditions` of the cursor attributes.
+        self.renditions = Renditions()
         self.savepoints = []
         self.columns = columns
         self.lines = lines
         self.buffer = []
+        self.wrapped = []
+        self.spare_lines = []
+        self._blank = []
         self.reset()
 
     def __repr__(self):
@@ -194,8 +930,7 @@ class Screen(object):
     @property
     def display(self):
         """Returns a :func:`list` of screen lines as unicode strings."""
-        return ["".join(map(operator.attrgetter("data"), line))
-                for line in self.buffer]
+        return [_line_text(line) for line in self.buffer]
 
     def reset(self):
         """Resets the terminal to its initial state.
@@ -213,8 +948,8 @@ class Screen(object):
            and tabstops should be reset as well, thanks to
            :manpage:`xterm` -- we now know that.
         """
-        self.buffer[:] = (take(self.columns, self.default_line)
-                          for _ in range(self.lines))
+        self.buffer[:] = [self.blank_line() for _ in range(self.lines)]
+        self.wrapped[:] = [False] * self.lines
         self.mode = set([mo.DECAWM, mo.DECTCEM])
         self.margins = Margins(0, self.lines - 1)
 
@@ -230,9 +965,12 @@ class Screen(object):
         # we aim to support VT102 / VT220 and linux -- we use n = 8.
         self.tabstops = set(range(7, self.columns, 8))
 
-        self.cursor = Cursor(0, 0)
+        self.cursor = Cursor(0, 0, self.renditions.intern(Char(" ")))
         self.cursor_position()
 
+        self.title = ""
+        self.icon_name = ""
+
     def resize(self, lines=None, columns=None):
         """Resize the screen to the given dimensions.
 
@@ -259,12 +997,13 @@ class Screen(object):
         # a) if the current display size is less than the requested
         #    size, add lines to the bottom.
         if diff < 0:
-            self.buffer.extend(take(self.columns, self.default_line)
-                               for _ in range(diff, 0))
+            self.buffer.extend(self.blank_line() for _ in range(diff, 0))
+            self.wrapped.extend(False for _ in range(diff, 0))
         # b) if the current display size is greater than requested
         #    size, take lines off the top.
         elif diff > 0:
             self.buffer[:diff] = ()
+            self.wrapped[:diff] = ()
 
         # Then resize the columns:
         diff = self.columns - columns
@@ -354,8 +1093,7 @@ class Screen(object):
 
         # Mark all displayed characters as reverse.
         if mo.DECSCNM in modes:
-            self.buffer[:] = ([char._replace(reverse=True) for char in line]
-                              for line in self.buffer)
+            self._set_reverse(True)
             self.select_graphic_rendition(g._SGR["+reverse"])
 
         # Make the cursor visible.
@@ -385,14 +1123,32 @@ class Screen(object):
             self.cursor_position()
 
         if mo.DECSCNM in modes:
-            self.buffer[:] = ([char._replace(reverse=False) for char in line]
-                              for line in self.buffer)
+            self._set_reverse(False)
             self.select_graphic_rendition(g._SGR["-reverse"])
 
         # Hide the cursor.
         if mo.DECTCEM in modes:
             self.cursor.hidden = True
 
+    def _set_reverse(self, reverse):
+        """Sets the reverse attribute of every character of
+        :attr:`buffer`, changing the lines in place.
+        """
+        if not self.compact:
+            for line in self.buffer:
+                line[:] = [char._replace(reverse=reverse) for char in line]
+            return
+
+        # Each attribute index maps to the index of its reversed
+        # counterpart, looked up once for the whole screen.
+        table = self.attributes
+        mapping = {}
+        for line in self.buffer:
+            for index in set(line.attrs) - set(mapping):
+                mapping[index] = table.index(
+                    table.chars[index]._replace(reverse=reverse))
+            line.map_attrs(mapping)
+
     def shift_in(self):
         """Activates ``G0`` character set."""
         self.charset = 0
@@ -430,6 +1186,7 @@ class Screen(object):
         # entered.
         if self.cursor.x == self.columns:
             if mo.DECAWM in self.mode:
+                self.wrapped[self.cursor.y] = True
                 self.carriage_return()
                 self.linefeed()
             else:
@@ -442,28 +1199,172 @@ class Screen(object):
             self.insert_characters(char_width)
 
         line = self.buffer[self.cursor.y]
-        line[self.cursor.x] = self.cursor.attrs._replace(data=char)
+        if self.compact:
+            line.put(self.cursor.x, char, self.cursor.attrs)
+        else:
+            line[self.cursor.x] = self.cursor.attrs._replace(data=char)
         if char_width > 1:
             # Add a stub *after* a two-cell character. See issue #9 on GitHub.
-            line[self.cursor.x + 1] = self.cursor.attrs._replace(data=" ")
+            if self.compact:
+                line.put(self.cursor.x + 1, " ", self.cursor.attrs)
+            else:
+                line[self.cursor.x + 1] = self.cursor.attrs._replace(data=" ")
 
         # .. note:: We can't use :meth:`cursor_forward()`, because that
         #           way, we'll never know when to linefeed.
         self.cursor.x += char_width
 
+    def draw_text(self, text):
+        """Display a run of characters starting at the current cursor
+        position. The result is the same as calling :meth:`draw` for
+        each character, but printable ASCII is written a line slice at
+        a time.
+
+        :param str text: a run of characters without control codes.
+        """
+        for ascii_run, char in _ASCII_RUN_OR_CHAR.findall(text):
+            if char:
+                self.draw(char)
+            elif mo.IRM in self.mode:
+                for char in ascii_run:
+                    self.draw(char)
+            else:
+                self._draw_ascii(ascii_run)
+
+    def _draw_ascii(self, text):
+        """Write a run of printable ASCII characters, wrapping at the
+        right margin in bulk.
+
+        .. note:: Every printable ASCII character is single width in all
+                  of the supported charsets, so no :func:`wcwidth` calls
+                  are needed here.
+        """
+        if self.charset:
+            text = text.translate(self.g1_charset)
+        else:
+            text = text.translate(self.g0_charset)
+
+        # Cells drawn with the same attributes are shared, so there is
+        # only one cell object per distinct character and attributes.
+        # Compact lines take the text as it is.
+        attrs = self.cursor.attrs
+        if self.compact:
+            cells = text
+        else:
+            cache = self.renditions.cells(attrs)
+            for char in set(text).difference(cache):
+                cache[char] = attrs._replace(data=char)
+            cells = [cache[char] for char in text]
+
+        cursor = self.cursor
+        columns = self.columns
+        autowrap = mo.DECAWM in self.mode
+        pos, end = 0, len(cells)
+        while pos < end:
+            if cursor.x == columns:
+                if autowrap:
+                    self.wrapped[cursor.y] = True
+                    self.carriage_return()
+                    self.linefeed()
+                else:
+                    # Without auto wrap each character replaces the
+                    # previous one in the last column, so only the last
+                    # character of the run remains visible.
+                    cursor.x -= 1
+                    pos = end - 1
+
+            count = min(end - pos, columns - cursor.x)
+            if self.compact:
+                self.buffer[cursor.y].put_text(cursor.x,
+                                               cells[pos:pos + count], attrs)
+            else:
+                self.buffer[cursor.y][cursor.x:cursor.x + count] = \
+                    cells[pos:pos + count]
+            cursor.x += count
+            pos += count
+
     def carriage_return(self):
         """Move the cursor to the beginning of the current line."""
         self.cursor.x = 0
 
+    def blank_line(self, char=None):
+        """Returns a line of :attr:`columns` blank characters, reusing
+        one of the :attr:`spare_lines` if there is any.
+
+        :param pyte.screens.Char char: character to fill the line with,
+                                       :attr:`default_char` if omitted.
+        """
+        if char is not None:
+            return self._filled_line(char)
+
+        blank = self._blank
+        if len(blank) != self.columns:
+            blank = self._blank = self._filled_line(self.default_char)
+
+        if self.spare_lines:
+            line = self.spare_lines.pop()
+            line[:] = blank
+            return line
+
+        return blank[:]
+
+    def _filled_line(self, char):
+        """Returns a new line of :attr:`columns` copies of ``char``."""
+        if self.compact:
+            return CompactLine.filled(self.attributes, char, self.columns)
+        return [char] * self.columns
+
+    def _fill(self, line, start, stop, char):
+        """Sets the cells of ``line`` from ``start`` up to ``stop`` to
+        ``char``.
+        """
+        if self.compact:
+            line.fill(start, stop, char)
+        else:
+            line[start:stop] = [char] * (stop - start)
+
+    def release_line(self, line):
+        """Hands a line, which is no longer referenced by anything, back
+        to the screen, so that :meth:`blank_line` can reuse it instead
+        of allocating a new one.
+
+        :param list line: a line, which left the screen for good.
+        """
+        if len(self.spare_lines) < self.lines:
+            self.spare_lines.append(line)
+
+    def line_scrolled_off(self, line, top):
+        """Hook, called with every line :meth:`index` and
+        :meth:`reverse_index` scroll out of the scrolling region. The
+        line is released for reuse by default.
+
+        :param list line: the line, which was removed from the screen.
+        :param bool top: ``True`` if the line left over the top margin,
+                         ``False`` if it left over the bottom one.
+
+        .. note:: :attr:`wrapped` is only updated after the hook, so
+                  the flag of the line is still at the margin it left
+                  over.
+        """
+        self.release_line(line)
+
     def index(self):
         """Move the cursor down one line in the same column. If the
         cursor is at the last line, create a new line at the bottom.
+
+        .. versionchanged:: 0.5.3
+
+           Scrolling only moves line references around, the new line
+           reuses the one scrolled off, unless someone else kept it,
+           see :meth:`line_scrolled_off`.
         """
         top, bottom = self.margins
 
         if self.cursor.y == bottom:
-            self.buffer.pop(top)
-            self.buffer.insert(bottom, take(self.columns, self.default_line))
+            buffer = self.buffer
+            self.line_scrolled_off(buffer.pop(top), True)
+            buffer.insert(bottom, self.blank_line())
+            _scroll_lines(self.wrapped, top, bottom, 1, False)
         else:
             self.cursor_down()
 
@@ -474,8 +1375,10 @@ class Screen(object):
         top, bottom = self.margins
 
         if self.cursor.y == top:
-            self.buffer.pop(bottom)
-            self.buffer.insert(top, take(self.columns, self.default_line))
+            buffer = self.buffer
+            self.line_scrolled_off(buffer.pop(bottom), False)
+            buffer.insert(top, self.blank_line())
+            _scroll_lines(self.wrapped, top, bottom, -1, False)
         else:
             self.cursor_up()
 
@@ -554,11 +1457,15 @@ class Screen(object):
 
         # If cursor is outside scrolling margins it -- do nothin'.
         if top <= self.cursor.y <= bottom:
-            #                           v +1, because range() is exclusive.
-            for line in range(self.cursor.y,
-                              min(bottom + 1, self.cursor.y + count)):
-                self.buffer.pop(bottom)
-                self.buffer.insert(line, take(self.columns, self.default_line))
+            #                v -- +1 to include the bottom margin.
+            count = min(bottom - self.cursor.y + 1, count)
+            buffer, y = self.buffer, self.cursor.y
+            for line in buffer[bottom + 1 - count:bottom + 1]:
+                self.release_line(line)
+
+            buffer[y:bottom + 1] = [self.blank_line() for _ in range(count)] \
+                + buffer[y:bottom + 1 - count]
+            _scroll_lines(self.wrapped, y, bottom, -count, False)
 
             self.carriage_return()
 
@@ -576,10 +1483,15 @@ class Screen(object):
         # If cursor is outside scrolling margins it -- do nothin'.
         if top <= self.cursor.y <= bottom:
             #                v -- +1 to include the bottom margin.
-            for _ in range(min(bottom - self.cursor.y + 1, count)):
-                self.buffer.pop(self.cursor.y)
-                self.buffer.insert(bottom, list(
-                    repeat(self.cursor.attrs, self.columns)))
+            count = min(bottom - self.cursor.y + 1, count)
+            buffer, y = self.buffer, self.cursor.y
+            for line in buffer[y:y + count]:
+                self.release_line(line)
+
+            buffer[y:bottom + 1] = buffer[y + count:bottom + 1] + [
+                self.blank_line(self.cursor.attrs) for _ in range(count)
+            ]
+            _scroll_lines(self.wrapped, y, bottom, count, False)
 
             self.carriage_return()
 
@@ -627,9 +1539,8 @@ class Screen(object):
         """
         count = count or 1
 
-        for column in range(self.cursor.x,
-                            min(self.cursor.x + count, self.columns)):
-            self.buffer[self.cursor.y][column] = self.cursor.attrs
+        self._fill(self.buffer[self.cursor.y], self.cursor.x,
+                   min(self.cursor.x + count, self.columns), self.cursor.attrs)
 
     def erase_in_line(self, how=0, private=False):
         """Erases a line in a specific way.
@@ -647,17 +1558,18 @@ class Screen(object):
         if how == 0:
             # a) erase from the cursor to the end of line, including
             #    the cursor,
-            interval = range(self.cursor.x, self.columns)
+            start, stop = self.cursor.x, self.columns
         elif how == 1:
             # b) erase from the beginning of the line to the cursor,
             #    including it,
-            interval = range(self.cursor.x + 1)
+            start, stop = 0, min(self.cursor.x + 1, self.columns)
         elif how == 2:
             # c) erase the entire line.
-            interval = range(self.columns)
+            start, stop = 0, self.columns
 
-        for column in interval:
-            self.buffer[self.cursor.y][column] = self.cursor.attrs
+        self._fill(self.buffer[self.cursor.y], start, stop, self.cursor.attrs)
+        if stop == self.columns:
+            self.wrapped[self.cursor.y] = False
 
     def erase_in_display(self, how=0, private=False):
         """Erases display in a specific way.
@@ -686,8 +1598,8 @@ class Screen(object):
             interval = range(self.lines)
 
         for line in interval:
-            self.buffer[line][:] = \
-                (self.cursor.attrs for _ in range(self.columns))
+            self._fill(self.buffer[line], 0, self.columns, self.cursor.attrs)
+            self.wrapped[line] = False
 
         # In case of 0 or 1 we have to erase the line with the cursor.
         if how == 0 or how == 1:
@@ -838,6 +1750,22 @@ class Screen(object):
         provided by the end-user.
         """
 
+    def set_title(self, param):
+        """Sets terminal title.
+
+        .. note:: This is an XTerm extension supported by the Linux
+                  terminal, see :class:`~pyte.streams.VT500Stream`.
+        """
+        self.title = param
+
+    def set_icon_name(self, param):
+        """Sets icon name.
+
+        .. note:: This is an XTerm extension supported by the Linux
+                  terminal, see :class:`~pyte.streams.VT500Stream`.
+        """
+        self.icon_name = param
+
     def alignment_display(self):
         """Fills screen with uppercase E's for screen focus and alignment."""
         for line in self.buffer:
@@ -848,21 +1776,13 @@ class Screen(object):
         """Set display attributes.
 
         :param list attrs: a list of display attributes to set.
-        """
-        replace = {}
 
-        for attr in attrs or [0]:
-            if attr in g.FG:
-                replace["fg"] = g.FG[attr]
-            elif attr in g.BG:
-                replace["bg"] = g.BG[attr]
-            elif attr in g.TEXT:
-                attr = g.TEXT[attr]
-                replace[attr[1:]] = attr.startswith("+")
-            elif not attr:
-                replace = self.default_char._asdict()
+        .. versionchanged:: 0.5.3
 
-        self.cursor.attrs = self.cursor.attrs._replace(**replace)
+           Attributes are shared through :attr:`renditions`.
+        """
+        self.cursor.attrs = self.renditions.select(
+            self.cursor.attrs, attrs, self.default_char)
 
     def report_device_attributes(self, mode=0, **kwargs):
         """Reports terminal identity.
@@ -905,98 +1825,238 @@ class Screen(object):
 
 
 class DiffScreen(Screen):
-    """A screen subclass, which maintains a set of dirty lines in its
-    :attr:`dirty` attribute. The end user is responsible for emptying
-    a set, when a diff is applied.
+    """A screen subclass, which maintains the damaged parts of the
+    screen in its :attr:`dirty` attribute. The end user is responsible
+    for clearing it, when a diff is applied.
 
     .. attribute:: dirty
 
-       A set of line numbers, which should be re-drawn.
+       A :class:`Damage` instance; iterating over it yields the line
+       numbers, which should be re-drawn.
 
        >>> screen = DiffScreen(80, 24)
        >>> screen.dirty.clear()
        >>> screen.draw(u"!")
        >>> screen.dirty
-       set([0])
+       Damage([0])
+       >>> screen.dirty.line_spans()
+       {0: [(0, 1)]}
+
+    .. attribute:: runs
+
+       An :class:`AttributeRuns` instance with the colors of each line.
+
+    .. attribute:: display_cache
+
+       A :class:`DisplayCache` instance with the text of each line,
+       which backs :attr:`display`.
+
+    .. versionchanged:: 0.5.3
+
+       Damage is tracked per column range, scrolling and other whole
+       screen changes are recorded in constant time. Attribute runs and
+       the text of each line are kept up to date with the damage.
     """
-    def __init__(self, *args):
-        self.dirty = set()
-        super(DiffScreen, self).__init__(*args)
+    def __init__(self, columns, lines):
+        self.dirty = Damage(lines, columns)
+        self.runs = AttributeRuns(columns)
+        self.display_cache = DisplayCache()
+
+        # Line and column the text run being drawn continues from, see
+        # :meth:`draw_text` and :meth:`index`.
+        self._run_start = None
+        super(DiffScreen, self).__init__(columns, lines)
 
     def set_mode(self, *modes, **kwargs):
         if mo.DECSCNM >> 5 in modes and kwargs.get("private"):
-            self.dirty.update(range(self.lines))
+            self.dirty.mark_all()
         super(DiffScreen, self).set_mode(*modes, **kwargs)
+        if mo.DECSCNM >> 5 in modes and kwargs.get("private"):
+            self.runs.rebuild(self.buffer)
 
     def reset_mode(self, *modes, **kwargs):
         if mo.DECSCNM >> 5 in modes and kwargs.get("private"):
-            self.dirty.update(range(self.lines))
+            self.dirty.mark_all()
         super(DiffScreen, self).reset_mode(*modes, **kwargs)
+        if mo.DECSCNM >> 5 in modes and kwargs.get("private"):
+            self.runs.rebuild(self.buffer)
+
+    @property
+    def display(self):
+        """Returns a :func:`list` of screen lines as unicode strings;
+        only the lines, which changed, are joined again.
+        """
+        return self.display_cache.display(self.buffer)
 
     def reset(self):
-        self.dirty.update(range(self.lines))
+        self.dirty.mark_all()
         super(DiffScreen, self).reset()
+        self.runs.rebuild(self.buffer)
+        self.display_cache.reset(self.lines)
 
     def resize(self, *args, **kwargs):
-        self.dirty.update(range(self.lines))
         super(DiffScreen, self).resize(*args, **kwargs)
+        self.dirty.resize(self.lines, self.columns)
+        self.runs.rebuild(self.buffer, self.columns)
+        self.display_cache.reset(self.lines)
 
     def draw(self, *args):
-        # Call the superclass's method before marking the row as
+        # Call the superclass's method before marking the cells as
         # dirty, as when wrapping is enabled, draw() might change
         # self.cursor.y.
+        y, x = self.cursor.y, self.cursor.x
         super(DiffScreen, self).draw(*args)
-        self.dirty.add(self.cursor.y)
+        if self.cursor.y != y or self.cursor.x < x:
+            # Wrapped, below the bottom margin onto the same line.
+            x = 0
+        elif x == self.columns:
+            # Without auto wrap the last column is overwritten.
+            x = self.columns - 2
+        self.dirty.add(self.cursor.y, x, self.cursor.x)
+        self.runs.scan(self.cursor.y, self.buffer[self.cursor.y],
+                       x, self.cursor.x)
+        self.display_cache.invalidate(self.cursor.y)
+
+    def _text_drawn(self, line, start, stop):
+        """Update the runs and text of a line, which a text run was
+        drawn on.
+        """
+        self.display_cache.invalidate(line)
+        if start < self.columns - 2:
+            self.runs.set(line, start, stop, self.cursor.attrs)
+        else:
+            # The run may have started after ``start``, see draw_text().
+            self.runs.scan(line, self.buffer[line], start, stop)
+
+    def draw_text(self, text):
+        # Lines completed by wrapping are damaged by index(), before
+        # they scroll; the rest of the run is damaged from where the
+        # last line was started to the cursor.
+        self._run_start = run_start = \
+            [self.cursor.y, min(self.cursor.x, self.columns - 2)]
+        super(DiffScreen, self).draw_text(text)
+        self._run_start = None
+
+        y, x = run_start
+        if self.cursor.y == y and self.cursor.x >= x:
+            self.dirty.add(y, x, self.cursor.x)
+            self._text_drawn(y, x, self.cursor.x)
+            return
+        elif self.cursor.y > y:
+            self.dirty.add(y, x)
+            self.dirty.update(range(y + 1, self.cursor.y))
+            self.dirty.add(self.cursor.y, 0, self.cursor.x)
+            lines = range(y, self.cursor.y + 1)
+        else:
+            # Wrapped below the bottom margin, where linefeeds move
+            # the cursor back into the scrolling region.
+            self.dirty.update(range(self.cursor.y, y + 1))
+            lines = range(self.cursor.y, y + 1)
+
+        for line in lines:
+            self.runs.scan(line, self.buffer[line])
+            self.display_cache.invalidate(line)
 
     def index(self):
-        if self.cursor.y == self.margins.bottom:
-            self.dirty.update(range(self.lines))
+        run_start = self._run_start
+        if run_start is not None:
+            self.dirty.add(run_start[0], run_start[1])
+            self._text_drawn(run_start[0], run_start[1], self.columns)
+
+        top, bottom = self.margins
+        if self.cursor.y == bottom:
+            self.dirty.scroll(top, bottom, 1)
+            self.runs.scroll(top, bottom, 1, self.default_char)
+            self.display_cache.scroll(top, bottom, 1)
 
         super(DiffScreen, self).index()
 
+        if run_start is not None:
+            run_start[:] = self.cursor.y, 0
+
     def reverse_index(self):
-        if self.cursor.y == self.margins.top:
-            self.dirty.update(range(self.lines))
+        top, bottom = self.margins
+        if self.cursor.y == top:
+            self.dirty.scroll(top, bottom, -1)
+            self.runs.scroll(top, bottom, -1, self.default_char)
+            self.display_cache.scroll(top, bottom, -1)
 
         super(DiffScreen, self).reverse_index()
 
-    def insert_lines(self, *args):
-        self.dirty.update(range(self.cursor.y, self.lines))
-        super(DiffScreen, self).insert_lines(*args)
+    def insert_lines(self, count=None):
+        top, bottom = self.margins
+        if top <= self.cursor.y <= bottom:
+            self.dirty.scroll(self.cursor.y, bottom, -(count or 1))
+            self.runs.scroll(self.cursor.y, bottom, -(count or 1),
+                             self.default_char)
+            self.display_cache.scroll(self.cursor.y, bottom, -(count or 1))
+        super(DiffScreen, self).insert_lines(count)
 
-    def delete_lines(self, *args):
-        self.dirty.update(range(self.cursor.y, self.lines))
-        super(DiffScreen, self).delete_lines(*args)
+    def delete_lines(self, count=None):
+        top, bottom = self.margins
+        if top <= self.cursor.y <= bottom:
+            self.dirty.scroll(self.cursor.y, bottom, count or 1)
+            self.runs.scroll(self.cursor.y, bottom, count or 1,
+                             self.cursor.attrs)
+            self.display_cache.scroll(self.cursor.y, bottom, count or 1)
+        super(DiffScreen, self).delete_lines(count)
 
     def insert_characters(self, *args):
-        self.dirty.add(self.cursor.y)
+        self.dirty.add(self.cursor.y, self.cursor.x)
         super(DiffScreen, self).insert_characters(*args)
+        self.runs.scan(self.cursor.y, self.buffer[self.cursor.y],
+                       self.cursor.x)
+        self.display_cache.invalidate(self.cursor.y)
 
     def delete_characters(self, *args):
-        self.dirty.add(self.cursor.y)
+        self.dirty.add(self.cursor.y, self.cursor.x)
         super(DiffScreen, self).delete_characters(*args)
+        self.runs.scan(self.cursor.y, self.buffer[self.cursor.y],
+                       self.cursor.x)
+        self.display_cache.invalidate(self.cursor.y)
 
-    def erase_characters(self, *args):
-        self.dirty.add(self.cursor.y)
-        super(DiffScreen, self).erase_characters(*args)
-
-    def erase_in_line(self, *args):
-        self.dirty.add(self.cursor.y)
-        super(DiffScreen, self).erase_in_line(*args)
+    def erase_characters(self, count=None):
+        self.dirty.add(self.cursor.y, self.cursor.x,
+                       self.cursor.x + (count or 1))
+        super(DiffScreen, self).erase_characters(count)
+        self.runs.set(self.cursor.y, self.cursor.x,
+                      self.cursor.x + (count or 1), self.cursor.attrs)
+        self.display_cache.invalidate(self.cursor.y)
+
+    def erase_in_line(self, how=0, *args, **kwargs):
+        if how == 0:
+            start, stop = self.cursor.x, self.columns
+        elif how == 1:
+            start, stop = 0, self.cursor.x + 1
+        else:
+            start, stop = 0, self.columns
+        self.dirty.add(self.cursor.y, start, stop)
+        super(DiffScreen, self).erase_in_line(how, *args, **kwargs)
+        self.runs.set(self.cursor.y, start, stop, self.cursor.attrs)
+        self.display_cache.invalidate(self.cursor.y)
 
     def erase_in_display(self, how=0):
+        lines = ()
         if how == 0:
-            self.dirty.update(range(self.cursor.y + 1, self.lines))
+            lines = range(self.cursor.y + 1, self.lines)
+            self.dirty.update(lines)
         elif how == 1:
-            self.dirty.update(range(self.cursor.y))
+            lines = range(self.cursor.y)
+            self.dirty.update(lines)
         elif how == 2:
-            self.dirty.update(range(self.lines))
+            lines = range(self.lines)
+            self.dirty.mark_all()
 
         super(DiffScreen, self).erase_in_display(how)
 
+        for line in lines:
+            self.runs.set(line, 0, self.columns, self.cursor.attrs)
+            self.display_cache.invalidate(line)
+
     def alignment_display(self):
-        self.dirty.update(range(self.lines))
+        self.dirty.mark_all()
         super(DiffScreen, self).alignment_display()
+        self.display_cache.reset(self.lines)
 
 
 History = namedtuple("History", "top bottom ratio size position")
@@ -1070,8 +2130,12 @@ class HistoryScreen(DiffScreen):
                 if len(line) > self.columns:
                     self.buffer[idx] = line[:self.columns]
                 elif len(line) < self.columns:
-                    self.buffer[idx] = line + take(self.columns - len(line),
-                                                   self.default_line)
+                    self.buffer[idx] = line + [self.default_char] * (
+                        self.columns - len(line))
+                else:
+                    continue
+                self.runs.scan(idx, self.buffer[idx])
+                self.display_cache.invalidate(idx)
 
         # If we're at the bottom of the history buffer and `DECTCEM`
         # mode is set -- show the cursor.
@@ -1093,23 +2157,15 @@ class HistoryScreen(DiffScreen):
         self.history.bottom.clear()
         self.history = self.history._replace(position=self.history.size)
 
-    def index(self):
-        """Overloaded to update top history with the removed lines."""
-        top, bottom = self.margins
-
-        if self.cursor.y == bottom:
-            self.history.top.append(self.buffer[top])
-
-        super(HistoryScreen, self).index()
-
-    def reverse_index(self):
-        """Overloaded to update bottom history with the removed lines."""
-        top, bottom = self.margins
-
-        if self.cursor.y == top:
-            self.history.bottom.append(self.buffer[bottom])
+    def line_scrolled_off(self, line, top):
+        """Overloaded to update top or bottom history with the removed
+        lines; only lines dropped from a full history are released.
+        """
+        history = self.history.top if top else self.history.bottom
+        if len(history) == history.maxlen:
+            self.release_line(history.popleft() if history else line)
 
-        super(HistoryScreen, self).reverse_index()
+        history.append(line)
 
     def prev_page(self):
         """Moves the screen page up through the history buffer. Page
@@ -1129,7 +2185,9 @@ class HistoryScreen(DiffScreen):
                 self.history.top.pop() for _ in range(mid)
             ])) + self.buffer[:-mid]
 
-            self.dirty = set(range(self.lines))
+            self.dirty.mark_all()
+            self.runs.rebuild(self.buffer)
+            self.display_cache.reset(self.lines)
 
     def next_page(self):
         """Moves the screen page down through the history buffer."""
@@ -1145,4 +2203,6 @@ class HistoryScreen(DiffScreen):
                 self.history.bottom.popleft() for _ in range(mid)
             ]
 
-            self.dirty = set(range(self.lines))
+            self.dirty.mark_all()
+            self.runs.rebuild(self.buffer)
+            self.display_cache.reset(self.lines)
@@ -31,12 +31,14 @@ from __future__ import absolute_import, unicode_literals
 
 import os
 import codecs
+import re
 import sys
 import warnings
 from collections import defaultdict, namedtuple
 
 from . import control as ctrl, escape as esc
 from .compat import str
+from .screens import Screen
 
 #: An entry in the :class:`~pyte.streams.Screen` listeners queue.
 ListenerSpec = namedtuple("ListenerSpec", "screen only before after")
@@ -46,6 +48,46 @@ def noop(event):
     """A noop before-after hook for :class:`~pyte.streams.ListenerSpec`."""
 
 
+def unhandled(*args, **kwargs):
+    """A handler for events no listener is interested in."""
+
+
+def draw_per_char(draw, before, after):
+    """Adapts a ``draw`` handler to ``draw_text`` events."""
+    def draw_text(text):
+        for char in text:
+            before("draw")
+            draw(char)
+            after("draw")
+
+    return draw_text
+
+
+def is_noop(hook):
+    """Checks if a before-after hook is known to do nothing, so the
+    dispatcher can skip calling it.
+    """
+    hook = getattr(hook, "__func__", hook)
+    return hook in (noop, Screen.__before__, Screen.__after__)
+
+
+#: A run of characters, which can be drawn without consulting the
+#: parser: everything but C0 controls, ``DEL`` and 8-bit ``CSI``.
+_TEXT_RUN = re.compile("[^\x00-\x1f\x7f\x9b]+")
+
+#: Tokens :class:`VT500Stream` handles in ground state without stepping
+#: through the state machine: a run of text, a complete CSI sequence
+#: with nothing but digits and semicolons for parameters or a single
+#: C0 control other than ``ESC``.
+_VT500_GROUND_TOKEN = re.compile(
+    "([^\x00-\x1f\x7f-\x9f]+)"
+    "|(?:\x1b\\[|\x9b)([<=>?]?)([0-9;]*)([@-~])"
+    "|([\x00-\x1a\x1c-\x1f])")
+
+#: A run of characters inside an OSC string.
+_VT500_OSC_RUN = re.compile("[^\x00-\x1f\x80-\x9f]+")
+
+
 class Stream(object):
     """A stream is a state machine that parses a stream of characters
     and dispatches events based on what it sees.
@@ -133,6 +175,7 @@ class Stream(object):
 
     def __init__(self):
         self.listeners = []
+        self.handlers = {}
         self.state = "stream"  # Only used for testing.
         self.parser = self._parser_fsm()
         self.parser.send(None)
@@ -162,8 +205,22 @@ class Stream(object):
                             .format(self.__class__.__name__))
 
         send = self.parser.send
-        for char in chars:
-            send(char)
+        match_text = _TEXT_RUN.match
+        dispatch = self.dispatch
+        pos, end = 0, len(chars)
+        while pos < end:
+            # Plain text outside of escape sequences is dispatched as a
+            # single ``draw_text`` event instead of one ``draw`` event
+            # per character.
+            if self.state == "stream":
+                match = match_text(chars, pos)
+                if match is not None:
+                    dispatch("draw_text", match.group())
+                    pos = match.end()
+                    continue
+
+            send(chars[pos])
+            pos += 1
 
     def attach(self, screen, only=()):
         """Adds a given screen to the listener queue.
@@ -175,7 +232,12 @@ class Stream(object):
         """
         before = getattr(screen, "__before__", noop)
         after = getattr(screen, "__after__", noop)
-        self.listeners.append(ListenerSpec(screen, set(only), before, after))
+        only = set(only)
+        if "draw" in only:
+            # Text runs are a batched form of ``draw``.
+            only.add("draw_text")
+        self.listeners.append(ListenerSpec(screen, only, before, after))
+        self.handlers.clear()
 
     def detach(self, screen):
         """Removes a given screen from the listener queue and fails
@@ -186,6 +248,7 @@ class Stream(object):
         for idx, spec in enumerate(self.listeners):
             if screen is spec.screen:
                 self.listeners.pop(idx)
+        self.handlers.clear()
 
     def dispatch(self, event, *args, **kwargs):
         """Dispatches an event.
@@ -195,6 +258,11 @@ class Stream(object):
         events it should define a ``draw()`` method or pass
         ``only=["draw"]`` argument to :meth:`attach`.
 
+        .. versionchanged:: 0.5.2
+
+           Handlers are resolved once per event name and cached in
+           :attr:`handlers` until the listeners change.
+
         .. warning::
 
            If any of the attached listeners throws an exception, the
@@ -202,18 +270,56 @@ class Stream(object):
 
         :param str event: event to dispatch.
         """
+        try:
+            handler = self.handlers[event]
+        except KeyError:
+            handler = self.handlers[event] = self.compile_handler(event)
+
+        handler(*args, **kwargs)
+
+    def compile_handler(self, event):
+        """Resolves an event name to a single callable, which invokes
+        the handlers of all interested listeners along with their
+        before-after hooks.
+
+        With a single listener and no hooks, this is the listener's
+        bound method itself. If nobody handles the event, it is
+        :func:`unhandled`.
+
+        :param str event: event to compile a handler for.
+        """
+        calls = []
         for screen, only, before, after in self.listeners:
             if only and event not in only:
                 continue
 
-            try:
-                handler = getattr(screen, event)
-            except AttributeError:
+            handler = getattr(screen, event, None)
+            if handler is None:
+                if event == "draw_text" and hasattr(screen, "draw"):
+                    # Screens without run support get one ``draw`` per
+                    # character, the way they always did.
+                    calls.append(
+                        (draw_per_char(screen.draw, before, after), None, None))
                 continue
 
-            before(event)
-            handler(*args, **kwargs)
-            after(event)
+            calls.append((handler,
+                          None if is_noop(before) else before,
+                          None if is_noop(after) else after))
+
+        if not calls:
+            return unhandled
+        elif len(calls) == 1 and calls[0][1:] == (None, None):
+            return calls[0][0]
+
+        def dispatch_all(*args, **kwargs):
+            for handler, before, after in calls:
+                if before is not None:
+                    before(event)
+                handler(*args, **kwargs)
+                if after is not None:
+                    after(event)
+
+        return dispatch_all
 
     def _parser_fsm(self):
         # In order to avoid getting KeyError exceptions below, we make sure
@@ -318,19 +424,394 @@ class Stream(object):
                 dispatch("draw", char)
 
 
+#: States of the VT500 parser, see :class:`VT500Stream`.
+GROUND = "ground"
+ESCAPE = "escape"
+ESCAPE_INTERMEDIATE = "escape_intermediate"
+CSI_ENTRY = "csi_entry"
+CSI_PARAM = "csi_param"
+CSI_INTERMEDIATE = "csi_intermediate"
+CSI_IGNORE = "csi_ignore"
+DCS_ENTRY = "dcs_entry"
+DCS_PARAM = "dcs_param"
+DCS_INTERMEDIATE = "dcs_intermediate"
+DCS_PASSTHROUGH = "dcs_passthrough"
+DCS_IGNORE = "dcs_ignore"
+OSC_STRING = "osc_string"
+SOS_PM_APC_STRING = "sos_pm_apc_string"
+
+#: Characters from this code point on are all in the same class: text,
+#: which is printed in ground state and ignored in sequences.
+_TEXT_CLASS = 0xa0
+
+#: Actions performed when entering and leaving a state.
+_ENTRY_ACTIONS = {
+    ESCAPE: "clear",
+    CSI_ENTRY: "clear",
+    DCS_ENTRY: "clear",
+    DCS_PASSTHROUGH: "hook",
+    OSC_STRING: "osc_start",
+}
+_EXIT_ACTIONS = {
+    DCS_PASSTHROUGH: "unhook",
+    OSC_STRING: "osc_end",
+}
+
+
+def _vt500_transitions():
+    """Builds the transition table of the DEC/VT500 state diagram.
+
+    Returns a mapping of state to a list with one ``(action, state)``
+    entry per character class, ``state`` is ``None`` when a transition
+    stays in the current state without running exit and entry actions.
+
+    .. seealso::
+
+       `A parser for DEC's ANSI-compatible video terminals \
+       <http://vt100.net/emu/dec_ansi_parser>`_
+    """
+    table = {}
+
+    def on(state, codes, action=None, target=None):
+        for code in codes:
+            table[state][code] = (action, target)
+
+    def chars(*ranges):
+        codes = []
+        for start, end in ranges:
+            codes.extend(range(start, end + 1))
+        return codes
+
+    c0 = chars((0x00, 0x17), (0x19, 0x19), (0x1c, 0x1f))
+    intermediate = chars((0x20, 0x2f))
+    final = chars((0x40, 0x7e))
+
+    for state in [GROUND, ESCAPE, ESCAPE_INTERMEDIATE, CSI_ENTRY, CSI_PARAM,
+                  CSI_INTERMEDIATE, CSI_IGNORE, DCS_ENTRY, DCS_PARAM,
+                  DCS_INTERMEDIATE, DCS_PASSTHROUGH, DCS_IGNORE, OSC_STRING,
+                  SOS_PM_APC_STRING]:
+        # By default everything is ignored, text aborts a sequence.
+        table[state] = [(None, None)] * (_TEXT_CLASS + 1)
+        if state not in (GROUND, DCS_PASSTHROUGH, DCS_IGNORE, OSC_STRING,
+                         SOS_PM_APC_STRING):
+            on(state, [_TEXT_CLASS], target=GROUND)
+
+    on(GROUND, c0, "execute")
+    on(GROUND, chars((0x20, 0x7e), (_TEXT_CLASS, _TEXT_CLASS)), "draw")
+
+    on(ESCAPE, c0, "execute")
+    on(ESCAPE, intermediate, "collect", ESCAPE_INTERMEDIATE)
+    on(ESCAPE, chars((0x30, 0x7e)), "esc_dispatch", GROUND)
+    on(ESCAPE, [ord("[")], target=CSI_ENTRY)
+    on(ESCAPE, [ord("]")], target=OSC_STRING)
+    on(ESCAPE, [ord("P")], target=DCS_ENTRY)
+    on(ESCAPE, [ord("X"), ord("^"), ord("_")], target=SOS_PM_APC_STRING)
+
+    on(ESCAPE_INTERMEDIATE, c0, "execute")
+    on(ESCAPE_INTERMEDIATE, intermediate, "collect")
+    on(ESCAPE_INTERMEDIATE, chars((0x30, 0x7e)), "esc_dispatch", GROUND)
+
+    on(CSI_ENTRY, c0, "execute")
+    on(CSI_ENTRY, intermediate, "collect", CSI_INTERMEDIATE)
+    on(CSI_ENTRY, [0x3a], target=CSI_IGNORE)
+    on(CSI_ENTRY, chars((0x30, 0x39), (0x3b, 0x3b)), "param", CSI_PARAM)
+    on(CSI_ENTRY, chars((0x3c, 0x3f)), "collect", CSI_PARAM)
+    on(CSI_ENTRY, final, "csi_dispatch", GROUND)
+
+    on(CSI_PARAM, c0, "execute")
+    on(CSI_PARAM, chars((0x30, 0x39), (0x3b, 0x3b)), "param")
+    on(CSI_PARAM, chars((0x3a, 0x3a), (0x3c, 0x3f)), target=CSI_IGNORE)
+    on(CSI_PARAM, intermediate, "collect", CSI_INTERMEDIATE)
+    on(CSI_PARAM, final, "csi_dispatch", GROUND)
+
+    on(CSI_INTERMEDIATE, c0, "execute")
+    on(CSI_INTERMEDIATE, intermediate, "collect")
+    on(CSI_INTERMEDIATE, chars((0x30, 0x3f)), target=CSI_IGNORE)
+    on(CSI_INTERMEDIATE, final, "csi_dispatch", GROUND)
+
+    on(CSI_IGNORE, c0, "execute")
+    on(CSI_IGNORE, final, target=GROUND)
+
+    on(DCS_ENTRY, intermediate, "collect", DCS_INTERMEDIATE)
+    on(DCS_ENTRY, [0x3a], target=DCS_IGNORE)
+    on(DCS_ENTRY, chars((0x30, 0x39), (0x3b, 0x3b)), "param", DCS_PARAM)
+    on(DCS_ENTRY, chars((0x3c, 0x3f)), "collect", DCS_PARAM)
+    on(DCS_ENTRY, final, target=DCS_PASSTHROUGH)
+
+    on(DCS_PARAM, chars((0x30, 0x39), (0x3b, 0x3b)), "param")
+    on(DCS_PARAM, chars((0x3a, 0x3a), (0x3c, 0x3f)), target=DCS_IGNORE)
+    on(DCS_PARAM, intermediate, "collect", DCS_INTERMEDIATE)
+    on(DCS_PARAM, final, target=DCS_PASSTHROUGH)
+
+    on(DCS_INTERMEDIATE, intermediate, "collect")
+    on(DCS_INTERMEDIATE, chars((0x30, 0x3f)), target=DCS_IGNORE)
+    on(DCS_INTERMEDIATE, final, target=DCS_PASSTHROUGH)
+
+    on(DCS_PASSTHROUGH, c0 + chars((0x20, 0x7e), (_TEXT_CLASS, _TEXT_CLASS)),
+       "put")
+
+    # ``BEL`` terminates an OSC string as well, like it does in xterm.
+    on(OSC_STRING, chars((0x20, 0x7f), (_TEXT_CLASS, _TEXT_CLASS)),
+       "osc_put")
+    on(OSC_STRING, [ord(ctrl.BEL)], target=GROUND)
+
+    # Transitions, which apply to every state.
+    for state in table:
+        on(state, [ord(ctrl.CAN), ord(ctrl.SUB)], "execute", GROUND)
+        on(state, chars((0x80, 0x8f), (0x91, 0x97), (0x99, 0x9a)),
+           "execute", GROUND)
+        on(state, [0x9c], target=GROUND)
+        on(state, [ord(ctrl.ESC)], target=ESCAPE)
+        on(state, [0x90], target=DCS_ENTRY)
+        on(state, [0x98, 0x9e, 0x9f], target=SOS_PM_APC_STRING)
+        on(state, [0x9b], target=CSI_ENTRY)
+        on(state, [0x9d], target=OSC_STRING)
+
+    return table
+
+
+class VT500Stream(Stream):
+    """A table-driven stream, modeled on the DEC/VT500 state diagram
+    instead of the generator based parser of :class:`Stream`. It
+    dispatches the same events, but also understands OSC, DCS, APC,
+    PM and SOS strings, so for example a window title set by the
+    shell prompt is no longer drawn as text.
+
+    OSC ``0`` and ``2`` are dispatched as ``set_title`` events, OSC
+    ``1`` as ``set_icon_name``, the other strings are ignored.
+
+    .. seealso::
+
+       `A parser for DEC's ANSI-compatible video terminals \
+       <http://vt100.net/emu/dec_ansi_parser>`_
+    """
+
+    #: Transitions of the state machine, see :func:`_vt500_transitions`.
+    transitions = _vt500_transitions()
+
+    def __init__(self):
+        super(VT500Stream, self).__init__()
+        self.state = GROUND
+        self.clear()
+        self.osc = []
+
+        # Events of recently seen CSI sequences, so for example the same
+        # SGR sequence isn't parsed over and over again.
+        self.sequences = {}
+
+        # Resolve actions to bound methods once, and merge them with the
+        # exit and entry actions of a transition.
+        self.table = {}
+        for state, row in self.transitions.items():
+            self.table[state] = [self._compile(state, action, target)
+                                 for action, target in row]
+
+    def _compile(self, state, action, target):
+        names = []
+        if target is not None:
+            names.append(_EXIT_ACTIONS.get(state))
+        names.append(action)
+        if target is not None:
+            names.append(_ENTRY_ACTIONS.get(target))
+
+        actions = [getattr(self, name) for name in names
+                   if name is not None and getattr(self, name, None)]
+        if not actions:
+            action = None
+        elif len(actions) == 1:
+            action = actions[0]
+        else:
+            def action(char):
+                for act in actions:
+                    act(char)
+
+        return action, target
+
+    def feed(self, chars):
+        """Consumes a string and advance the state as necessary.
+
+        :param str chars: a string to feed from.
+        """
+        if not isinstance(chars, str):
+            raise TypeError("{0} requires text input"
+                            .format(self.__class__.__name__))
+
+        table = self.table
+        dispatch = self.dispatch
+        handlers = self.handlers
+        basic = self.basic
+        sequences = self.sequences
+        match_ground = _VT500_GROUND_TOKEN.match
+        match_osc = _VT500_OSC_RUN.match
+        state = self.state
+        pos, end = 0, len(chars)
+        while pos < end:
+            # Text, CSI sequences and controls in ground state, and OSC
+            # strings are consumed a token at a time.
+            if state == GROUND:
+                match = match_ground(chars, pos)
+                if match is not None:
+                    pos = match.end()
+                    token = match.lastindex
+                    if token == 1:
+                        event, args, kwargs = "draw_text", match.group(1), {}
+                    elif token == 4:
+                        sequence = match.group()
+                        try:
+                            event, args, kwargs = sequences[sequence]
+                        except KeyError:
+                            marker, params, final = match.group(2, 3, 4)
+                            params = [min(int(param), 9999) if param else 0
+                                      for param in params.split(";")]
+                            event, args, kwargs = \
+                                self.csi_event(final, params, marker)
+                            if len(sequences) < 1024:
+                                sequences[sequence] = event, args, kwargs
+                    else:
+                        event, args, kwargs = \
+                            basic.get(match.group(5), "debug"), (), {}
+
+                    # Same as :meth:`dispatch`, but without the call.
+                    try:
+                        handler = handlers[event]
+                    except KeyError:
+                        handler = handlers[event] = self.compile_handler(event)
+
+                    if token == 1:
+                        handler(args)
+                    else:
+                        handler(*args, **kwargs)
+                    continue
+            elif state == OSC_STRING:
+                match = match_osc(chars, pos)
+                if match is not None:
+                    self.osc.append(match.group())
+                    pos = match.end()
+                    continue
+
+            char = chars[pos]
+            pos += 1
+            action, target = table[state][min(ord(char), _TEXT_CLASS)]
+            if target is not None:
+                state = self.state = target
+            if action is not None:
+                action(char)
+
+        self.state = state
+
+    def clear(self, char=None):
+        self.params = []
+        self.current = None
+        self.intermediates = ""
+
+    def collect(self, char):
+        self.intermediates += char
+
+    def param(self, char):
+        if char == ";":
+            self.params.append(self.current or 0)
+            self.current = None
+        elif self.current is None:
+            self.current = ord(char) - 48
+        else:
+            # Any parameter greater than 9999 is set to 9999.
+            self.current = min(self.current * 10 + ord(char) - 48, 9999)
+
+    def execute(self, char):
+        self.dispatch(self.basic.get(char, "debug"))
+
+    def draw(self, char):
+        self.dispatch("draw", char)
+
+    def esc_dispatch(self, char):
+        intermediates = self.intermediates
+        if not intermediates:
+            self.dispatch(self.escape.get(char, "debug"))
+        elif intermediates == "#":
+            self.dispatch(self.sharp.get(char, "debug"))
+        elif intermediates == "%":
+            self.dispatch(self.percent.get(char, "debug"))
+        elif intermediates in ("(", ")"):
+            self.dispatch("set_charset", char, mode=intermediates)
+        else:
+            self.dispatch("debug")
+
+    def csi_dispatch(self, char):
+        params = self.params
+        params.append(self.current or 0)
+        event, args, kwargs = self.csi_event(char, params, self.intermediates)
+        self.dispatch(event, *args, **kwargs)
+
+    def csi_event(self, char, params, intermediates):
+        """Returns the event, arguments and keyword arguments for a CSI
+        sequence.
+        """
+        if not intermediates:
+            return self.csi.get(char, "debug"), tuple(params), {}
+        elif intermediates == "?":
+            return (self.csi.get(char, "debug"), tuple(params),
+                    {"private": True})
+        elif intermediates == ">":
+            # We don't handle secondary DA atm.
+            return self.csi.get(char, "debug"), tuple(params), {}
+        else:
+            return "debug", (), {}
+
+    def osc_start(self, char):
+        self.osc = []
+
+    def osc_end(self, char):
+        data = "".join(self.osc)
+        command, _, text = data.partition(";")
+        if command in ("0", "2"):
+            self.dispatch("set_title", text)
+        if command in ("0", "1"):
+            self.dispatch("set_icon_name", text)
+
+
+def cp437_fallback(error):
+    """Decoding error handler, which decodes only the invalid bytes
+    with ``"cp437"``, so a stray byte in otherwise valid ``"utf-8"``
+    output doesn't affect the rest of it.
+    """
+    if not isinstance(error, UnicodeDecodeError):
+        raise error
+
+    invalid = error.object[error.start:error.end]
+    return bytes(invalid).decode("cp437"), error.end
+
+codecs.register_error("pyte.cp437", cp437_fallback)
+
+
 class ByteStream(Stream):
     """A stream, which takes bytes (instead of strings) as input
     and tries to decode them using a given list of possible encodings.
     It uses :class:`codecs.IncrementalDecoder` internally, so broken
     bytes are not an issue.
 
-    By default, the following decoding strategy is used:
+    By default, a single ``"utf-8"`` decoder is used, which decodes
+    invalid bytes with ``"cp437"`` one at a time (see
+    :func:`cp437_fallback`). Every chunk is decoded exactly once.
+
+    If a list of encodings is given, the following decoding strategy
+    is used:
 
-    * First, try strict ``"utf-8"``, proceed if received and
+    * First, try the first encoding, proceed if received and
       :exc:`UnicodeDecodeError` ...
-    * Try strict ``"cp437"``, failed? move on ...
-    * Use ``"utf-8"`` with invalid bytes replaced -- this one will
-      always succeed.
+    * Try the next encoding, failed? move on ...
+
+    .. versionchanged:: 0.5.2
+
+       The default used to be strict ``"utf-8"``, strict ``"cp437"``
+       and ``"utf-8"`` with invalid bytes replaced, which decoded a
+       chunk up to three times and switched all of it to ``"cp437"``
+       because of a single invalid byte.
+
+    .. versionchanged:: 0.5.3
+
+       Any bytes-like object is accepted, so a :class:`memoryview` of
+       a reusable read buffer can be fed without copying it to
+       :class:`bytes` first.
 
     >>> stream = ByteStream()
     >>> stream.feed(b"foo".decode("utf-8"))
@@ -350,9 +831,7 @@ class ByteStream(Stream):
 
     def __init__(self, encodings=None):
         encodings = encodings or [
-            ("utf-8", "strict"),
-            ("cp437", "strict"),
-            ("utf-8", "replace")
+            ("utf-8", "pyte.cp437"),
         ]
 
         self.buffer = b"", 0
@@ -362,10 +841,18 @@ class ByteStream(Stream):
         super(ByteStream, self).__init__()
 
     def feed(self, chars):
-        if not isinstance(chars, bytes):
+        if not isinstance(chars, (bytes, bytearray, memoryview)):
             raise TypeError(
                 "{0} requires input in bytes".format(self.__class__.__name__))
 
+        # A single decoder keeps its own state between chunks.
+        if len(self.decoders) == 1:
+            try:
+                chars = self.decoders[0].decode(chars)
+            except UnicodeDecodeError:
+                raise ValueError("unknown encoding")
+            return super(ByteStream, self).feed(chars)
+
         for idx, decoder in enumerate(self.decoders):
             decoder.setstate(self.buffer)
 
@@ -380,6 +867,12 @@ class ByteStream(Stream):
         raise ValueError("unknown encoding")
 
 
+class VT500ByteStream(ByteStream, VT500Stream):
+    """A :class:`ByteStream`, which uses the table-driven parser of
+    :class:`VT500Stream`.
+    """
+
+
 class DebugStream(ByteStream):
     r"""Stream, which dumps a subset of the dispatched events to a given
     file-like object (:data:`sys.stdout` by default).
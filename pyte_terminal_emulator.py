@@ -1,78 +1,213 @@
 """
 Wrapper module for the Pyte terminal emulator
 """
-from collections import deque, namedtuple
+from array import array
+from collections import namedtuple
 from itertools import islice
 import math
+import re
 
 from . import pyte
-from .pyte import modes
+from .pyte.screens import CellAttributes, CompactLine, _scan_runs
+from .history_search import (INDEX_BYTES_PER_LINE, TrigramIndex, compile_query, first_match,
+                             last_match)
+from .scrollback import Scrollback
+
+
+# Streams that can be used for parsing the shell output. The table-driven
+# vt500 parser also understands OSC strings (e.g. window titles set by the
+# prompt) that the original pyte parser draws as text.
+_STREAMS = {
+    "vt500": pyte.VT500ByteStream,
+    "pyte": pyte.ByteStream,
+}
+
+
+# Snapshot of the changes to the screen since the previous frame, which can be
+# rendered while the emulator is fed more output:
+#   lines    - dict of line number to the text of each changed line
+#   spans    - dict of line number to the changed (start, stop) column ranges,
+#              lines without spans changed as a whole
+#   scrolls  - tuple of (top, bottom, count) scroll operations, done first
+#   truncate - when the screen shrunk, lines from here on are deleted after
+#              the scrolls
+#   colors   - color map of the changed lines
+#   cursor   - (row, col) of the cursor
+#   hits     - (row, start, stop) of the search matches in view, None when not
+#              searching
+Frame = namedtuple("Frame", "lines spans scrolls truncate colors cursor hits")
 
 
 class PyteTerminalEmulator():
     """
     Adapter for the pyte terminal emulator
     """
-    def __init__(self, cols, lines, history, ratio):
-        # Double history size due to pyte splitting it between two queues
-        # resulting in only having half the scrollback as expected
-        self._screen = CustomHistoryScreen(cols, lines, history * 2, ratio)
-        self._bytestream = pyte.ByteStream()
+    def __init__(self, cols, lines, history, ratio, parser="vt500", history_mb=16,
+                 history_spill=False):
+        self._screen = CustomHistoryScreen(cols, lines, history, ratio, history_mb,
+                                           history_spill)
+        self._bytestream = _STREAMS.get(parser, pyte.VT500ByteStream)()
         self._bytestream.attach(self._screen)
         self._modified = True
+        self._truncate = None
+        # (pattern, literals) of the search and the (line, start, stop) of the
+        # current match
+        self._search = None
+        self._match = None
 
     def feed(self, data):
         self._screen.scroll_to_bottom()
         self._bytestream.feed(data)
         self._modified = True
 
+    def close(self):
+        """
+        Delete the history spilled to disk, the emulator is no longer fed
+        """
+        self._screen.history.top.close()
+
     def resize(self, lines, cols):
         self._screen.scroll_to_bottom()
-        dirty_lines = max(lines, self._screen.lines)
-        self._screen.dirty.update(range(dirty_lines))
         self._modified = True
+        if lines < self._screen.lines:
+            self._truncate = lines if self._truncate is None else min(self._truncate, lines)
         return self._screen.resize(lines, cols)
 
+    def prev_line(self):
+        self._screen.prev_line()
+        self._modified = True
+
+    def next_line(self):
+        self._screen.next_line()
+        self._modified = True
+
     def prev_page(self):
         self._screen.prev_page()
-        self._screen.ensure_screen_width()
         self._modified = True
 
     def next_page(self):
         self._screen.next_page()
-        self._screen.ensure_screen_width()
         self._modified = True
 
+    def search(self, query, regex=False):
+        """
+        Search the history and screen for a substring, or a regular expression
+        with regex, and scroll to the newest match. An empty query ends the
+        search. Returns whether it matched, an invalid expression does not
+        match.
+        """
+        self._search = None
+        self._match = None
+        self._modified = True
+        if not query:
+            return False
+
+        try:
+            self._search = compile_query(query, regex)
+        except re.error:
+            return False
+        return self._find(False)
+
+    def search_prev(self):
+        """
+        Scroll back to the previous (older) match of the search
+        """
+        return self._find(False)
+
+    def search_next(self):
+        """
+        Scroll forward to the next (newer) match of the search
+        """
+        return self._find(True)
+
+    def clear_search(self):
+        self.search(None)
+
+    def _find(self, forward):
+        if self._search is None:
+            return False
+
+        screen = self._screen
+        if self._match is None:
+            line, column = screen.first_screen_line() + screen.lines, None
+        else:
+            line, column = self._match[:2]
+        match = screen.find(self._search[0], self._search[1], line, column, forward)
+        if match is None:
+            return False
+
+        self._match = match
+        screen.scroll_to_line(match[0])
+        self._modified = True
+        return True
+
+    def search_hits(self):
+        """
+        Get the (row, start, stop) of the search matches in view, None when not
+        searching
+        """
+        if self._search is None:
+            return None
+        return self._screen.view_matches(self._search[0])
+
     def dirty_lines(self):
         dirty_lines = {}
-        nb_dirty_lines = len(self._screen.dirty)
-        if nb_dirty_lines > 0:
-            display = self._screen.display
-            for line in self._screen.dirty:
-                if line >= len(display):
-                    # This happens when screen is resized smaller
-                    break
-                else:
-                    dirty_lines[line] = display[line]
+        screen = self._screen
+        for line in screen.dirty:
+            if line >= len(screen.buffer):
+                # This happens when screen is resized smaller
+                continue
+            dirty_lines[line] = screen.view_text(line)
 
         return dirty_lines
 
+    def dirty_spans(self):
+        """
+        Get the changed column ranges of the dirty lines as a dict mapping line
+        numbers to lists of (start, stop) tuples
+        """
+        return self._screen.dirty.line_spans()
+
+    def dirty_scrolls(self):
+        """
+        Get the scroll operations since the dirty lines were last cleared as a
+        list of (top, bottom, count) tuples. Lines top to bottom moved up by
+        count lines, or down if count is negative. Dirty lines and spans are
+        relative to the screen after all scrolls.
+        """
+        return list(self._screen.dirty.scrolls)
+
     def clear_dirty(self):
         self._modified = False
+        self._truncate = None
         return self._screen.dirty.clear()
 
+    def take_frame(self, colors=True):
+        """
+        Take a snapshot of everything that changed since the last frame and
+        clear the dirty state. The frame does not share any state with the
+        emulator, so it can be rendered while the emulator is fed.
+        """
+        lines = self.dirty_lines()
+        color_map = self.color_map(lines.keys()) if colors else {}
+        frame = Frame(lines, self.dirty_spans(), tuple(self.dirty_scrolls()),
+                      self._truncate, color_map, self.cursor(), self.search_hits())
+        self.clear_dirty()
+        return frame
+
     def cursor(self):
         cursor = self._screen.cursor
         if cursor:
-            return (cursor.y, cursor.x)
+            # The cursor moves down along with the screen while scrolled back
+            return (min(cursor.y + self._screen.viewport, self._screen.lines - 1), cursor.x)
 
         return (0, 0)
 
     def color_map(self, lines):
-        return convert_pyte_buffer_to_colormap(self._screen.buffer, lines)
+        return convert_attribute_runs_to_colormap(ViewRuns(self._screen), lines)
 
     def display(self):
-        return self._screen.display
+        return [self._screen.view_text(line) for line in range(self._screen.lines)]
 
     def modified(self):
         return self._modified
@@ -86,7 +221,36 @@ class PyteTerminalEmulator():
     def nb_lines(self):
         return self._screen.lines
 
-History = namedtuple("History", "top bottom ratio size position")
+
+History = namedtuple("History", "top ratio")
+
+# Frozen lines end in a byte flagging soft-wrapped lines, marshal ignores it
+# when the line is thawed
+_WRAPPED = b"\x01"
+_UNWRAPPED = b"\x00"
+
+
+def is_wrapped(record):
+    """
+    Whether a line frozen for the history was soft-wrapped
+    """
+    return record[-1:] == _WRAPPED
+
+
+class ViewRuns():
+    """
+    Attribute runs of the rows in view, indexed like the runs of the screen
+    """
+    def __init__(self, screen):
+        self._screen = screen
+
+    def __len__(self):
+        return len(self._screen.runs)
+
+    def __getitem__(self, line):
+        return self._screen.view_runs(line)
+
+
 Margins = namedtuple("Margins", "top bottom")
 
 
@@ -94,16 +258,49 @@ class CustomHistoryScreen(pyte.DiffScreen):
     """
     Custom history screen customized for this plugin. Basically a copy of the
     standard pyte history screen but with some optimizations.
+
+    The lines scrolled off the top are kept in a compressed scrollback store
+    limited to history_mb megabytes and, if given, history lines. With
+    history_spill the lines over the memory budget go to a temporary file
+    instead.
+
+    History and screen are read as one store of lines through a viewport
+    offset: scrolling back only moves the offset, the lines in view are read
+    from the history when asked for.
+
+    Soft-wrapped lines are rewrapped when the number of columns changes: the
+    screen right away, the history only once it is scrolled into view. The
+    lines that scrolled off since the last column change already have the
+    width of the screen, older lines are reflowed into a cache of rows as far
+    back as the view goes.
+
+    The history lines are also indexed for searching, see find. Lines are
+    numbered as in the scrollback store, the rows of the screen come right
+    after the history.
     """
-    def __init__(self, columns, lines, history, ratio):
-        self.history = History(deque(maxlen=history // 2),
-                               deque(maxlen=history),
-                               float(ratio),
-                               history,
-                               history)
+    # Lines are kept as arrays of code points and attribute indices
+    compact = True
+
+    def __init__(self, columns, lines, history, ratio, history_mb=16, history_spill=False):
+        self.history = History(Scrollback(int(history_mb * 2**20), history or None,
+                                          history_spill, INDEX_BYTES_PER_LINE),
+                               float(ratio))
+        self.search_index = TrigramIndex()
+        # Number of history rows the view is scrolled back
+        self.viewport = 0
+        # Number of newest history lines frozen at the current width
+        self._same_width = 0
+        # Rows reflowed from the older history lines, newest first, and the
+        # number of lines they were reflowed from
+        self._reflowed = []
+        self._reflow_read = 0
 
         super(CustomHistoryScreen, self).__init__(columns, lines)
 
+        if self.attributes is None:
+            # Lines are frozen through an attributes table either way
+            self.attributes = CellAttributes()
+
         # We do not agree with pyte about default tabstops
         self.tabstops = set(range(8, self.columns, 8))
 
@@ -117,155 +314,443 @@ class CustomHistoryScreen(pyte.DiffScreen):
         """
         Ensure a screen is at the bottom of the history buffer
         """
-        while self.history.position < self.history.size:
-            self.next_page()
+        self.scroll_view(-self.viewport)
 
-    def ensure_screen_width(self):
+    def scroll_view(self, count):
         """
-        Ensure all lines on a screen have proper width columns. Extra characters
-        are truncated, missing characters are filled with whitespace.
+        Move the view count lines back into the history, or forward if count
+        is negative. Only the viewport offset changes, the damage is recorded
+        as a scroll of the whole screen.
         """
-        for idx, line in enumerate(self.buffer):
-            if len(line) > self.columns:
-                self.buffer[idx] = line[:self.columns]
-            elif len(line) < self.columns:
-                self.buffer[idx] = line + take(self.columns - len(line),
-                                               self.default_line)
-
-        # If we're at the bottom of the history buffer and `DECTCEM`
-        # mode is set -- show the cursor.
-        self.cursor.hidden = not (
-            abs(self.history.position - self.history.size) < self.lines and
-            modes.DECTCEM in self.mode
-        )
-
-    def reset_history(self):
-        self.history.top.clear()
-        self.history.bottom.clear()
-        self.history = self.history._replace(position=self.history.size)
-
-    def reset(self):
+        viewport = max(0, self.viewport + count)
+        if count > 0:
+            viewport = self._history_rows(viewport)
+        elif viewport == 0:
+            self._drop_reflowed()
+        delta = viewport - self.viewport
+        if delta:
+            self.viewport = viewport
+            self.dirty.scroll(0, self.lines - 1, -delta)
+
+    def _history_rows(self, count):
         """
-        Overloaded to reset screen history state: history position
-        is reset to bottom of both queues;  queues themselves are
-        emptied.
+        Return the number of rows above the screen, up to count. The history
+        lines from before the last column change are reflowed as far as needed.
         """
-        super(CustomHistoryScreen, self).reset()
-        self.reset_history()
-
-    def erase_in_display(self, how=0):
+        history = self.history.top
+        same_width = min(self._same_width, len(history))
+        reflowed = self._reflowed
+        end = len(history) - same_width - self._reflow_read
+        while same_width + len(reflowed) < count and end > 0:
+            # Gather the lines wrapped into the last one
+            start = end - 1
+            while start > 0 and is_wrapped(history[start - 1]):
+                start -= 1
+            line = CompactLine.thaw(self.attributes, history[start])
+            for index in range(start + 1, end):
+                line.extend(CompactLine.thaw(self.attributes, history[index]))
+
+            rows = self._wrap_line(line, self.columns, self._content_length(line))
+            reflowed.extend(reversed(rows))
+            self._reflow_read += end - start
+            end = start
+        return min(count, same_width + len(reflowed))
+
+    def _drop_reflowed(self):
+        self._reflowed = []
+        self._reflow_read = 0
+
+    def _content_length(self, line):
         """
-        Overloaded to reset history state
+        Return the number of cells of a line up to the last one that is not
+        blank
         """
-        super(CustomHistoryScreen, self).erase_in_display(how)
+        end = len(line)
+        while end and line[end - 1] == self.default_char:
+            end -= 1
+        return end
 
-        if how == 3:
-            self.reset_history()
-
-    def index(self):
+    def _wrap_line(self, line, columns, length):
         """
-        Overloaded to update top history with the removed lines
+        Split the first length cells of a line into rows of columns cells,
+        the last row is padded with blanks. All rows but the last are wrapped.
         """
-        top, bottom = self.margins
+        rows = [line[start:start + columns] for start in range(0, max(length, 1), columns)]
+        rows[-1].extend(take(columns - len(rows[-1]), self.default_line))
+        return rows
+
+    def page_size(self):
+        return int(math.ceil(self.lines * self.history.ratio))
 
-        if self.cursor.y == bottom:
-            self.history.top.append(self.buffer[top])
+    def prev_line(self):
+        self.scroll_view(1)
 
-        super(CustomHistoryScreen, self).index()
+    def next_line(self):
+        self.scroll_view(-1)
 
-    def reverse_index(self):
+    def prev_page(self):
+        self.scroll_view(self.page_size())
+
+    def next_page(self):
+        self.scroll_view(-self.page_size())
+
+    def view_line(self, y):
+        """
+        Return the line shown on row y of the view: a line of the buffer, or
+        a line of the history while scrolled back
         """
-        Overloaded to update bottom history with the removed lines
+        viewport = self.viewport
+        if y >= viewport:
+            return self.buffer[y - viewport]
+
+        row = viewport - 1 - y
+        history = self.history.top
+        same_width = min(self._same_width, len(history))
+        if row < same_width:
+            return CompactLine.thaw(self.attributes, history[len(history) - 1 - row])
+        return self._reflowed[row - same_width]
+
+    def view_text(self, y):
         """
-        top, bottom = self.margins
+        Return the text of row y of the view, as wide as the screen
+        """
+        if y >= self.viewport:
+            return self.display_cache.text(self.buffer, y - self.viewport)
+        text = self.view_line(y)[:self.columns].text()
+        return text + " " * (self.columns - len(text))
 
-        if self.cursor.y == top:
-            self.history.bottom.append(self.buffer[bottom])
+    def view_runs(self, y):
+        """
+        Return the attribute runs of row y of the view
+        """
+        if y >= self.viewport:
+            return self.runs[y - self.viewport]
+        return _scan_runs(self.view_line(y), 0, self.columns)
 
-        super(CustomHistoryScreen, self).reverse_index()
+    def freeze_line(self, line, wrapped=False):
+        """
+        Encode a line for the history, see thaw_line and is_wrapped
+        """
+        if not isinstance(line, CompactLine):
+            compact = CompactLine(self.attributes, array("B"), array("B"))
+            compact.extend(line)
+            line = compact
+        return line.freeze() + (_WRAPPED if wrapped else _UNWRAPPED)
 
-    def prev_page(self):
+    def thaw_line(self, record):
         """
-        Move the screen page up through the history buffer
+        Decode a line frozen by freeze_line
         """
-        if self.history.position > self.lines and self.history.top:
-            mid = min(len(self.history.top),
-                      int(math.ceil(self.lines * self.history.ratio)))
+        line = CompactLine.thaw(self.attributes, record)
+        return line if self.compact else list(line)
 
-            self.history.bottom.extendleft(reversed(self.buffer[-mid:]))
-            self.history = self.history \
-                ._replace(position=self.history.position - self.lines)
+    def reset_history(self):
+        self.history.top.clear()
+        self.search_index.clear(self.history.top.first())
+        self.viewport = 0
+        self._same_width = 0
+        self._drop_reflowed()
+
+    def _push_history(self, line, wrapped):
+        record = self.freeze_line(line, wrapped)
+        self.history.top.append(record)
+        self.search_index.add(CompactLine.frozen_text(record), self.history.top.first())
+        self._same_width += 1
+
+    def _pop_history(self):
+        history = self.history.top
+        record = history.pop()
+        self.search_index.truncate(history.first() + len(history))
+        return record
+
+    def first_screen_line(self):
+        """
+        Return the number of the first row of the screen, right after the
+        newest history line
+        """
+        return self.history.top.first() + len(self.history.top)
 
-            self.buffer[:] = list(reversed([
-                self.history.top.pop() for _ in range(mid)
-            ])) + self.buffer[:-mid]
+    def find(self, pattern, literals, line, column, forward=False):
+        """
+        Find the match of a pattern closest before column of line, or after it
+        when forward, in the history and on the screen. The history is only
+        scanned where the index finds all literals of the pattern. Returns a
+        (line, start, stop) tuple, None if there is no match.
+        """
+        history = self.history.top
+        first = history.first()
+        screen_line = first + len(history)
+        text = CompactLine.frozen_text
+
+        if forward:
+            for start, stop in reversed(self.search_index.candidates(literals, first, screen_line)):
+                for number in range(max(start, line), stop):
+                    span = first_match(pattern, text(history[number - first]),
+                                       column if number == line else None)
+                    if span:
+                        return (number, ) + span
+            for y in range(max(line - screen_line, 0), self.lines):
+                span = first_match(pattern, self.display_cache.text(self.buffer, y),
+                                   column if screen_line + y == line else None)
+                if span:
+                    return (screen_line + y, ) + span
+            return None
+
+        for y in reversed(range(min(line - screen_line + 1, self.lines))):
+            span = last_match(pattern, self.display_cache.text(self.buffer, y),
+                              column if screen_line + y == line else None)
+            if span:
+                return (screen_line + y, ) + span
+        end = min(line + 1, screen_line)
+        for start, stop in self.search_index.candidates(literals, first, end):
+            for number in reversed(range(start, stop)):
+                span = last_match(pattern, text(history[number - first]),
+                                  column if number == line else None)
+                if span:
+                    return (number, ) + span
+        return None
+
+    def scroll_to_line(self, line):
+        """
+        Scroll the view to show a line in its middle, or the bottom of the
+        view for lines on the screen
+        """
+        history = self.history.top
+        index = line - history.first()
+        if index >= len(history):
+            self.scroll_to_bottom()
+            return
+
+        # Row above the screen of the line, or of the start of the line it
+        # was reflowed into
+        row = len(history) - 1 - index
+        same_width = min(self._same_width, len(history))
+        if row >= same_width:
+            while len(history) - same_width - self._reflow_read > index:
+                rows = same_width + len(self._reflowed)
+                if self._history_rows(rows + 1) == rows:
+                    break
+            row = same_width + len(self._reflowed) - 1
+        self.scroll_view(row + 1 + self.lines // 2 - self.viewport)
 
-            self.dirty = set(range(self.lines))
+    def view_matches(self, pattern):
+        """
+        Return the (row, start, stop) of the matches of a pattern in view
+        """
+        matches = []
+        for y in range(self.lines):
+            text = self.view_text(y)
+            matches.extend((y, ) + match.span() for match in pattern.finditer(text)
+                           if match.end() > match.start())
+        return matches
 
-    def next_page(self):
+    def reset(self):
         """
-        Move the screen page down through the history buffer
+        Overloaded to reset screen history state: the view is moved
+        back to the bottom and the history is emptied.
         """
-        if self.history.position < self.history.size and self.history.bottom:
-            mid = min(len(self.history.bottom),
-                      int(math.ceil(self.lines * self.history.ratio)))
+        super(CustomHistoryScreen, self).reset()
+        self.reset_history()
 
-            self.history.top.extend(self.buffer[:mid])
-            self.history = self.history \
-                ._replace(position=self.history.position + self.lines)
+    def erase_in_display(self, how=0):
+        """
+        Overloaded to reset history state
+        """
+        super(CustomHistoryScreen, self).erase_in_display(how)
 
-            self.buffer[:] = self.buffer[mid:] + [
-                self.history.bottom.popleft() for _ in range(mid)
-            ]
+        if how == 3:
+            self.reset_history()
 
-            self.dirty = set(range(self.lines))
+    def line_scrolled_off(self, line, top):
+        """
+        Overloaded to freeze the lines removed from the top into the history,
+        the lines themselves are handed back to the screen for reuse
+        """
+        if top:
+            if self.viewport:
+                # Lines in view may be dropped from the history, jump back
+                self.viewport = 0
+                self._drop_reflowed()
+                self.dirty.mark_all()
+            self._push_history(line, self.wrapped[self.margins.top])
+        self.release_line(line)
 
     def resize(self, lines=None, columns=None):
         lines = lines or self.lines
         columns = columns or self.columns
+        self.viewport = 0
+        self._drop_reflowed()
+
+        if columns != self.columns:
+            self._reflow(lines, columns)
+        else:
+            self._resize_lines(lines)
+
+        self.lines, self.columns = lines, columns
+        self.margins = Margins(0, self.lines - 1)
+        self.dirty.resize(lines, columns)
+        self.runs.rebuild(self.buffer, columns)
+        self.display_cache.reset(lines)
+
+        # JW tweak - move cursor upwards if its out of bounds do not reset it
+        self.ensure_bounds(use_margins=True)
+
+        # Update tabstops to new screen size
+        self.tabstops = set(range(8, self.columns, 8))
 
-        # First resize the lines:
+    def _resize_lines(self, lines):
         line_diff = self.lines - lines
 
         # a) if the current display size is less than the requested
         #    size, add lines to the bottom.
         if line_diff < 0:
-            self.buffer.extend(take(self.columns, self.default_line)
+            self.buffer.extend(self.blank_line()
                                for _ in range(line_diff, 0))
+            self.wrapped.extend(False for _ in range(line_diff, 0))
         # b) if the current display size is greater than requested
         #    size, take lines off the top.
         elif line_diff > 0:
             # JW tweak - if we only have spaces in the bottom of the screen
             # remove those lines instead
-            disp = self.display[-line_diff:]
-            contents = "".join(disp)
+            contents = "".join(self.display_cache.text(self.buffer, line)
+                               for line in range(lines, self.lines))
             if contents.isspace():
                 self.buffer[-line_diff:] = ()
+                self.wrapped[-line_diff:] = ()
             else:
                 self.buffer[:line_diff] = ()
+                self.wrapped[:line_diff] = ()
 
-        # Then resize the columns:
-        col_diff = self.columns - columns
+    def _reflow(self, lines, columns):
+        """
+        Rewrap the lines of the screen to a new number of columns and lines.
+        Lines that were soft-wrapped are joined again first, the first line
+        with its start in the history, and the cursor stays on the same
+        character. Rows that do not fit anymore go to the history,
+        but blank rows below the cursor are dropped first.
+        """
+        width = self.columns
+        cursor = self.cursor
+
+        # The first line may have been wrapped from the history
+        history = self.history.top
+        head = self.buffer[0][:0]
+        while history and is_wrapped(history[-1]):
+            line = self.thaw_line(self._pop_history())
+            line.extend(head)
+            head = line
+
+        rows = []
+        wrapped = []
+        cursor_row = cursor_x = 0
+        start = 0
+        for end in range(len(self.buffer)):
+            if self.wrapped[end] and end < len(self.buffer) - 1:
+                continue
+            line = head if start == 0 else self.buffer[start][:0]
+            head_length = len(line)
+            for y in range(start, end + 1):
+                line.extend(self.buffer[y])
+            length = self._content_length(line)
+            if start <= cursor.y <= end:
+                offset = head_length + (cursor.y - start) * width + cursor.x
+                length = max(length, offset + 1)
+                cursor_row, cursor_x = len(rows) + offset // columns, offset % columns
+
+            new_rows = self._wrap_line(line, columns, length)
+            rows.extend(new_rows)
+            wrapped.extend([True] * (len(new_rows) - 1) + [False])
+            start = end + 1
+
+        excess = len(rows) - lines
+        while excess > 0 and len(rows) - 1 > cursor_row and not self._content_length(rows[-1]):
+            del rows[-1], wrapped[-1]
+            excess -= 1
+
+        # The history from here on has the new width
+        self._same_width = 0
+        if excess > 0:
+            for line, line_wrapped in zip(rows[:excess], wrapped[:excess]):
+                self._push_history(line, line_wrapped)
+            del rows[:excess], wrapped[:excess]
+            cursor_row -= excess
+
+        self.columns = columns
+        rows.extend(self.blank_line() for _ in range(lines - len(rows)))
+        wrapped.extend(False for _ in range(lines - len(wrapped)))
+        self.buffer[:] = rows
+        self.wrapped[:] = wrapped
+        cursor.y, cursor.x = cursor_row, cursor_x
+
+
+def merge_frames(older, newer):
+    """
+    Combine two consecutive frames into one that renders the same, for when
+    the older frame was not rendered yet
+    """
+    lines = {}
+    spans = {}
+    colors = {}
+
+    # The changes of the older frame are moved by the scrolls of the newer one
+    # (or scrolled out), which are rendered before any of the lines
+    for line, text in older.lines.items():
+        new_line = _scrolled_line(line, newer.scrolls)
+        if new_line is None or (newer.truncate is not None and new_line >= newer.truncate):
+            continue
 
-        # a) if the current display size is less than the requested
-        #    size, expand each line to the new size.
-        if col_diff < 0:
-            for y in range(lines):
-                self.buffer[y].extend(take(abs(col_diff), self.default_line))
-        # b) if the current display size is greater than requested
-        #    size, trim each line from the right to the new size.
-        elif col_diff > 0:
-            for line in self.buffer:
-                del line[columns:]
+        lines[new_line] = text
+        spans[new_line] = older.spans.get(line)
+        if line in older.colors:
+            colors[new_line] = older.colors[line]
 
-        self.lines, self.columns = lines, columns
-        self.margins = Margins(0, self.lines - 1)
+    for line, text in newer.lines.items():
+        if line in lines:
+            spans[line] = _merge_spans(spans[line], newer.spans.get(line))
+        else:
+            spans[line] = newer.spans.get(line)
+        lines[line] = text
+        colors.pop(line, None)
+        if line in newer.colors:
+            colors[line] = newer.colors[line]
 
-        # JW tweak - move cursor upwards if its out of bounds do not reset it
-        self.ensure_bounds(use_margins=True)
+    truncate = newer.truncate
+    if older.truncate is not None:
+        truncate = older.truncate if truncate is None else min(truncate, older.truncate)
+
+    spans = dict((line, line_spans) for line, line_spans in spans.items() if line_spans is not None)
+    return Frame(lines, spans, older.scrolls + newer.scrolls, truncate, colors, newer.cursor,
+                 newer.hits)
 
-        # Update tabstops to new screen size
-        self.tabstops = set(range(8, self.columns, 8))
+
+def _scrolled_line(line, scrolls):
+    """
+    Get where a line ends up after a list of scroll operations, None if it is
+    scrolled out
+    """
+    for top, bottom, count in scrolls:
+        if top <= line <= bottom:
+            line -= count
+            if not top <= line <= bottom:
+                return None
+    return line
+
+
+def _merge_spans(spans, other_spans):
+    """
+    Union of two lists of (start, stop) column ranges, None being the whole
+    line
+    """
+    if spans is None or other_spans is None:
+        return None
+
+    merged = []
+    for start, stop in sorted(spans + other_spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    return merged
 
 
 def take(n, iterable):
@@ -361,3 +846,41 @@ def convert_pyte_buffer_to_colormap(buffer, lines):
 
             char_index = char_index + 1
     return color_map
+
+
+def convert_attribute_runs_to_colormap(runs, lines):
+    """
+    Convert the attribute runs of a pyte diff screen to the same color map as
+    convert_pyte_buffer_to_colormap does, without looking at every character
+    """
+    color_map = {}
+    for line_index in lines:
+        # There may be lines outside the buffer after terminal was resized.
+        # These are considered blank.
+        if line_index >= len(runs):
+            continue
+
+        line_color_map = {}
+        last_index = None
+        for run in runs[line_index]:
+            # Default bg is black and default fg is white
+            bg = "black" if run.bg == "default" else run.bg
+            fg = "white" if run.fg == "default" else run.fg
+            color = (fg, bg) if run.reverse else (bg, fg)
+
+            # Runs can differ in attributes but still end up with the same
+            # color, those are combined into one field
+            if last_index is not None and line_color_map[last_index]["color"] == color:
+                line_color_map[last_index]["field_length"] += run.length
+            else:
+                line_color_map[run.start] = {"color": color, "field_length": run.length}
+                last_index = run.start
+
+        for index, field in list(line_color_map.items()):
+            if field["color"] == ("black", "white"):
+                del line_color_map[index]
+
+        if line_color_map:
+            color_map[line_index] = line_color_map
+
+    return color_map
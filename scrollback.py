@@ -0,0 +1,364 @@
+"""
+Scrollback store for the lines that scrolled off the top of the terminal
+screen. The screen freezes the lines into a compact encoding (text plus
+attribute runs), the store packs them into blocks and compresses the full
+blocks. Lines are only thawed again when they are paged back onto the screen.
+
+Optionally the oldest blocks spill over into a temporary file once the memory
+budget is used up, instead of being dropped.
+"""
+from collections import deque
+import marshal
+import mmap
+import sys
+import tempfile
+import zlib
+
+
+# Number of lines packed into a block
+BLOCK_LINES = 256
+
+# zlib level of the blocks, they are compressed on the parser thread while the
+# shell floods output
+COMPRESS_LEVEL = 1
+
+# Memory taken by a frozen line besides its encoding
+_RECORD_OVERHEAD = sys.getsizeof(b"") + 8
+
+
+class SpillFile():
+    """
+    Temporary file holding compressed blocks, written at the end and read
+    through a memory map. It is a stack like the store: blocks are only
+    removed from the end, so the space is reused by the next block written.
+
+    The file is unlinked from the start, it is gone once closed or when the
+    process exits.
+    """
+    def __init__(self):
+        self._file = tempfile.TemporaryFile(prefix="TerminalView-scrollback-")
+        self._map = None
+        self._end = 0
+
+    def write(self, block):
+        """
+        Append a block, returns its offset
+        """
+        offset = self._end
+        self._file.seek(offset)
+        self._file.write(block)
+        self._file.flush()
+        self._end += len(block)
+        return offset
+
+    def read(self, offset, length):
+        if self._map is None or offset + length > len(self._map):
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map[offset:offset + length]
+
+    def truncate(self, offset):
+        """
+        Forget the blocks from offset on
+        """
+        self._end = offset
+
+    def compact(self, index):
+        """
+        Move the blocks of index, (offset, length) tuples in the order of
+        their offsets, to the start of the file and give the space after them
+        back. Returns the new offsets.
+        """
+        self._end = 0
+        offsets = [self.write(self.read(offset, length)) for offset, length in index]
+
+        # The file may not shrink under the memory map
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.truncate(self._end)
+        return offsets
+
+    def size(self):
+        return self._end
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+
+class Scrollback():
+    """
+    Stack of frozen lines, as bytes records: lines are appended as they scroll
+    off the screen and popped newest first while paging up. Once the store is
+    over its memory budget (in bytes) or line limit the oldest lines are
+    dropped, or with spill the oldest blocks over the memory budget are moved
+    to a SpillFile.
+
+    The newest lines are kept as a list of frozen lines (the hot block), every
+    BLOCK_LINES lines it is compressed and moved to the cold blocks. Popping
+    into an empty hot block decompresses the newest cold block, or the newest
+    spilled block once there are no cold blocks.
+
+    Lines can also be read in place by index, oldest first, as the terminal
+    view does while scrolled back. The block of the last line read stays
+    decompressed, so reading a page of lines decompresses it only once.
+    Besides their index lines have a number that does not change as older
+    lines are dropped, see first.
+
+    Memory kept elsewhere for every line, like a search index, can be counted
+    against the budget with line_overhead bytes per line in memory. The
+    overhead of spilled lines is not counted, with spill the history is not
+    bounded anyway.
+    """
+    def __init__(self, max_bytes, max_lines=None, spill=False, line_overhead=0):
+        self._max_bytes = max_bytes
+        self._max_lines = max_lines
+        self._spill = spill
+        self._line_overhead = line_overhead
+
+        self._hot = []
+        self._hot_bytes = 0
+        # (compressed block, number of lines) tuples, oldest first
+        self._blocks = deque()
+        self._cold_bytes = 0
+        self._cold_lines = 0
+        # Index of the spilled blocks as (offset, length, number of lines)
+        # tuples, oldest first
+        self._spill_file = None
+        self._spilled = deque()
+        self._spilled_lines = 0
+        # Number of dropped lines at the start of the oldest block
+        self._skip = 0
+        # (block entry, records) of the last block read by index
+        self._read = None, None
+        # Number of lines dropped from the start
+        self._dropped = 0
+
+    def __len__(self):
+        return len(self._hot) + self._cold_lines + self._spilled_lines - self._skip
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __getitem__(self, index):
+        """
+        Return the record at index, 0 being the oldest line
+        """
+        size = len(self)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("scrollback index out of range")
+
+        # Every block but the hot one holds BLOCK_LINES lines
+        index += self._skip
+        if index < self._spilled_lines:
+            entry = self._spilled[index // BLOCK_LINES]
+        else:
+            index -= self._spilled_lines
+            if index >= self._cold_lines:
+                return self._hot[index - self._cold_lines]
+            entry = self._blocks[index // BLOCK_LINES]
+
+        if self._read[0] is not entry:
+            if len(entry) == 3:
+                block = self._spill_file.read(entry[0], entry[1])
+            else:
+                block = entry[0]
+            self._read = entry, marshal.loads(zlib.decompress(block))
+        return self._read[1][index % BLOCK_LINES]
+
+    def first(self):
+        """
+        Return the number of the oldest line. Lines are numbered in the order
+        they were appended, popped lines give their numbers back.
+        """
+        return self._dropped
+
+    def memory(self):
+        """
+        Number of bytes taken by the stored lines in memory, including the
+        line overhead
+        """
+        nb_lines = len(self._hot) + self._cold_lines
+        return self._hot_bytes + self._cold_bytes + nb_lines * self._line_overhead
+
+    def stats(self):
+        return {
+            "lines": len(self),
+            "bytes": self.memory(),
+            "blocks": len(self._blocks),
+            "spilled_blocks": len(self._spilled),
+            "spilled_bytes": self._spill_file.size() if self._spill_file else 0,
+        }
+
+    def clear(self):
+        self._dropped += len(self)
+        del self._hot[:]
+        self._hot_bytes = 0
+        self._blocks.clear()
+        self._cold_bytes = 0
+        self._cold_lines = 0
+        self._clear_spilled()
+        self._skip = 0
+        self._read = None, None
+
+    def close(self):
+        """
+        Delete the spill file, dropping the lines in it. The lines in memory
+        are kept, but nothing spills over anymore.
+        """
+        if self._spilled:
+            self._dropped += self._spilled_lines - self._skip
+        self._clear_spilled()
+        self._spill = False
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    def append(self, record):
+        self._push(record)
+        self._trim()
+
+    def extend(self, records):
+        for record in records:
+            self._push(record)
+        self._trim()
+
+    def pop(self):
+        """
+        Remove and return the newest record
+        """
+        if not self._hot:
+            if self._blocks:
+                block, nb_lines = self._blocks.pop()
+                self._cold_bytes -= len(block)
+                self._cold_lines -= nb_lines
+            elif self._spilled:
+                offset, length, nb_lines = self._spilled.pop()
+                block = self._spill_file.read(offset, length)
+                self._spill_file.truncate(offset)
+                self._spilled_lines -= nb_lines
+            else:
+                raise IndexError("pop from an empty scrollback")
+            self._thaw_block(block)
+
+        record = self._hot.pop()
+        self._hot_bytes -= len(record) + _RECORD_OVERHEAD
+        return record
+
+    def _push(self, record):
+        self._hot.append(record)
+        self._hot_bytes += len(record) + _RECORD_OVERHEAD
+        if len(self._hot) >= BLOCK_LINES:
+            self._freeze_block()
+
+    def _freeze_block(self):
+        block = zlib.compress(marshal.dumps(self._hot), COMPRESS_LEVEL)
+        self._blocks.append((block, len(self._hot)))
+        self._cold_bytes += len(block)
+        self._cold_lines += len(self._hot)
+        self._hot = []
+        self._hot_bytes = 0
+
+    def _thaw_block(self, block):
+        records = marshal.loads(zlib.decompress(block))
+        if not self._blocks and not self._spilled:
+            # This was the oldest block
+            records = records[self._skip:]
+            self._skip = 0
+        self._hot = records
+        self._hot_bytes = sum(len(record) for record in records) + \
+            len(records) * _RECORD_OVERHEAD
+
+    def _trim(self):
+        """
+        Spill or drop the oldest lines until the store is within its limits
+        """
+        while self.memory() > self._max_bytes and self._blocks:
+            if self._spill:
+                self._spill_block()
+            else:
+                self._drop_block()
+
+        if self._max_lines is not None:
+            excess = len(self) - self._max_lines
+            while excess > 0 and (self._spilled or self._blocks):
+                left = (self._spilled or self._blocks)[0][-1] - self._skip
+                if excess < left:
+                    self._skip += excess
+                    self._dropped += excess
+                    excess = 0
+                else:
+                    self._drop_block()
+                    excess -= left
+            if excess > 0:
+                self._drop_hot(excess)
+
+        if self.memory() > self._max_bytes and not self._spill:
+            # Only the hot block is left, with spill it may go over budget
+            # until it is full
+            dropped = 0
+            budget = self.memory() - self._max_bytes
+            for record in self._hot:
+                if budget <= 0:
+                    break
+                budget -= len(record) + _RECORD_OVERHEAD + self._line_overhead
+                dropped += 1
+            self._drop_hot(dropped)
+
+    def _spill_block(self):
+        """
+        Move the oldest block in memory to the spill file
+        """
+        if self._spill_file is None:
+            self._spill_file = SpillFile()
+        block, nb_lines = self._blocks.popleft()
+        self._cold_bytes -= len(block)
+        self._cold_lines -= nb_lines
+        offset = self._spill_file.write(block)
+        self._spilled.append((offset, len(block), nb_lines))
+        self._spilled_lines += nb_lines
+
+    def _drop_block(self):
+        """
+        Drop the oldest block
+        """
+        self._dropped += (self._spilled or self._blocks)[0][-1] - self._skip
+        if self._spilled:
+            _, _, nb_lines = self._spilled.popleft()
+            self._spilled_lines -= nb_lines
+            if not self._spilled:
+                self._spill_file.truncate(0)
+            elif self._spilled[0][0] > self._spill_file.size() // 2:
+                # Most of the file is dropped lines
+                self._compact_spilled()
+        else:
+            block, nb_lines = self._blocks.popleft()
+            self._cold_bytes -= len(block)
+            self._cold_lines -= nb_lines
+        self._skip = 0
+
+    def _drop_hot(self, count):
+        dropped = self._hot[:count]
+        self._dropped += len(dropped)
+        del self._hot[:count]
+        self._hot_bytes -= sum(len(record) for record in dropped) + \
+            len(dropped) * _RECORD_OVERHEAD
+
+    def _compact_spilled(self):
+        offsets = self._spill_file.compact([(offset, length)
+                                            for offset, length, _ in self._spilled])
+        self._spilled = deque((offset, length, nb_lines) for offset, (_, length, nb_lines)
+                              in zip(offsets, self._spilled))
+
+    def _clear_spilled(self):
+        if self._spilled:
+            self._spilled.clear()
+            self._spilled_lines = 0
+            self._skip = 0
+            self._spill_file.truncate(0)
@@ -2,12 +2,13 @@
 Wrapper module around a Sublime Text 3 view for showing a terminal look-a-like
 """
 import collections
+import threading
 import time
 
 import sublime
 import sublime_plugin
 
-from . import gateone_terminal_emulator
+from . import io_hub
 from . import pyte_terminal_emulator
 from . import utils
 from . import sublime_view_cache
@@ -38,7 +39,7 @@ class SublimeBufferManager():
 
 
 class SublimeTerminalBuffer():
-    def __init__(self, sublime_view, title, syntax_file=None):
+    def __init__(self, sublime_view, title, syntax_file=None, term_emulator=None):
         self._view = sublime_view
         self._view.set_name(title)
         self._view.set_scratch(True)
@@ -67,10 +68,32 @@ class SublimeTerminalBuffer():
         self._right_margin = settings.get("terminal_view_right_margin", 3)
         self._bottom_margin = settings.get("terminal_view_bottom_margin", 0)
 
-        # Use pyte as underlying terminal emulator
-        hist = settings.get("terminal_view_scroll_history", 1000)
-        ratio = settings.get("terminal_view_scroll_ratio", 0.5)
-        self._term_emulator = pyte_terminal_emulator.PyteTerminalEmulator(80, 24, hist, ratio)
+        # Use pyte as underlying terminal emulator, unless it runs in a worker
+        # process and term_emulator is the EmulatorWorker of it
+        if term_emulator is None:
+            hist = settings.get("terminal_view_scroll_history", 0)
+            hist_mb = settings.get("terminal_view_scroll_history_mb", 16)
+            hist_spill = settings.get("terminal_view_scroll_history_spill", False)
+            ratio = settings.get("terminal_view_scroll_ratio", 0.5)
+            parser = settings.get("terminal_view_parser", "vt500")
+            term_emulator = pyte_terminal_emulator.PyteTerminalEmulator(80, 24, hist, ratio, parser,
+                                                                        hist_mb, hist_spill)
+        self._term_emulator = term_emulator
+
+        # The emulator is fed by the parser thread and frames of it are taken
+        # by the I/O thread. The I/O thread serves all terminals so it never
+        # waits for the lock, what it can not do while the parser holds it is
+        # left to the parser.
+        self._emulator_lock = threading.RLock()
+        self._request_lock = threading.Lock()
+        self._frame_requested = False
+        self._requested_size = None
+
+        # Frame waiting to be rendered by the UI thread
+        self._frame_lock = threading.Lock()
+        self._pending_frame = None
+        self._nb_frames = 0
+        self._nb_dropped_frames = 0
 
         self._keypress_callback = None
         self._view_content_cache = sublime_view_cache.SublimeViewContentCache()
@@ -102,14 +125,103 @@ class SublimeTerminalBuffer():
         return self._term_emulator
 
     def insert_data(self, data):
+        """
+        Feed shell output to the emulator. A frame or resize the I/O thread
+        asked for while the emulator was busy is done right after.
+        """
         start = time.time()
-        self._term_emulator.feed(data)
+        with self._emulator_lock:
+            self._term_emulator.feed(data)
+            frame = self._handle_requests()
         t = time.time() - start
         utils.ConsoleLogger.log("Updated terminal emulator in %.3f ms" % (t * 1000.))
 
+        if frame is not None:
+            self._publish_frame(frame)
+
     def update_view(self):
+        """
+        Take a frame of the emulator and have the UI thread render it. Only the
+        emulator lock is held while taking the frame, rendering does not hold
+        up the parsing of shell output. When the parser is busy feeding a batch
+        it takes the frame once it is done, so the I/O thread does not wait.
+        """
+        if not self._emulator_lock.acquire(False):
+            with self._request_lock:
+                self._frame_requested = True
+            return
+
+        try:
+            frame = self._handle_requests(take_frame=True)
+        finally:
+            self._emulator_lock.release()
+
+        if frame is not None:
+            self._publish_frame(frame)
+
+    def pop_frame(self):
+        """
+        Get the newest frame to render, None if it was already rendered
+        """
+        with self._frame_lock:
+            frame = self._pending_frame
+            self._pending_frame = None
+            return frame
+
+    def frame_stats(self):
+        """
+        Number of frames taken and the number of those that were never
+        rendered on their own as a newer frame replaced them
+        """
+        with self._frame_lock:
+            return {"frames": self._nb_frames, "dropped": self._nb_dropped_frames}
+
+    def _handle_requests(self, take_frame=False):
+        """
+        Do the resize and take the frame requested while the emulator lock was
+        held elsewhere, must be called with the emulator lock held. Returns the
+        frame to publish, if any.
+        """
+        with self._request_lock:
+            size = self._requested_size
+            take_frame = take_frame or self._frame_requested
+            self._requested_size = None
+            self._frame_requested = False
+
+        if size is not None:
+            self._term_emulator.resize(*size)
+
+        if not take_frame:
+            return None
+
         self._scroll_terminal_if_requested()
-        if self.terminal_emulator().modified():
+        self._search_terminal_if_requested()
+        if not self._term_emulator.modified():
+            return None
+
+        start = time.time()
+        frame = self._term_emulator.take_frame(self._show_colors)
+        t = time.time() - start
+        utils.ConsoleLogger.log("Took frame in %.3f ms" % (t * 1000.))
+        return frame
+
+    def _publish_frame(self, frame):
+        with self._frame_lock:
+            self._nb_frames += 1
+            if self._pending_frame is not None:
+                # The UI thread did not get to the previous frame yet, it
+                # renders the combined changes once it does
+                self._pending_frame = pyte_terminal_emulator.merge_frames(
+                    self._pending_frame, frame)
+                self._nb_dropped_frames += 1
+                return
+
+            self._pending_frame = frame
+
+        sublime.set_timeout(self._render_frame, 0)
+
+    def _render_frame(self):
+        if self._view.is_valid():
             self._view.run_command("terminal_view_update")
 
     def is_open(self):
@@ -117,9 +229,21 @@ class SublimeTerminalBuffer():
 
     def deactivate(self):
         self._view.settings().set("terminal_view", False)
-        self.update_view()
+        # The parser is done at this point so waiting for the lock is fine
+        with self._emulator_lock:
+            frame = self._handle_requests(take_frame=True)
+        if frame is not None:
+            self._publish_frame(frame)
         self._keypress_callback = None
-        SublimeBufferManager.deregister(self._view.id())
+        # Deregister on the UI thread after the last frame was rendered
+        sublime.set_timeout(self._deregister, 0)
+        with self._emulator_lock:
+            self._term_emulator.close()
+
+    def _deregister(self):
+        # The view may have been activated again with a new buffer meanwhile
+        if SublimeBufferManager.buffers.get(self._view.id()) is self:
+            SublimeBufferManager.deregister(self._view.id())
 
     def close(self):
         if self.is_open():
@@ -127,12 +251,17 @@ class SublimeTerminalBuffer():
             sublime.active_window().run_command("close_file")
 
     def update_terminal_size(self, nb_rows, nb_cols):
-        # Make sure all content beyond the new number of rows is deleted
-        if nb_rows < self._term_emulator.nb_lines():
-            start, _ = self.view_content_cache().get_line_start_and_end_points(nb_rows)
-            self._view.run_command("terminal_view_clear", args={"start": start})
-
-        self._term_emulator.resize(nb_rows, nb_cols)
+        # Content beyond the new number of rows is deleted by the next frame.
+        # When the parser is busy it resizes once done with its batch, or the
+        # next update_view does.
+        with self._request_lock:
+            self._requested_size = (nb_rows, nb_cols)
+
+        if self._emulator_lock.acquire(False):
+            try:
+                self._handle_requests()
+            finally:
+                self._emulator_lock.release()
 
     def view_size(self):
         view = self._view
@@ -172,11 +301,26 @@ class SublimeTerminalBuffer():
 
             self._view.settings().set("terminal_view_scroll", None)
 
+    def _search_terminal_if_requested(self):
+        search_request = self._view.settings().get("terminal_view_search", None)
+        if search_request is not None:
+            action = search_request[0]
+            if action == "new":
+                self.terminal_emulator().search(search_request[1], search_request[2])
+            elif action == "prev":
+                self.terminal_emulator().search_prev()
+            elif action == "next":
+                self.terminal_emulator().search_next()
+            else:
+                self.terminal_emulator().clear_search()
+
+            self._view.settings().set("terminal_view_search", None)
+
 
 class TerminalViewScroll(sublime_plugin.TextCommand):
     def run(self, _, forward=False, line=False):
         # Mark in view to request a scroll in the thread that handles the
-        # updates. Note lines are NOT supported at the moment.
+        # updates
         if line:
             scroll_request = ("line", )
         else:
@@ -189,6 +333,45 @@ class TerminalViewScroll(sublime_plugin.TextCommand):
 
         self.view.settings().set("terminal_view_scroll", scroll_request)
 
+        # Have the I/O thread handle the scroll right away
+        io_hub.get_hub().wake()
+
+
+def _request_search(view, search_request):
+    # Searched in the thread that handles the updates, like scrolls
+    view.settings().set("terminal_view_search", search_request)
+    io_hub.get_hub().wake()
+
+
+class TerminalViewSearch(sublime_plugin.TextCommand):
+    """
+    Search the terminal history as the query is typed in the input panel, the
+    view scrolls to the newest match and all matches in view are highlighted
+    """
+    def run(self, _, regex=False):
+        view = self.view
+        query = view.settings().get("terminal_view_search_query", "")
+
+        def on_change(text):
+            _request_search(view, ("new", text, regex))
+
+        def on_done(text):
+            view.settings().set("terminal_view_search_query", text)
+            view.window().focus_view(view)
+
+        def on_cancel():
+            _request_search(view, ("clear", ))
+            view.window().focus_view(view)
+
+        prompt = "Search terminal history (regex):" if regex else "Search terminal history:"
+        panel = view.window().show_input_panel(prompt, query, on_done, on_change, on_cancel)
+        panel.run_command("select_all")
+
+
+class TerminalViewSearchNext(sublime_plugin.TextCommand):
+    def run(self, _, forward=False):
+        _request_search(self.view, ("next", ) if forward else ("prev", ))
+
 
 class TerminalViewKeypress(sublime_plugin.TextCommand):
     def __init__(self, view):
@@ -296,6 +479,7 @@ class TerminalViewUpdate(sublime_plugin.TextCommand):
     def __init__(self, view):
         super().__init__(view)
         self._sub_buffer = None
+        self._hits_shown = False
 
     def run(self, edit):
         # Lookup the sublime buffer instance for this view the first time this
@@ -303,75 +487,168 @@ class TerminalViewUpdate(sublime_plugin.TextCommand):
         if self._sub_buffer is None:
             self._sub_buffer = SublimeBufferManager.load_from_id(self.view.id())
 
+        # Render the newest frame of the emulator, there is none when it was
+        # already rendered
+        frame = self._sub_buffer.pop_frame()
+        if frame is None:
+            return
+
         # Update dirty lines in buffer if there are any
-        dirty_lines = self._sub_buffer.terminal_emulator().dirty_lines()
-        if len(dirty_lines) > 0:
+        if frame.lines or frame.scrolls or frame.truncate is not None:
             self._update_viewport_position()
 
             # Invalidate the last cursor position when dirty lines are updated
             self.view.settings().set("terminal_view_last_cursor_pos", None)
 
-            # Generate color map
-            color_map = {}
-            if self._sub_buffer.colors_enabled():
+            # Move the lines that scrolled in the terminal instead of rewriting
+            # them
+            if frame.scrolls:
                 start = time.time()
-                color_map = self._sub_buffer.terminal_emulator().color_map(dirty_lines.keys())
+                self._scroll_lines(edit, frame.scrolls)
                 t = time.time() - start
-                utils.ConsoleLogger.log("Generated color map in %.3f ms" % (t * 1000.))
+                utils.ConsoleLogger.log("Scrolled ST3 view in %.3f ms" % (t * 1000.))
+
+            # Make sure all content beyond the new number of rows is deleted
+            if frame.truncate is not None:
+                self._truncate_lines(edit, frame.truncate)
 
             # Update the view
             start = time.time()
-            self._update_lines(edit, dirty_lines, color_map)
+            self._update_lines(edit, frame.lines, frame.colors, frame.spans)
             t = time.time() - start
             utils.ConsoleLogger.log("Updated ST3 view in %.3f ms" % (t * 1000.))
 
+        self._update_search_hits(frame.hits)
+
         # Update cursor last to avoid a selection blinking at the top of the
         # terminal when starting or when a new prompt is being drawn at the
         # bottom
-        self._update_cursor()
+        self._update_cursor(frame.cursor)
+
+    def _update_search_hits(self, hits):
+        if hits is None:
+            if self._hits_shown:
+                self.view.erase_regions("terminal_view_search")
+                self._hits_shown = False
+            return
 
-        # Clear dirty lines (and modified flag)
-        self._sub_buffer.terminal_emulator().clear_dirty()
+        view_content_cache = self._sub_buffer.view_content_cache()
+        regions = []
+        for row, start, stop in hits:
+            if view_content_cache.has_line(row):
+                line_start = view_content_cache.get_line_start_point(row)
+                regions.append(sublime.Region(line_start + start, line_start + stop))
+        self.view.add_regions("terminal_view_search", regions, "terminalview.brown_black",
+                              flags=sublime.DRAW_NO_OUTLINE)
+        self._hits_shown = True
 
     def _update_viewport_position(self):
         self.view.set_viewport_position((0, 0), animate=False)
 
-    def _update_cursor(self):
-        cursor_pos = self._sub_buffer.terminal_emulator().cursor()
+    def _update_cursor(self, cursor_pos):
         last_cursor_pos = self.view.settings().get("terminal_view_last_cursor_pos")
         if last_cursor_pos and last_cursor_pos[0] == cursor_pos[0] and last_cursor_pos[1] == cursor_pos[1]:
             return
 
-        tp = self.view.text_point(cursor_pos[0], cursor_pos[1])
+        # Use the content cache for the text point when the line is in it as it
+        # is faster than the ST3 API
+        view_content_cache = self._sub_buffer.view_content_cache()
+        if view_content_cache.has_line(cursor_pos[0]):
+            tp = view_content_cache.get_line_start_point(cursor_pos[0]) + cursor_pos[1]
+        else:
+            tp = self.view.text_point(cursor_pos[0], cursor_pos[1])
         self.view.sel().clear()
         self.view.sel().add(sublime.Region(tp, tp))
         self.view.settings().set("terminal_view_last_cursor_pos", cursor_pos)
 
-    def _update_lines(self, edit, dirty_lines, color_map):
+    def _update_lines(self, edit, dirty_lines, color_map, dirty_spans=None):
+        # Dirty spans are the changed column ranges of each dirty line. Lines
+        # without spans are replaced as a whole.
+        if dirty_spans is None:
+            dirty_spans = {}
+
         self.view.set_read_only(False)
+        view_region_cache = self._sub_buffer.view_region_cache()
         lines = dirty_lines.keys()
         for line_no in sorted(lines):
-            # Clear any colors on the line
-            self._remove_color_regions_on_line(line_no)
-
             # Update the line
-            self._update_line_content(edit, line_no, dirty_lines[line_no])
+            replaced = self._update_line_content(edit, line_no, dirty_lines[line_no],
+                                                 dirty_spans.get(line_no))
 
-            # Apply colors to the line if there are any on it
-            if line_no in color_map:
-                self._update_line_colors(line_no, color_map[line_no])
+            # Colors need to be redone if they changed or if the text under them
+            # was replaced (which may have shrunk or moved the regions)
+            if _colors_overlap(view_region_cache.get_line_colors(line_no), replaced):
+                view_region_cache.mark_line_dirty(line_no)
+            view_region_cache.set_line_colors(line_no, color_map.get(line_no, {}))
 
         self.view.set_read_only(True)
 
-    def _remove_color_regions_on_line(self, line_no):
+        self._update_color_regions()
+
+    def _scroll_lines(self, edit, scrolls):
+        """
+        Apply a list of (top, bottom, count) scroll operations to the view. Lines
+        top to bottom move up by count lines (down if count is negative), the
+        lines scrolled out are erased and empty lines are inserted in their
+        place.
+        """
+        view_content_cache = self._sub_buffer.view_content_cache()
         view_region_cache = self._sub_buffer.view_region_cache()
-        if view_region_cache.has_line(line_no):
-            region_keys = view_region_cache.get_line(line_no)
-            for key in region_keys:
-                self.view.erase_regions(key)
-            view_region_cache.delete_line(line_no)
 
-    def _update_line_content(self, edit, line_no, content):
+        self.view.set_read_only(False)
+        for top, bottom, count in scrolls:
+            if count > 0:
+                scrolled_out = range(top, top + count)
+                insert_line = bottom + 1
+                inserted = range(bottom - count + 1, bottom + 1)
+            else:
+                scrolled_out = range(bottom + count + 1, bottom + 1)
+                insert_line = top
+                inserted = range(top, top - count)
+
+            erase_start, _ = view_content_cache.get_line_start_and_end_points(scrolled_out[0])
+            erase_end, _ = view_content_cache.get_line_start_and_end_points(scrolled_out[-1] + 1)
+            insert_point, _ = view_content_cache.get_line_start_and_end_points(insert_line)
+
+            # Always modify the later part of the view first so the other point
+            # stays valid
+            if insert_point >= erase_end:
+                self.view.insert(edit, insert_point, "\n" * abs(count))
+                self.view.erase(edit, sublime.Region(erase_start, erase_end))
+            else:
+                self.view.erase(edit, sublime.Region(erase_start, erase_end))
+                self.view.insert(edit, insert_point, "\n" * abs(count))
+
+            view_content_cache.scroll_lines(top, bottom, count)
+            view_region_cache.scroll_lines(top, bottom, count)
+
+            # Color regions of the lines next to the inserted lines may have
+            # grown into them
+            view_region_cache.mark_line_dirty(inserted[0] - 1)
+            view_region_cache.mark_line_dirty(inserted[-1] + 1)
+
+        self.view.set_read_only(True)
+
+    def _truncate_lines(self, edit, nb_rows):
+        """
+        Delete all lines from nb_rows on, their colors are removed with the
+        next color region update
+        """
+        view_content_cache = self._sub_buffer.view_content_cache()
+        start, _ = view_content_cache.get_line_start_and_end_points(nb_rows)
+        self.view.set_read_only(False)
+        self.view.erase(edit, sublime.Region(start, self.view.size()))
+        self.view.set_read_only(True)
+
+        view_content_cache.delete_lines_from(nb_rows)
+        self._sub_buffer.view_region_cache().delete_lines_from(nb_rows)
+
+    def _update_line_content(self, edit, line_no, content, spans=None):
+        """
+        Update a line in the view and return a list of the (start, stop) column
+        ranges that were replaced. When only some spans of the line changed,
+        only those are replaced.
+        """
         # Note this function has been optimized quite a bit. Calls to the ST3
         # API has been left out on purpose as they are slower than the
         # alternative.
@@ -382,42 +659,50 @@ class TerminalViewUpdate(sublime_plugin.TextCommand):
         # Check in our local buffer that the content line is different from what
         # we are already showing - otherwise we can stop now
         view_content_cache = self._sub_buffer.view_content_cache()
-        if view_content_cache.has_line(line_no):
-            if view_content_cache.get_line(line_no) == content_w_newline:
-                return
+        cached_content = view_content_cache.get_line(line_no)
+        if cached_content == content_w_newline:
+            return []
 
         # Content is different - make ST3 region that spans the line. Start by
         # geting start and end point of the line
         line_start, line_end = view_content_cache.get_line_start_and_end_points(line_no)
 
-        # Make region spanning entire line (including any newline at the end)
-        line_region = sublime.Region(line_start, line_end)
-        self.view.replace(edit, line_region, content_w_newline)
+        if spans and cached_content is not None and len(cached_content) == len(content_w_newline):
+            # Line has the same length so only replace the spans that changed
+            replaced = []
+            for start, stop in spans:
+                stop = min(stop, len(content))
+                if cached_content[start:stop] != content[start:stop]:
+                    span_region = sublime.Region(line_start + start, line_start + stop)
+                    self.view.replace(edit, span_region, content[start:stop])
+                    replaced.append((start, stop))
+        else:
+            # Make region spanning entire line (including any newline at the end)
+            line_region = sublime.Region(line_start, line_end)
+            self.view.replace(edit, line_region, content_w_newline)
+            replaced = [(0, len(content_w_newline))]
+
         view_content_cache.update_line(line_no, content_w_newline)
+        return replaced
 
-    def _update_line_colors(self, line_no, line_color_map):
-        # Note this function has been optimized quite a bit. Calls to the ST3
-        # API has been left out on purpose as they are slower than the
-        # alternative.
+    def _update_color_regions(self):
+        # All fields of a color are added as the regions of one key, so there is
+        # one API call for each color that changed instead of one per field
         view_region_cache = self._sub_buffer.view_region_cache()
         view_content_cache = self._sub_buffer.view_content_cache()
+        flags = sublime.DRAW_NO_OUTLINE | sublime.PERSISTENT
 
-        for idx, field in line_color_map.items():
-            length = field["field_length"]
-            color_scope = "terminalview.%s_%s" % (field["color"][0], field["color"][1])
+        for color, fields in view_region_cache.pop_dirty_colors().items():
+            color_scope = "terminalview.%s_%s" % (color[0], color[1])
+            regions = []
+            for line_no, idx, length in fields:
+                color_start = view_content_cache.get_line_start_point(line_no) + idx
+                regions.append(sublime.Region(color_start, color_start + length))
 
-            # Get text point where color should start
-            line_start, _ = view_content_cache.get_line_start_and_end_points(line_no)
-            color_start = line_start + idx
-
-            # Make region that should be colored
-            buffer_region = sublime.Region(color_start, color_start + length)
-            region_key = "%i,%s" % (line_no, idx)
-
-            # Add the region
-            flags = sublime.DRAW_NO_OUTLINE | sublime.PERSISTENT
-            self.view.add_regions(region_key, [buffer_region], color_scope, flags=flags)
-            view_region_cache.add(line_no, region_key)
+            if regions:
+                self.view.add_regions(color_scope, regions, color_scope, flags=flags)
+            else:
+                self.view.erase_regions(color_scope)
 
 
 class TerminalViewClear(sublime_plugin.TextCommand):
@@ -431,6 +716,19 @@ class TerminalViewClear(sublime_plugin.TextCommand):
         self.view.set_read_only(True)
 
 
+def _colors_overlap(line_color_map, spans):
+    """
+    Check if any of the colored fields in a line color map overlap any of the
+    given (start, stop) column ranges
+    """
+    for idx, field in line_color_map.items():
+        for start, stop in spans:
+            if idx < stop and start < idx + field["field_length"]:
+                return True
+
+    return False
+
+
 def set_color_scheme(view):
     """
     Set color scheme for view
@@ -12,12 +12,28 @@ class SublimeViewContentCache():
     def __init__(self):
         self._buffer_contents = {}
 
+        # Prefix sums of the line lengths, i.e. the start point of each line.
+        # Only the start points of lines before a changed line stay valid, the
+        # rest is dropped and extended again on the next lookup.
+        self._line_starts = [0]
+
     def update_line(self, line_no, content):
+        old_content = self._buffer_contents.get(line_no)
+        if old_content is None or len(old_content) != len(content):
+            self._invalidate_line_starts(line_no)
         self._buffer_contents[line_no] = content
 
     def delete_line(self, line_no):
         if line_no in self._buffer_contents:
             del self._buffer_contents[line_no]
+            self._invalidate_line_starts(line_no)
+
+    def delete_lines_from(self, line_no):
+        """
+        Delete all lines from line_no on, e.g. when the terminal shrunk
+        """
+        for i in [i for i in self._buffer_contents if i >= line_no]:
+            self.delete_line(i)
 
     def get_line(self, line_no):
         if line_no in self._buffer_contents:
@@ -28,13 +44,7 @@ class SublimeViewContentCache():
         return line_no in self._buffer_contents
 
     def get_line_start_and_end_points(self, line_no):
-        start_point = 0
-
-        # Sum all lines leading up to the line we want the start point to
-        for i in range(line_no):
-            if i in self._buffer_contents:
-                line_len = len(self._buffer_contents[i])
-                start_point = start_point + line_len
+        start_point = self.get_line_start_point(line_no)
 
         # Add length of line to the end_point
         end_point = start_point
@@ -44,30 +54,146 @@ class SublimeViewContentCache():
 
         return (start_point, end_point)
 
+    def get_line_start_point(self, line_no):
+        line_starts = self._line_starts
+
+        # Sum the lengths of the lines leading up to the line we want the start
+        # point to, starting from the last known start point
+        if line_no >= len(line_starts):
+            contents = self._buffer_contents
+            start_point = line_starts[-1]
+            for i in range(len(line_starts) - 1, line_no):
+                if i in contents:
+                    start_point = start_point + len(contents[i])
+                line_starts.append(start_point)
+
+        return line_starts[line_no]
+
+    def _invalidate_line_starts(self, line_no):
+        del self._line_starts[line_no + 1:]
+
+    def scroll_lines(self, top, bottom, count):
+        """
+        Move lines top to bottom (inclusive) up by count lines, or down if
+        count is negative. Lines scrolled in are empty.
+        """
+        _scroll_dict(self._buffer_contents, top, bottom, count, "\n")
+        self._invalidate_line_starts(top)
+
 
 class SublimeViewRegionCache():
     """
-    Sublime view region cache. Keep this up to date with any changes you make
-    to a views regions and it will perform much faster than its ST3 API
-    equivalent.
+    Sublime view region cache. Keeps the color map of each line and groups the
+    colored fields by color, so that all regions of a color can be added to the
+    view with one API call. Colors whose regions changed are marked dirty until
+    they are popped with pop_dirty_colors.
     """
     def __init__(self):
-        self._buffer_regions = {}
+        self._line_colors = {}
+        self._color_lines = {}
+        self._dirty_colors = set()
 
-    def add(self, line_no, key):
-        if line_no in self._buffer_regions:
-            self._buffer_regions[line_no].append(key)
-        else:
-            self._buffer_regions[line_no] = [key]
+    def set_line_colors(self, line_no, line_color_map):
+        old_color_map = self._line_colors.get(line_no, {})
+        if old_color_map == line_color_map:
+            return
 
-    def get_line(self, line_no):
-        if line_no in self._buffer_regions:
-            return self._buffer_regions[line_no]
-        return None
+        self.delete_line(line_no)
+        if line_color_map:
+            self._line_colors[line_no] = line_color_map
+            self._index_line(line_no)
+            self.mark_line_dirty(line_no)
+
+    def get_line_colors(self, line_no):
+        if line_no in self._line_colors:
+            return self._line_colors[line_no]
+        return {}
 
     def delete_line(self, line_no):
-        if line_no in self._buffer_regions:
-            del self._buffer_regions[line_no]
+        if line_no in self._line_colors:
+            self.mark_line_dirty(line_no)
+            self._unindex_line(line_no)
+            del self._line_colors[line_no]
 
-    def has_line(self, line_no):
-        return line_no in self._buffer_regions
+    def delete_lines_from(self, line_no):
+        """
+        Delete the colors of all lines from line_no on, they are marked dirty
+        so their regions are removed from the view
+        """
+        for i in [i for i in self._line_colors if i >= line_no]:
+            self.delete_line(i)
+
+    def mark_line_dirty(self, line_no):
+        """
+        Mark the colors on a line dirty, e.g. because the text under them was
+        replaced and the regions in the view may have moved.
+        """
+        for field in self.get_line_colors(line_no).values():
+            self._dirty_colors.add(field["color"])
+
+    def pop_dirty_colors(self):
+        """
+        Get the dirty colors and clear them. Returns a dict mapping each color
+        to a sorted list of (line_no, idx, field_length) tuples of all the
+        fields with that color.
+        """
+        dirty_colors = {}
+        for color in self._dirty_colors:
+            fields = []
+            for line_no in sorted(self._color_lines.get(color, ())):
+                for idx, field in sorted(self._line_colors[line_no].items()):
+                    if field["color"] == color:
+                        fields.append((line_no, idx, field["field_length"]))
+            dirty_colors[color] = fields
+
+        self._dirty_colors = set()
+        return dirty_colors
+
+    def scroll_lines(self, top, bottom, count):
+        """
+        Move lines top to bottom (inclusive) up by count lines, or down if
+        count is negative. Lines scrolled in have no colors and the colors of
+        lines scrolled out are marked dirty.
+        """
+        lines = [line_no for line_no in range(top, bottom + 1) if line_no in self._line_colors]
+        for line_no in lines:
+            # Colors of the lines scrolled out have to be removed from the view
+            if not top <= line_no - count <= bottom:
+                self.mark_line_dirty(line_no)
+            self._unindex_line(line_no)
+
+        _scroll_dict(self._line_colors, top, bottom, count)
+        for line_no in range(top, bottom + 1):
+            if line_no in self._line_colors:
+                self._index_line(line_no)
+
+    def _index_line(self, line_no):
+        for field in self._line_colors[line_no].values():
+            color = field["color"]
+            if color not in self._color_lines:
+                self._color_lines[color] = set()
+            self._color_lines[color].add(line_no)
+
+    def _unindex_line(self, line_no):
+        for field in self._line_colors[line_no].values():
+            lines = self._color_lines.get(field["color"])
+            if lines is not None:
+                lines.discard(line_no)
+                if not lines:
+                    del self._color_lines[field["color"]]
+
+
+def _scroll_dict(lines, top, bottom, count, blank=None):
+    """
+    Scroll the values of a dict keyed by line number. Lines scrolled in get the
+    blank value, lines without a value are left out.
+    """
+    values = [lines.pop(line_no, None) for line_no in range(top, bottom + 1)]
+    if count > 0:
+        values = values[count:] + [blank] * count
+    else:
+        values = [blank] * -count + values[:count]
+
+    for line_no, value in zip(range(top, bottom + 1), values):
+        if value is not None:
+            lines[line_no] = value
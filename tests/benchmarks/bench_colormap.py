@@ -0,0 +1,78 @@
+"""
+Benchmark of the color map generation on recorded terminal output, comparing
+the attribute runs kept by the screen with scanning the buffer
+"""
+import sys
+import time
+from os.path import dirname, join, abspath
+
+
+def from_here(*parts):
+    return abspath(join(HERE, *parts))
+
+
+HERE = dirname(__file__)
+sys.path += [
+    from_here('..', '..', '..'),
+]
+
+from TerminalView import pyte_terminal_emulator  # noqa: E402
+
+
+def load_corpus(name="shell_session.raw"):
+    with open(from_here("corpus", name), "rb") as f:
+        return f.read()
+
+
+def buffer_scan(emulator, lines):
+    return pyte_terminal_emulator.convert_pyte_buffer_to_colormap(emulator._screen.buffer, lines)
+
+
+def attribute_runs(emulator, lines):
+    return emulator.color_map(lines)
+
+
+def bench(color_map, data, rounds, all_lines, chunk_size=4096):
+    """
+    Feed the data a chunk per frame like the plugin does and time only the
+    color map generation of each frame
+    """
+    best = None
+    for _ in range(rounds):
+        emulator = pyte_terminal_emulator.PyteTerminalEmulator(120, 40, 1000, 0.5)
+        t = 0.
+        for i in range(0, len(data), chunk_size):
+            emulator.feed(data[i:i + chunk_size])
+            lines = range(40) if all_lines else list(emulator.dirty_lines())
+            start = time.time()
+            color_map(emulator, lines)
+            t += time.time() - start
+            emulator.clear_dirty()
+        best = t if best is None else min(best, t)
+    return best
+
+
+def check(data, chunk_size=4096):
+    emulator = pyte_terminal_emulator.PyteTerminalEmulator(120, 40, 1000, 0.5)
+    for i in range(0, len(data), chunk_size):
+        emulator.feed(data[i:i + chunk_size])
+        if buffer_scan(emulator, range(40)) != attribute_runs(emulator, range(40)):
+            raise AssertionError("color maps differ after %u bytes" % (i + chunk_size, ))
+
+
+def main():
+    repeat = 20
+    rounds = 5
+    data = load_corpus() * repeat
+    print("Corpus: %.2f MB" % (len(data) / (1024. * 1024.), ))
+    check(data)
+
+    for name, all_lines in (("dirty lines", False), ("whole screen", True)):
+        t_scan = bench(buffer_scan, data, rounds, all_lines)
+        t_runs = bench(attribute_runs, data, rounds, all_lines)
+        print("%-12s buffer scan: %7.3f s  attribute runs: %7.3f s  speedup: %.2fx" %
+              (name, t_scan, t_runs, t_scan / t_runs))
+
+
+if __name__ == '__main__':
+    main()
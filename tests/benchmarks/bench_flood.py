@@ -0,0 +1,138 @@
+"""
+Benchmark of a flood of shell output through the stack: PTY, I/O hub, output
+ring, parser thread, terminal emulator and rendering frames into a stubbed view
+on a separate UI thread. Times `seq 1 <count>` (1000000 by default) with a
+fast view and with a view that takes 100 ms per update, reporting when the
+shell finished writing and when all of its output was parsed.
+"""
+import os
+import queue
+import sys
+import threading
+import time
+from os.path import dirname, join, abspath
+
+
+def from_here(*parts):
+    return abspath(join(HERE, *parts))
+
+
+HERE = dirname(__file__)
+sys.path += [
+    from_here('..', '..', '..'),
+    from_here('..', 'stubs'),
+]
+
+import sublime  # noqa: E402
+
+from TerminalView import TerminalView  # noqa: E402
+from TerminalView import linux_pty  # noqa: E402
+from TerminalView import sublime_terminal_buffer  # noqa: E402
+
+
+class UIThread():
+    """
+    Runs the functions passed to sublime.set_timeout, like the ST3 main thread
+    """
+    def __init__(self):
+        self._queue = queue.Queue()
+        threading.Thread(target=self._loop, daemon=True).start()
+        sublime.set_timeout = lambda f, timeout_ms=0: self._queue.put(f)
+
+    def _loop(self):
+        while True:
+            self._queue.get()()
+
+
+class BenchBuffer(sublime_terminal_buffer.SublimeTerminalBuffer):
+    """
+    Terminal buffer rendering into a stubbed view with the same steps as the
+    update command
+    """
+    def __init__(self, render_delay, term_emulator=None):
+        view = sublime.SublimeViewStub(1)
+        super().__init__(view, "bench", None, term_emulator)
+        self._update = sublime_terminal_buffer.TerminalViewUpdate(view)
+        self._update._sub_buffer = self
+        self._render_delay = render_delay
+        self.frames = 0
+
+    def _render_frame(self):
+        frame = self.pop_frame()
+        if frame is None:
+            return
+
+        self._update._scroll_lines(None, frame.scrolls)
+        if frame.truncate is not None:
+            self._update._truncate_lines(None, frame.truncate)
+        self._update._update_lines(None, frame.lines, frame.colors, frame.spans)
+        time.sleep(self._render_delay)
+        self.frames += 1
+
+    def view_size(self):
+        return (40, 120)
+
+    def is_open(self):
+        return True
+
+    def last_line(self):
+        lines = self._view.get_text().split("\n")
+        return [line.strip() for line in lines if line.strip()][-1]
+
+
+class BenchTerminalView(TerminalView.TerminalView):
+    def __init__(self, cmd, render_delay):
+        self._shell = linux_pty.LinuxPty(cmd, os.getcwd())
+        self._terminal_buffer = BenchBuffer(render_delay)
+        self._view_closed = False
+        self._terminal_rows = 0
+        self._terminal_columns = 0
+        self._start_time = time.time()
+        self.shell_time = None
+        self.run_time = None
+        self._start_output_pipeline()
+
+    def on_readable(self):
+        reading = super().on_readable()
+        if self._shell.output_closed() and self.shell_time is None:
+            self.shell_time = time.time() - self._start_time
+        return reading
+
+    def _show_close_message_in_terminal(self, run_time):
+        self.run_time = run_time
+
+    def _stop(self):
+        self._shell.stop()
+
+
+def bench(count, render_delay):
+    terminal_view = BenchTerminalView(["/usr/bin/env", "seq", "1", str(count)], render_delay)
+    while terminal_view.run_time is None:
+        time.sleep(0.01)
+
+    # Wait for the last frame to be rendered
+    while terminal_view._terminal_buffer._pending_frame is not None:
+        time.sleep(0.01)
+    time.sleep(render_delay + 0.1)
+
+    last_line = terminal_view._terminal_buffer.last_line()
+    if last_line != str(count):
+        raise AssertionError("Last line is %r" % (last_line, ))
+    return (terminal_view.shell_time, terminal_view.run_time,
+            terminal_view._terminal_buffer.frames,
+            terminal_view._terminal_buffer.frame_stats()["dropped"],
+            terminal_view._output_ring.stats())
+
+
+def main():
+    UIThread()
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    for name, render_delay in (("fast view", 0.0), ("slow view", 0.1)):
+        shell_time, run_time, frames, dropped, stats = bench(count, render_delay)
+        print("%-9s seq 1 %u: shell done %6.3f s  parsed %7.3f s  %4u frames rendered  "
+              "%4u dropped  max ring depth %.1f MB" %
+              (name, count, shell_time, run_time, frames, dropped, stats["max_depth"] / 2.**20))
+
+
+if __name__ == '__main__':
+    main()
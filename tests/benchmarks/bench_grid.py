@@ -0,0 +1,76 @@
+"""
+Benchmark of the screen grid: feeds recorded terminal output to the plugin's
+history screen with lines kept as lists of Char tuples and as compact lines,
+reporting the time taken and the memory used by the screen and its history
+"""
+import sys
+import time
+import tracemalloc
+from os.path import dirname, join, abspath
+
+
+def from_here(*parts):
+    return abspath(join(HERE, *parts))
+
+
+HERE = dirname(__file__)
+sys.path += [
+    from_here('..', '..', '..'),
+]
+
+from TerminalView import pyte  # noqa: E402
+from TerminalView import pyte_terminal_emulator  # noqa: E402
+
+
+def load_corpus(name="shell_session.raw"):
+    with open(from_here("corpus", name), "rb") as f:
+        return f.read()
+
+
+class ListScreen(pyte_terminal_emulator.CustomHistoryScreen):
+    compact = False
+
+
+def feed_chunks(stream, data, chunk_size=4096):
+    for i in range(0, len(data), chunk_size):
+        stream.feed(data[i:i + chunk_size])
+
+
+def bench(screen_cls, data, history):
+    screen = screen_cls(120, 40, history, 0.5)
+    stream = pyte.VT500ByteStream()
+    stream.attach(screen)
+    start = time.time()
+    feed_chunks(stream, data)
+    feed_time = time.time() - start
+
+    # Measure the memory of a filled screen built from scratch
+    del screen, stream
+    tracemalloc.start()
+    screen = screen_cls(120, 40, history, 0.5)
+    stream = pyte.VT500ByteStream()
+    stream.attach(screen)
+    feed_chunks(stream, data)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    lines = len(screen.history.top) + screen.lines
+    return feed_time, memory, lines
+
+
+def main():
+    history = 10000
+    data = load_corpus()
+    while data.count(b"\n") < 2 * history:
+        data += data
+    size_mb = len(data) / (1024. * 1024.)
+    print("Corpus: %.2f MB, history %u lines" % (size_mb, history))
+
+    for name, screen_cls in (("list", ListScreen),
+                             ("compact", pyte_terminal_emulator.CustomHistoryScreen)):
+        feed_time, memory, lines = bench(screen_cls, data, history)
+        print("%-8s feed: %7.3f s (%6.2f MB/s)  memory: %6.1f MB (%5.0f bytes per line)" %
+              (name, feed_time, size_mb / feed_time, memory / 2.**20, memory / float(lines)))
+
+
+if __name__ == '__main__':
+    main()
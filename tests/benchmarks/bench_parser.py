@@ -0,0 +1,78 @@
+"""
+Benchmark of the pyte stream parsers on recorded terminal output
+"""
+import sys
+import time
+from os.path import dirname, join, abspath
+
+
+def from_here(*parts):
+    return abspath(join(HERE, *parts))
+
+
+HERE = dirname(__file__)
+sys.path += [
+    from_here('..', '..', '..'),
+]
+
+from TerminalView import pyte  # noqa: E402
+from TerminalView.pyte import streams  # noqa: E402
+
+
+def load_corpus(name="shell_session.raw"):
+    with open(from_here("corpus", name), "rb") as f:
+        return f.read()
+
+
+class NullListener(object):
+    """
+    Listener that accepts every event and does nothing, so only the parser
+    is measured
+    """
+    __before__ = __after__ = staticmethod(streams.noop)
+
+    def __getattr__(self, event):
+        return self._noop
+
+    def _noop(self, *args, **kwargs):
+        pass
+
+
+def feed_chunks(stream, data, chunk_size=4096):
+    for i in range(0, len(data), chunk_size):
+        stream.feed(data[i:i + chunk_size])
+
+
+def bench(stream_cls, listener, data, rounds):
+    best = None
+    for _ in range(rounds):
+        stream = stream_cls()
+        stream.attach(listener())
+        start = time.time()
+        feed_chunks(stream, data)
+        t = time.time() - start
+        best = t if best is None else min(best, t)
+    return best
+
+
+def main():
+    repeat = 20
+    rounds = 5
+    data = load_corpus() * repeat
+    size_mb = len(data) / (1024. * 1024.)
+    print("Corpus: %.2f MB" % (size_mb, ))
+
+    listeners = [
+        ("parser only", NullListener),
+        ("parser + screen", lambda: pyte.DiffScreen(120, 40)),
+    ]
+    for name, listener in listeners:
+        t_gen = bench(pyte.ByteStream, listener, data, rounds)
+        t_table = bench(pyte.VT500ByteStream, listener, data, rounds)
+        print("%-16s generator: %7.3f s (%6.2f MB/s)  vt500 table: %7.3f s (%6.2f MB/s)  "
+              "speedup: %.2fx" %
+              (name, t_gen, size_mb / t_gen, t_table, size_mb / t_table, t_gen / t_table))
+
+
+if __name__ == '__main__':
+    main()
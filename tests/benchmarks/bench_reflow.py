@@ -0,0 +1,57 @@
+"""
+Benchmark of resizing the terminal columns: feeds lines of varying length to
+the terminal emulator, then switches between widths as when a split pane is
+dragged, reporting the time per resize and for the first page scrolled back
+into the reflowed history, for a short and a long history
+"""
+import sys
+import time
+from os.path import dirname, join, abspath
+
+
+def from_here(*parts):
+    return abspath(join(HERE, *parts))
+
+
+HERE = dirname(__file__)
+sys.path += [
+    from_here('..', '..', '..'),
+]
+
+from TerminalView import pyte_terminal_emulator  # noqa: E402
+
+
+def output(nb_lines):
+    for i in range(0, nb_lines, 1000):
+        yield "".join("\x1b[3%umline %u " % (j % 8, j) + "x" * (j % 200) + "\r\n"
+                      for j in range(i, i + 1000)).encode()
+
+
+def bench(nb_lines, widths=(80, 100, 120) * 5):
+    emulator = pyte_terminal_emulator.PyteTerminalEmulator(120, 40, 0, 0.5)
+    for data in output(nb_lines):
+        emulator.feed(data)
+    emulator.take_frame()
+
+    start = time.time()
+    for columns in widths:
+        emulator.resize(40, columns)
+        emulator.take_frame()
+    resize_time = (time.time() - start) / len(widths)
+
+    start = time.time()
+    emulator.prev_page()
+    emulator.take_frame()
+    page_time = time.time() - start
+    return resize_time, page_time
+
+
+def main():
+    for nb_lines in (1000, 100000):
+        resize_time, page_time = bench(nb_lines)
+        print("%6u lines of history: resize %6.2f ms, first page up after it %6.2f ms" %
+              (nb_lines, 1000. * resize_time, 1000. * page_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Benchmark of the frame scheduling, comparing the I/O hub with the fixed 30
+frames per second loop every terminal view used to run. Measures the latency
+from shell output (like the echo of a keypress) until it is rendered and the
+number of wake ups per second while the shells are idle, with 1 and with 20
+terminals.
+"""
+import os
+import select
+import sys
+import threading
+import time
+from os.path import dirname, join, abspath
+
+
+def from_here(*parts):
+    return abspath(join(HERE, *parts))
+
+
+HERE = dirname(__file__)
+sys.path += [
+    from_here('..', '..', '..'),
+    from_here('..', 'stubs'),
+]
+
+from TerminalView import io_hub  # noqa: E402
+
+
+class Wakeups():
+    count = 0
+
+
+class PipeClient():
+    """
+    Client reading from a pipe, records the time each frame is rendered
+    """
+    def __init__(self, wakeups):
+        self.read_fd, self.write_fd = os.pipe()
+        self.frame_times = []
+        self.wakeups = wakeups
+
+    def fileno(self):
+        return self.read_fd
+
+    def poll(self):
+        (ready, _, _) = select.select([self.read_fd], [], [], 0)
+        if ready:
+            os.read(self.read_fd, 4096)
+            return True
+        return False
+
+    def on_readable(self):
+        os.read(self.read_fd, 4096)
+        return True
+
+    def on_frame(self):
+        self.frame_times.append(time.time())
+
+    def on_tick(self):
+        return True
+
+    def close(self):
+        os.close(self.read_fd)
+        os.close(self.write_fd)
+
+
+class FixedLoop():
+    """
+    The loop every terminal view used to run: poll, render and sleep for the
+    rest of the 1/30 s frame
+    """
+    def __init__(self, client):
+        self._client = client
+        self._running = True
+        self._thread = threading.Thread(target=self._loop)
+        self._thread.start()
+
+    def _loop(self):
+        ideal_delta = 1.0 / 30.0
+        current = time.time()
+        while self._running:
+            self._client.wakeups.count += 1
+            if self._client.poll():
+                self._client.on_frame()
+            previous = current
+            current = time.time()
+            time_left = ideal_delta - (current - previous)
+            if time_left > 0.0:
+                time.sleep(time_left)
+
+    def stop(self):
+        self._running = False
+        self._thread.join()
+
+
+class HubLoop():
+    """
+    One I/O hub shared by all clients, like all terminal views share it
+    """
+    hub = None
+
+    def __init__(self, client):
+        self._client = client
+        if HubLoop.hub is None:
+            HubLoop.hub = io_hub.IOHub()
+            apply_changes = HubLoop.hub._apply_changes
+
+            def count_wakeups():
+                client.wakeups.count += 1
+                return apply_changes()
+            HubLoop.hub._apply_changes = count_wakeups
+        HubLoop.hub.register(client)
+
+    def stop(self):
+        hub = HubLoop.hub
+        hub.unregister(self._client)
+        if not any(state.client is not self._client for state in hub._clients):
+            while hub._thread is not None:
+                time.sleep(0.01)
+            HubLoop.hub = None
+
+
+def bench(loop_class, terminals=1, keypresses=50, idle_time=2.0):
+    wakeups = Wakeups()
+    clients = [PipeClient(wakeups) for _ in range(terminals)]
+    # Terminals are opened one after the other
+    loops = []
+    for client in clients:
+        loops.append(loop_class(client))
+        time.sleep(0.02)
+    client = clients[0]
+    time.sleep(0.1)
+
+    # Latency of a keypress echo, sent at random points in the frame
+    latencies = []
+    for i in range(keypresses):
+        time.sleep(0.05 + (i % 7) * 0.003)
+        nb_frames = len(client.frame_times)
+        start = time.time()
+        os.write(client.write_fd, b"x")
+        while len(client.frame_times) == nb_frames:
+            time.sleep(0.0002)
+        latencies.append(client.frame_times[-1] - start)
+
+    # Wake ups while nothing happens
+    time.sleep(0.1)
+    start = wakeups.count
+    time.sleep(idle_time)
+    idle_wakeups = (wakeups.count - start) / idle_time
+
+    for loop in loops:
+        loop.stop()
+    for client in clients:
+        client.close()
+    latencies.sort()
+    return (sum(latencies) / len(latencies), latencies[int(len(latencies) * 0.95)], idle_wakeups)
+
+
+def main():
+    for terminals in (1, 20):
+        for name, loop_class in (("fixed 30 fps", FixedLoop), ("I/O hub", HubLoop)):
+            mean, p95, idle_wakeups = bench(loop_class, terminals)
+            print("%-12s %2u terminals  latency mean: %6.2f ms  p95: %6.2f ms  "
+                  "idle wake ups: %6.1f /s" %
+                  (name, terminals, mean * 1000., p95 * 1000., idle_wakeups))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark of the scrollback history: feeds colored lines to the terminal
+emulator until the history is full, then pages up through all of it and jumps
+back to the bottom, reporting the time taken, the memory used by the history
+and the size of the history spilled to disk
+"""
+import sys
+import time
+import tracemalloc
+from os.path import dirname, join, abspath
+
+
+def from_here(*parts):
+    return abspath(join(HERE, *parts))
+
+
+HERE = dirname(__file__)
+sys.path += [
+    from_here('..', '..', '..'),
+]
+
+from TerminalView import pyte_terminal_emulator  # noqa: E402
+
+
+def output(nb_lines):
+    for i in range(0, nb_lines, 1000):
+        yield "".join("\x1b[01;3%um%08u\x1b[0m  src/module_%u.py:%u: "
+                      "warning: unused variable 'x'\r\n" %
+                      (j % 8, j, j % 97, j) for j in range(i, i + 1000)).encode()
+
+
+def bench(nb_lines, history_mb, spill):
+    tracemalloc.start()
+    emulator = pyte_terminal_emulator.PyteTerminalEmulator(120, 40, nb_lines, 0.5,
+                                                           history_mb=history_mb,
+                                                           history_spill=spill)
+    start = time.time()
+    for data in output(nb_lines):
+        emulator.feed(data)
+    feed_time = time.time() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    screen = emulator._screen
+    kept = len(screen.history.top)
+    spilled = screen.history.top.stats()["spilled_bytes"]
+    start = time.time()
+    pages = 0
+    while screen.viewport < len(screen.history.top):
+        emulator.prev_page()
+        # Render each page like the plugin does
+        emulator.take_frame()
+        pages += 1
+    page_time = time.time() - start
+    oldest = emulator.display()[0].strip()
+    start = time.time()
+    emulator.feed(b"")
+    emulator.take_frame()
+    jump_time = time.time() - start
+    emulator.close()
+    return feed_time, memory, kept, spilled, pages, page_time, jump_time, oldest
+
+
+def main():
+    nb_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for history_mb, spill in ((0.5, False), (16, False), (0.5, True)):
+        feed_time, memory, kept, spilled, pages, page_time, jump_time, oldest = \
+            bench(nb_lines, history_mb, spill)
+        print("%4.1f MB budget%-6s %u lines: feed %6.2f s  memory %5.1f MB  spilled %5.1f MB  "
+              "%6u lines kept  %4u pages up in %5.2f s (%.2f ms per page), "
+              "back to bottom in %.2f ms, oldest line %s" %
+              (history_mb, " spill" if spill else "", nb_lines, feed_time, memory / 2.**20,
+               spilled / 2.**20, kept, pages, page_time, 1000. * page_time / max(pages, 1),
+               1000. * jump_time, oldest[:8]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark of searching the terminal history: feeds compiler-like output to the
+terminal emulator, then types queries one character at a time like the search
+panel does, reporting the time per keystroke, per jump to the previous match
+and of scanning the whole history without the index
+"""
+import sys
+import time
+from os.path import dirname, join, abspath
+
+
+def from_here(*parts):
+    return abspath(join(HERE, *parts))
+
+
+HERE = dirname(__file__)
+sys.path += [
+    from_here('..', '..', '..'),
+]
+
+from TerminalView import history_search  # noqa: E402
+from TerminalView import pyte_terminal_emulator  # noqa: E402
+from TerminalView.pyte.screens import CompactLine  # noqa: E402
+
+
+def output(nb_lines):
+    for i in range(0, nb_lines, 1000):
+        yield "".join("\x1b[01;3%um%08u\x1b[0m  src/module_%u.py:%u: "
+                      "warning: unused variable 'x'\r\n" %
+                      (j % 8, j, j % 97, j) for j in range(i, i + 1000)).encode()
+
+
+def full_scan(screen, pattern):
+    history = screen.history.top
+    return sum(1 for i in range(len(history))
+               if pattern.search(CompactLine.frozen_text(history[i])))
+
+
+def bench(nb_lines, query, regex):
+    emulator = pyte_terminal_emulator.PyteTerminalEmulator(120, 40, 0, 0.5, history_mb=64)
+    start = time.time()
+    for data in output(nb_lines):
+        emulator.feed(data)
+    feed_time = time.time() - start
+
+    start = time.time()
+    for end in range(1, len(query) + 1):
+        emulator.search(query[:end], regex)
+        emulator.take_frame()
+    type_time = (time.time() - start) / len(query)
+
+    start = time.time()
+    jumps = 0
+    while jumps < 20 and emulator.search_prev():
+        emulator.take_frame()
+        jumps += 1
+    jump_time = (time.time() - start) / max(jumps, 1)
+
+    pattern, _ = history_search.compile_query(query, regex)
+    start = time.time()
+    full_scan(emulator._screen, pattern)
+    scan_time = time.time() - start
+    emulator.close()
+    return feed_time, type_time, jumps, jump_time, scan_time
+
+
+def main():
+    nb_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for query, regex in (("%08u" % (nb_lines // 7), False), ("module_42.py", False),
+                         (r"module_\d+\.py:12\d{3}:", True)):
+        feed_time, type_time, jumps, jump_time, scan_time = bench(nb_lines, query, regex)
+        print("%-26s %u lines: feed %5.2f s  %7.2f ms per keystroke  %2u jumps back "
+              "%7.2f ms each  full scan %7.2f ms" %
+              (query, nb_lines, feed_time, 1000. * type_time, jumps, 1000. * jump_time,
+               1000. * scan_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark of the latency of the editor thread while four terminals run `yes`,
+with the terminals parsing their output in the plugin host and with each of
+them running in a worker process. A probe schedules a callback on the stubbed
+UI thread every 10 ms, like a keypress would, and measures how long it waits
+to run. Needs Python 3.8 for the worker processes.
+"""
+import os
+import sys
+import threading
+import time
+from os.path import dirname, join, abspath
+
+
+def from_here(*parts):
+    return abspath(join(HERE, *parts))
+
+
+HERE = dirname(__file__)
+sys.path += [
+    from_here('..', '..', '..'),
+    from_here('..', 'stubs'),
+]
+
+import sublime  # noqa: E402
+
+from TerminalView import TerminalView  # noqa: E402
+from TerminalView import emulator_worker  # noqa: E402
+from TerminalView import linux_pty  # noqa: E402
+
+from bench_flood import BenchBuffer, UIThread  # noqa: E402
+
+
+OPTIONS = {
+    "history": 1000,
+    "history_mb": 16,
+    "history_spill": False,
+    "ratio": 0.5,
+    "parser": "vt500",
+    "colors": True,
+    "max_fps": 30,
+    "debug": False,
+}
+
+
+class LatencyProbe():
+    """
+    Schedules a callback on the UI thread every interval and records how long
+    each one waited to run
+    """
+    def __init__(self, interval=0.01):
+        self.latencies = []
+        self._interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            scheduled = time.time()
+            sublime.set_timeout(lambda: self.latencies.append(time.time() - scheduled), 0)
+            time.sleep(self._interval)
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+
+class BenchTerminalView(TerminalView.TerminalView):
+    def __init__(self, cmd, worker):
+        term_emulator = None
+        if worker:
+            self._shell = emulator_worker.EmulatorWorker(cmd, os.getcwd(), OPTIONS)
+            term_emulator = self._shell
+        else:
+            self._shell = linux_pty.LinuxPty(cmd, os.getcwd())
+        self._terminal_buffer = BenchBuffer(0.0, term_emulator)
+        self._view_closed = False
+        self._terminal_rows = 0
+        self._terminal_columns = 0
+        self._start_time = time.time()
+        self.run_time = None
+        self._start_output_pipeline()
+
+    def _show_close_message_in_terminal(self, run_time):
+        self.run_time = run_time
+
+    def _stop(self):
+        self._shell.stop()
+
+
+def bench(worker, nb_terminals, duration):
+    terminal_views = [BenchTerminalView(["/usr/bin/env", "yes"], worker)
+                      for _ in range(nb_terminals)]
+    time.sleep(0.5)
+
+    cpu_start = time.process_time()
+    probe = LatencyProbe()
+    time.sleep(duration)
+    probe.stop()
+    cpu = time.process_time() - cpu_start
+
+    for terminal_view in terminal_views:
+        terminal_view.view_closed()
+    while any(terminal_view.run_time is None for terminal_view in terminal_views):
+        time.sleep(0.01)
+
+    for terminal_view in terminal_views:
+        if terminal_view._terminal_buffer.last_line() != "y":
+            raise AssertionError("Last line is %r" % (terminal_view._terminal_buffer.last_line(), ))
+
+    latencies = sorted(probe.latencies)
+    frames = sum(terminal_view._terminal_buffer.frames for terminal_view in terminal_views)
+    return latencies, frames / duration, cpu / duration
+
+
+def main():
+    if not emulator_worker.available():
+        print("Worker processes need Python 3.8 or newer")
+        return
+
+    UIThread()
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    for name, worker in (("in process", False), ("worker", True)):
+        latencies, fps, cpu = bench(worker, 4, duration)
+        mean = sum(latencies) / len(latencies)
+        p99 = latencies[int(len(latencies) * 0.99)]
+        print("%-10s 4x yes: UI latency mean %6.2f ms  p99 %6.2f ms  max %6.2f ms  "
+              "%5.1f frames/s rendered  plugin CPU %3.0f%%" %
+              (name, mean * 1000, p99 * 1000, latencies[-1] * 1000, fps, cpu * 100))
+
+
+if __name__ == '__main__':
+    main()
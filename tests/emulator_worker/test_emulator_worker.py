@@ -0,0 +1,192 @@
+"""
+Unittests for running a terminal in a worker process
+"""
+import os
+import pickle
+import select
+import shutil
+import signal
+import sys
+import time
+import unittest
+
+# Module to test
+from TerminalView import emulator_worker
+
+
+OPTIONS = {
+    "history": 100,
+    "history_mb": 1,
+    "history_spill": True,
+    "ratio": 0.5,
+    "parser": "vt500",
+    "colors": True,
+    "max_fps": 100,
+    "debug": False,
+}
+
+
+@unittest.skipUnless(emulator_worker.available(), "needs multiprocessing.shared_memory")
+class screen_grid(unittest.TestCase):
+    def test_attach(self):
+        grid = emulator_worker.ScreenGrid.create(3, 5)
+        self.addCleanup(grid.unlink)
+        self.addCleanup(grid.close)
+        other = emulator_worker.ScreenGrid.attach(grid.name(), 3, 5)
+        self.addCleanup(other.close)
+
+        grid.write_line(0, "abcde")
+        grid.write_line(2, "中文é")
+        grid.write_line(1, "toolong")
+        self.assertEqual(other.read_line(0), "abcde")
+        self.assertEqual(other.read_line(1), "toolo")
+        self.assertEqual(other.read_line(2), "中文é")
+
+    def test_colors(self):
+        grid = emulator_worker.ScreenGrid.create(2, 5)
+        self.addCleanup(grid.unlink)
+        self.addCleanup(grid.close)
+        other = emulator_worker.ScreenGrid.attach(grid.name(), 2, 5)
+        self.addCleanup(other.close)
+
+        red = {0: {"color": ("black", "red"), "field_length": 2},
+               3: {"color": ("blue", "white"), "field_length": 2}}
+        grid.write_line(0, "ab de", red)
+        grid.write_line(1, "plain")
+        other.add_colors(grid.take_new_colors())
+        self.assertEqual(other.read_colors(0), red)
+        self.assertEqual(other.read_colors(1), {})
+
+        # Known colors are not sent again, the table carries over to a new
+        # grid
+        grid.write_line(1, "x", {4: {"color": ("black", "red"), "field_length": 1}})
+        self.assertEqual(grid.take_new_colors(), [])
+        bigger = emulator_worker.ScreenGrid.create(3, 8, grid.colors())
+        self.addCleanup(bigger.unlink)
+        self.addCleanup(bigger.close)
+        bigger.write_line(2, "abc", {1: {"color": ("blue", "white"), "field_length": 2}})
+        self.assertEqual(bigger.take_new_colors(), [])
+        attached = emulator_worker.ScreenGrid.attach(bigger.name(), 3, 8, other.colors())
+        self.addCleanup(attached.close)
+        self.assertEqual(attached.read_colors(2), {1: {"color": ("blue", "white"),
+                                                       "field_length": 2}})
+
+
+class MeasuredConnection():
+    """
+    Pipe of a worker that keeps the size of every message received on it
+    """
+    def __init__(self, conn):
+        self._conn = conn
+        self.sizes = []
+
+    def recv(self):
+        data = self._conn.recv_bytes()
+        self.sizes.append(len(data))
+        return pickle.loads(data)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+@unittest.skipUnless(emulator_worker.available(), "needs multiprocessing.shared_memory")
+class worker_process(unittest.TestCase):
+    def _run(self, *cmd):
+        cwd = os.path.dirname(os.path.abspath(__file__))
+        worker = emulator_worker.EmulatorWorker(["/usr/bin/env"] + list(cmd), cwd, OPTIONS)
+        self.addCleanup(worker.stop)
+        return worker
+
+    def _receive(self, worker, until):
+        end = time.time() + 10
+        while not until() and time.time() < end:
+            select.select([worker.fileno()], [], [], 0.1)
+            worker.receive_frames()
+        self.assertTrue(until())
+
+    def _screen(self, worker, screen):
+        if worker.modified():
+            screen.update(worker.take_frame().lines)
+        return screen
+
+    def test_shell_output(self):
+        worker = self._run("printf", "\\033[31mred\\033[0m\\r\\nline 2")
+        self._receive(worker, worker.output_closed)
+        self.assertFalse(worker.is_running())
+        self.assertEqual(worker.exit_status(), (0, 0))
+
+        frame = worker.take_frame()
+        self.assertEqual(len(frame.lines), 24)
+        self.assertEqual(frame.lines[0].rstrip(), "red")
+        self.assertEqual(frame.lines[1].rstrip(), "line 2")
+        self.assertEqual(frame.colors[0][0]["color"], ("black", "red"))
+        self.assertEqual(frame.cursor, (1, 6))
+        self.assertFalse(worker.modified())
+
+        # Output fed after the shell exited is shown right away
+        worker.feed(b"\r\nclosed")
+        frame = worker.take_frame()
+        self.assertEqual(frame.lines[2].rstrip(), "closed")
+
+    def test_bare_python_name(self):
+        # Spawn does not search the PATH for the interpreter
+        python = os.path.basename(sys.executable)
+        if shutil.which(python) is None:
+            self.skipTest("%s is not on the PATH" % (python, ))
+        cwd = os.path.dirname(os.path.abspath(__file__))
+        worker = emulator_worker.EmulatorWorker(["/usr/bin/env", "printf", "hi"], cwd,
+                                                OPTIONS, python)
+        self.addCleanup(worker.stop)
+        self._receive(worker, worker.output_closed)
+        self.assertEqual(worker.exit_status(), (0, 0))
+        self.assertEqual(worker.take_frame().lines[0].rstrip(), "hi")
+
+        with self.assertRaises(ValueError):
+            emulator_worker.EmulatorWorker(["/usr/bin/env", "true"], cwd, OPTIONS,
+                                           "no-such-python")
+
+    def test_dead_worker_exit_status(self):
+        worker = self._run("cat")
+        worker._process.kill()
+        self._receive(worker, worker.output_closed)
+        worker._process.join()
+        self.assertEqual(worker.exit_status(), (0, signal.SIGKILL))
+
+    def test_colors_go_through_the_grid(self):
+        sizes = []
+        for colors in (False, True):
+            if colors:
+                row = "".join("\\033[3%umx" % (i % 6 + 1) for i in range(80))
+            else:
+                row = "colorless " * 8
+            worker = self._run("printf", "\\r\\n".join([row] * 23))
+            worker._conn = conn = MeasuredConnection(worker._conn)
+            self._receive(worker, worker.output_closed)
+            frame = worker.take_frame()
+            sizes.append(max(conn.sizes))
+
+        self.assertEqual(frame.lines[22], "x" * 80)
+        self.assertEqual(len(frame.colors[22]), 80)
+        self.assertEqual(frame.colors[22][1], {"color": ("black", "green"), "field_length": 1})
+
+        # Only the 6 colors go through the pipe, not the 1840 colored cells
+        self.assertLess(sizes[1], sizes[0] + 300)
+
+    def test_keypress_and_resize(self):
+        worker = self._run("cat")
+        worker.update_screen_size(5, 20)
+        screen = {}
+        self._receive(worker, lambda: len(self._screen(worker, screen)) == 5)
+
+        # Echoed by the PTY and written back by cat
+        worker.send_keypress("a")
+        worker.send_keypress("enter")
+        self._receive(worker, lambda: self._screen(worker, screen)[1].startswith("a"))
+        self.assertEqual(screen[0].rstrip(), "a")
+        self.assertTrue(worker.is_running())
+
+        worker.update_screen_size(3, 30)
+        self._receive(worker, worker.modified)
+        frame = worker.take_frame()
+        self.assertEqual(frame.truncate, 3)
+        self.assertEqual(len(frame.lines[0]), 30)
@@ -0,0 +1,132 @@
+"""
+Unittests for the indexed search through the terminal history
+"""
+import unittest
+
+from TerminalView import history_search
+from TerminalView import pyte_terminal_emulator
+from TerminalView import scrollback
+
+
+def lines(count):
+    return ["%05u src/module_%u.py: warning" % (i, i % 7) for i in range(count)]
+
+
+class trigram_index(unittest.TestCase):
+    def setUp(self):
+        self.index = history_search.TrigramIndex()
+        for i in range(1000):
+            self.index.add("%06u Warning" % i)
+
+    def test_only_chunks_with_the_literals(self):
+        chunk = history_search.CHUNK_LINES
+        ranges = self.index.candidates(["000300"], 0, 1000)
+        # The chunk holding the line and the lines not indexed yet
+        self.assertIn((chunk, 2 * chunk), ranges)
+        self.assertIn((3 * chunk, 1000), ranges)
+        # Hash collisions may let other chunks in, but hardly for all of the
+        # trigrams of the query
+        self.assertNotIn((2 * chunk, 3 * chunk), ranges)
+
+        ranges = self.index.candidates(["WARNING"], 0, 1000)
+        self.assertEqual(ranges, [(3 * chunk, 1000), (2 * chunk, 3 * chunk),
+                                  (chunk, 2 * chunk), (0, chunk)])
+
+    def test_dropped_and_popped_lines(self):
+        chunk = history_search.CHUNK_LINES
+        self.assertEqual(self.index.candidates(["warning"], chunk + 10, 1000)[-1],
+                         (chunk + 10, 2 * chunk))
+        self.index.truncate(900)
+        self.assertEqual(self.index.candidates(["warning"], 0, 900)[0], (3 * chunk, 900))
+        self.index.truncate(700)
+        self.index.add("new line")
+        self.assertEqual(self.index.candidates(["new line"], 0, 701)[0], (700, 701))
+
+    def test_dropped_chunks_are_pruned_on_add(self):
+        chunk = history_search.CHUNK_LINES
+        self.assertEqual(self.index.memory(), 3 * history_search.BITMAP_BITS // 8)
+        self.index.add("new line", 2 * chunk)
+        self.assertEqual(self.index.memory(), history_search.BITMAP_BITS // 8)
+
+
+class queries(unittest.TestCase):
+    def test_substring(self):
+        pattern, literals = history_search.compile_query("a.b")
+        self.assertEqual(literals, ["a.b"])
+        self.assertTrue(pattern.search("xA.B"))
+        self.assertFalse(pattern.search("axb"))
+
+    def test_regex_literals(self):
+        _, literals = history_search.compile_query(r"error: \w+ in file", regex=True)
+        self.assertEqual(literals, ["error: ", " in file"])
+        _, literals = history_search.compile_query("foo|bar", regex=True)
+        self.assertEqual(literals, [])
+
+    def test_matches_around_a_column(self):
+        pattern, _ = history_search.compile_query("ab")
+        self.assertEqual(history_search.last_match(pattern, "ab ab ab", 6), (3, 5))
+        self.assertEqual(history_search.first_match(pattern, "ab ab ab", 3), (6, 8))
+        self.assertIsNone(history_search.first_match(pattern, "ab ab ab", 6))
+
+
+class line_numbers(unittest.TestCase):
+    def test_numbers_survive_dropped_lines(self):
+        store = scrollback.Scrollback(2**20, max_lines=300)
+        store.extend(str(i).encode() for i in range(1000))
+        self.assertEqual(store.first(), 700)
+        self.assertEqual(store[0], b"700")
+        store.pop()
+        self.assertEqual(store.first() + len(store), 999)
+        store.clear()
+        self.assertEqual(store.first(), 999)
+
+
+class emulator_search(unittest.TestCase):
+    def setUp(self):
+        self.emulator = pyte_terminal_emulator.PyteTerminalEmulator(40, 4, 0, 0.5, history_mb=1)
+        self.emulator.feed("\r\n".join(lines(3000)).encode())
+        self.emulator.clear_dirty()
+
+    def view(self):
+        return [line.rstrip() for line in self.emulator.display()]
+
+    def test_jump_through_matches(self):
+        self.assertTrue(self.emulator.search("module_3"))
+        # The newest match is on the screen
+        self.assertEqual(self.view()[3], "02999 src/module_3.py: warning")
+        self.assertTrue(self.emulator.search_prev())
+        self.assertIn("02992 src/module_3.py: warning", self.view())
+
+        for _ in range(5):
+            self.emulator.search_prev()
+        self.assertIn("02957 src/module_3.py: warning", self.view())
+        self.emulator.search_next()
+        self.assertIn("02964 src/module_3.py: warning", self.view())
+
+    def test_old_lines_and_hits(self):
+        self.assertTrue(self.emulator.search(r"^00012 ", regex=True))
+        self.assertIn("00012 src/module_5.py: warning", self.view())
+        frame = self.emulator.take_frame()
+        row = self.view().index("00012 src/module_5.py: warning")
+        self.assertEqual(frame.hits, [(row, 0, 6)])
+        self.assertFalse(self.emulator.search_prev())
+
+        self.emulator.clear_search()
+        self.assertIsNone(self.emulator.take_frame().hits)
+
+    def test_index_within_history_budget(self):
+        emulator = pyte_terminal_emulator.PyteTerminalEmulator(40, 4, 0, 0.5, history_mb=0.0625)
+        emulator.feed("\r\n".join(lines(20000)).encode())
+        screen = emulator._screen
+        history = screen.history.top
+        self.assertGreater(history.first(), 0)
+        self.assertLessEqual(history.memory(), 0.0625 * 2**20)
+        # The oldest chunk may reach back before the first line
+        index_bytes = len(history) * history_search.INDEX_BYTES_PER_LINE
+        self.assertLessEqual(screen.search_index.memory(),
+                             index_bytes + history_search.BITMAP_BITS // 8)
+
+    def test_no_match(self):
+        self.assertFalse(self.emulator.search("nowhere"))
+        self.assertFalse(self.emulator.search("(", regex=True))
+        self.assertEqual(self.emulator._screen.viewport, 0)
@@ -0,0 +1,239 @@
+"""
+Unittests for the shared I/O hub
+"""
+import os
+import threading
+import time
+import unittest
+
+from TerminalView import io_hub
+
+
+class PipeClient():
+    """
+    Client reading from a pipe, like a terminal view reading from its PTY
+    """
+    def __init__(self):
+        self.read_fd, self.write_fd = os.pipe()
+        self.data = b""
+        self.frames = 0
+        self.ticks = 0
+        self.done = False
+        self.closed = False
+
+    def fileno(self):
+        return self.read_fd
+
+    def on_readable(self):
+        data = os.read(self.read_fd, 4096)
+        self.data += data
+        return len(data) > 0
+
+    def on_frame(self):
+        self.frames += 1
+
+    def on_tick(self):
+        self.ticks += 1
+        return not self.done
+
+    def close(self):
+        for fd in (self.read_fd, self.write_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+def wait_for(condition, timeout=2.0):
+    end = time.time() + timeout
+    while not condition():
+        if time.time() > end:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+class io_hub_clients(unittest.TestCase):
+    def setUp(self):
+        self._hub = io_hub.IOHub(max_fps=100, tick_interval=0.05, idle_interval=1.0)
+        self._clients = []
+
+    def tearDown(self):
+        for client in self._clients:
+            self._hub.unregister(client)
+        self.assertTrue(wait_for(lambda: self._hub._thread is None))
+        for client in self._clients:
+            client.close()
+
+    def _client(self):
+        client = PipeClient()
+        self._clients.append(client)
+        self._hub.register(client)
+        return client
+
+    def test_output_is_read_and_rendered(self):
+        client = self._client()
+        os.write(client.write_fd, b"hello")
+        self.assertTrue(wait_for(lambda: client.data == b"hello"))
+        self.assertTrue(wait_for(lambda: client.frames == 1))
+
+    def test_one_thread_for_all_clients(self):
+        nb_threads = threading.active_count()
+        clients = [self._client() for _ in range(20)]
+        self.assertEqual(threading.active_count(), nb_threads + 1)
+
+        for i, client in enumerate(clients):
+            os.write(client.write_fd, str(i).encode())
+        for i, client in enumerate(clients):
+            self.assertTrue(wait_for(lambda: client.data == str(i).encode()))
+        self.assertEqual(threading.active_count(), nb_threads + 1)
+
+    def test_thread_ends_with_last_client(self):
+        client = self._client()
+        self.assertTrue(wait_for(lambda: client.ticks > 0))
+        self._hub.unregister(client)
+        self.assertTrue(wait_for(lambda: self._hub._thread is None))
+
+        # A new client starts a new thread
+        client = self._client()
+        self.assertTrue(wait_for(lambda: client.ticks > 0))
+
+    def test_done_client_is_dropped(self):
+        client = self._client()
+        other = self._client()
+        self.assertTrue(wait_for(lambda: other.ticks > 0))
+        client.done = True
+        self._hub.wake(client)
+        self.assertTrue(wait_for(lambda: len(self._hub._clients) == 1))
+        self.assertIs(self._hub._clients[0].client, other)
+
+    def test_closed_output_is_no_longer_polled(self):
+        client = self._client()
+        self.assertTrue(wait_for(lambda: client.ticks > 0))
+        os.close(client.write_fd)
+        self.assertTrue(wait_for(lambda: self._hub._clients[0].closed))
+
+        # The client still gets its housekeeping ticks
+        ticks = client.ticks
+        self.assertTrue(wait_for(lambda: client.ticks > ticks))
+
+    def test_wake_runs_ticks(self):
+        client = self._client()
+        other = self._client()
+        self.assertTrue(wait_for(lambda: client.ticks == 1 and other.ticks == 1))
+        self._hub.wake(client)
+        self.assertTrue(wait_for(lambda: client.ticks == 2))
+        self._hub.wake()
+        self.assertTrue(wait_for(lambda: client.ticks == 3 and other.ticks == 2))
+
+        # Without output or wake ups there are no more ticks or frames until
+        # the idle tick
+        time.sleep(0.1)
+        self.assertEqual((client.ticks, client.frames), (3, 0))
+
+    def test_idle_client_is_ticked(self):
+        self._hub = io_hub.IOHub(max_fps=100, idle_interval=0.05)
+        client = self._client()
+        self.assertTrue(wait_for(lambda: client.ticks > 0))
+
+        # Without output or wake ups, e.g. to notice a resize of the view
+        self.assertTrue(wait_for(lambda: client.ticks >= 4, timeout=0.5))
+        self.assertEqual((client.data, client.frames), (b"", 0))
+
+    def test_idle_ticks_are_aligned(self):
+        self._hub = io_hub.IOHub(max_fps=100, idle_interval=1.0)
+        clients = [self._client() for _ in range(5)]
+        self.assertTrue(wait_for(lambda: all(client.ticks > 0 for client in clients)))
+        self._hub.wake(clients[0])
+        self.assertTrue(wait_for(lambda: clients[0].ticks == 2))
+
+        # One deadline for all clients, also the one woken up in between
+        self.assertEqual(len(set(state.next_tick for state in self._hub._clients)), 1)
+
+    def test_pause_reading(self):
+        client = self._client()
+        self.assertTrue(wait_for(lambda: client.ticks > 0))
+        self._hub.pause_reading(client)
+        self.assertTrue(wait_for(lambda: not self._hub._clients[0].reading))
+        os.write(client.write_fd, b"x")
+        time.sleep(0.05)
+        self.assertEqual(client.data, b"")
+
+        self._hub.resume_reading(client)
+        self.assertTrue(wait_for(lambda: client.data == b"x"))
+
+    def test_request_frame(self):
+        client = self._client()
+        self.assertTrue(wait_for(lambda: client.ticks > 0))
+        self._hub.request_frame(client)
+        self.assertTrue(wait_for(lambda: client.frames == 1))
+
+    def test_failing_client_is_dropped(self):
+        client = self._client()
+        other = self._client()
+
+        def fail():
+            raise RuntimeError("broken client")
+        client.on_readable = fail
+
+        os.write(client.write_fd, b"x")
+        self.assertTrue(wait_for(lambda: len(self._hub._clients) == 1))
+        os.write(other.write_fd, b"y")
+        self.assertTrue(wait_for(lambda: other.data == b"y"))
+
+
+class frame_schedule(unittest.TestCase):
+    def setUp(self):
+        self._hub = io_hub.IOHub(max_fps=10, settle_delay=0.002)
+        self._state = io_hub._ClientState(PipeClient(), 0.0)
+        self._state.next_tick = None
+        self._hub._clients.append(self._state)
+
+    def tearDown(self):
+        self._state.client.close()
+
+    def test_idle(self):
+        self.assertIsNone(self._hub._frame_due(self._state))
+        self.assertIsNone(self._hub._timeout(100.0))
+
+    def test_output_after_idle_is_rendered_right_away(self):
+        self._state.last_frame = 90.0
+        self._state.pending_since = 100.0
+        self._state.last_output = 100.0
+        self.assertAlmostEqual(self._hub._frame_due(self._state), 100.002)
+        self.assertAlmostEqual(self._hub._timeout(100.0), 0.002)
+
+        # More output within the settle delay ends up in the same frame
+        self._state.last_output = 100.001
+        self.assertAlmostEqual(self._hub._frame_due(self._state), 100.003)
+
+    def test_sustained_output_is_coalesced(self):
+        self._state.last_frame = 100.0
+        self._state.pending_since = 100.01
+        self._state.last_output = 100.01
+        self.assertAlmostEqual(self._hub._frame_due(self._state), 100.1)
+
+        # Continuous output does not hold back the frame
+        self._state.last_output = 100.15
+        self.assertAlmostEqual(self._hub._frame_due(self._state), 100.11)
+
+    def test_ticks(self):
+        self._state.next_tick = 100.5
+        self.assertAlmostEqual(self._hub._timeout(100.0), 0.5)
+        self.assertEqual(self._hub._timeout(101.0), 0.0)
+
+
+class select_poller(unittest.TestCase):
+    def test_select_fallback(self):
+        poller = io_hub._SelectPoller()
+        read_fd, write_fd = os.pipe()
+        try:
+            poller.register(read_fd, "data")
+            self.assertEqual(poller.select(0), [])
+            os.write(write_fd, b"x")
+            self.assertEqual(poller.select(0), [(read_fd, "data")])
+            poller.unregister(read_fd)
+            self.assertEqual(poller.select(0), [])
+        finally:
+            os.close(read_fd)
+            os.close(write_fd)
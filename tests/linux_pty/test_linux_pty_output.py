@@ -0,0 +1,55 @@
+"""
+Unittests for reading large amounts of output from the LinuxPty module
+"""
+import os
+import time
+import unittest
+
+# Module to test
+from TerminalView import linux_pty
+
+
+class OutputTest(unittest.TestCase):
+    def _run(self, *cmd):
+        cwd = os.path.dirname(os.path.abspath(__file__))
+        pty = linux_pty.LinuxPty(["/usr/bin/env"] + list(cmd), cwd)
+        self.addCleanup(pty.stop)
+        return pty
+
+    def test_receive_all_output(self):
+        pty = self._run("seq", "1", "20000")
+        data = bytearray()
+        batch_sizes = []
+        while not pty.output_closed():
+            batch = pty.receive_all_output(2**14, timeout=1)
+            if batch is not None:
+                self.assertIsInstance(batch, memoryview)
+                batch_sizes.append(len(batch))
+                data += batch
+
+        expected = "".join("%i\r\n" % i for i in range(1, 20001)).encode("ascii")
+        self.assertEqual(bytes(data), expected)
+        self.assertLessEqual(max(batch_sizes), 2**14)
+
+    def test_pending_output(self):
+        pty = self._run("printf", "0123456789")
+        end = time.time() + 1
+        while pty.pending_output() < 10 and time.time() < end:
+            time.sleep(0.01)
+        self.assertEqual(pty.pending_output(), 10)
+
+        data = pty.receive_all_output(4)
+        self.assertEqual(bytes(data), b"0123")
+        self.assertEqual(pty.pending_output(), 6)
+
+    def test_receive_output_into(self):
+        pty = self._run("printf", "0123456789")
+        end = time.time() + 1
+        while pty.pending_output() < 10 and time.time() < end:
+            time.sleep(0.01)
+
+        buf = bytearray(8)
+        views = [memoryview(buf)[5:], memoryview(buf)[:4]]
+        self.assertEqual(pty.receive_output_into(views), 7)
+        self.assertEqual(bytes(buf), b"3456\x00012")
+        self.assertEqual(pty.pending_output(), 3)
@@ -0,0 +1,163 @@
+"""
+Unittests for the output ring buffer
+"""
+import threading
+import time
+import unittest
+
+from TerminalView import output_ring
+
+
+def write(ring, data):
+    size = 0
+    for view in ring.writable_views():
+        chunk = data[size:size + len(view)]
+        view[:len(chunk)] = chunk
+        size += len(chunk)
+    ring.commit_write(size)
+    return size
+
+
+def read(ring, max_size=None):
+    data = b"".join(bytes(view) for view in ring.wait_readable(timeout=1))
+    if max_size is not None:
+        data = data[:max_size]
+    ring.commit_read(len(data))
+    return data
+
+
+class output_ring_buffer(unittest.TestCase):
+    def setUp(self):
+        self._events = []
+        self._ring = output_ring.OutputRing(
+            8,
+            pause_producer=lambda: self._events.append("pause"),
+            resume_producer=lambda: self._events.append("resume"))
+
+    def test_write_and_read(self):
+        self.assertEqual(write(self._ring, b"abc"), 3)
+        self.assertEqual(self._ring.depth(), 3)
+        self.assertEqual(read(self._ring), b"abc")
+        self.assertEqual(self._ring.depth(), 0)
+
+    def test_wrap_around(self):
+        write(self._ring, b"abcdef")
+        self.assertEqual(read(self._ring, 5), b"abcde")
+
+        # The free space wraps around the end of the buffer
+        views = self._ring.writable_views()
+        self.assertEqual([len(view) for view in views], [2, 5])
+        self.assertEqual(write(self._ring, b"ghijklm"), 7)
+
+        views = self._ring.wait_readable()
+        self.assertEqual([bytes(view) for view in views], [b"fgh", b"ijklm"])
+        self.assertEqual(read(self._ring), b"fghijklm")
+
+    def test_backpressure(self):
+        self.assertEqual(write(self._ring, b"0123456789"), 8)
+        self.assertEqual(self._events, ["pause"])
+        self.assertEqual(self._ring.writable_views(), [])
+
+        # The producer is resumed once half of the ring is free
+        read(self._ring, 2)
+        self.assertEqual(self._events, ["pause"])
+        read(self._ring, 2)
+        self.assertEqual(self._events, ["pause", "resume"])
+
+        stats = self._ring.stats()
+        self.assertEqual(stats["max_depth"], 8)
+        self.assertEqual(stats["nb_full"], 1)
+        self.assertEqual(stats["bytes_written"], 8)
+        self.assertEqual(stats["bytes_read"], 4)
+
+    def test_close(self):
+        write(self._ring, b"abc")
+        self._ring.close()
+        self.assertEqual(self._ring.writable_views(), [])
+        self.assertEqual(read(self._ring), b"abc")
+        self.assertEqual(self._ring.wait_readable(), [])
+
+    def test_close_discard(self):
+        write(self._ring, b"abc")
+        self._ring.close(discard=True)
+        self.assertEqual(self._ring.wait_readable(), [])
+
+    def test_consumer_thread(self):
+        data = bytes(range(256)) * 10
+        received = []
+
+        def consume():
+            while True:
+                views = self._ring.wait_readable()
+                if not views:
+                    return
+                received.append(bytes(views[0]))
+                self._ring.commit_read(len(views[0]))
+
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+        size = 0
+        while size < len(data):
+            size += write(self._ring, data[size:])
+        self._ring.close()
+        consumer.join(2)
+
+        self.assertFalse(consumer.is_alive())
+        self.assertEqual(b"".join(received), data)
+
+
+class ParserClient():
+    """
+    Client of the shared parser keeping the data of its ring, one byte per
+    batch so the rings have to take turns
+    """
+    def __init__(self, parser, name, order):
+        self.ring = output_ring.OutputRing(8, notify_consumer=lambda: parser.notify(self.ring))
+        self.data = b""
+        self.done = threading.Event()
+        self._name = name
+        self._order = order
+
+    def parse(self, buffers):
+        self.data += bytes(buffers[0][:1])
+        self._order.append(self._name)
+        self.ring.commit_read(1)
+
+    def parsed(self):
+        self.done.set()
+
+
+class output_parser(unittest.TestCase):
+    def test_rings_take_turns(self):
+        parser = output_ring.OutputParser()
+        order = []
+        clients = [ParserClient(parser, name, order) for name in "ab"]
+        for client in clients:
+            write(client.ring, client._name.encode() * 3)
+        for client in clients:
+            parser.register(client.ring, client)
+            client.ring.close()
+
+        for client in clients:
+            self.assertTrue(client.done.wait(2))
+            self.assertEqual(client.data, client._name.encode() * 3)
+        self.assertEqual(order[-4:], ["a", "b", "a", "b"])
+
+        # The thread ends with the last ring
+        end = time.time() + 2
+        while parser._thread is not None and time.time() < end:
+            time.sleep(0.005)
+        self.assertIsNone(parser._thread)
+
+    def test_failing_client_is_dropped(self):
+        parser = output_ring.OutputParser()
+        client = ParserClient(parser, "a", [])
+
+        def fail(buffers):
+            raise RuntimeError("broken client")
+        client.parse = fail
+
+        parser.register(client.ring, client)
+        write(client.ring, b"abc")
+        self.assertTrue(client.done.wait(2))
+        self.assertTrue(client.ring.closed())
@@ -0,0 +1,92 @@
+"""
+Unittests for the compact lines of the pyte screens
+"""
+import random
+import unittest
+
+from TerminalView import pyte
+from TerminalView.pyte.screens import Char, CellAttributes, CompactLine, _scan_runs
+
+
+class CompactDiffScreen(pyte.DiffScreen):
+    compact = True
+
+
+class compact_line(unittest.TestCase):
+    def setUp(self):
+        self.table = CellAttributes()
+        self.line = CompactLine.filled(self.table, Char(" "), 5)
+
+    def test_behaves_like_a_list(self):
+        red = Char("r", fg="red")
+        chars = [Char(" ")] * 5
+        for line in (self.line, chars):
+            line[1] = red
+            line[3:5] = [Char("x"), Char("y")]
+            line.insert(0, Char("a"))
+            line.pop()
+            line.append(Char("z"))
+            del line[4:]
+            line.extend([Char("b", bold=True)])
+
+        self.assertEqual(list(self.line), chars)
+        self.assertEqual(self.line, chars)
+        self.assertEqual(len(self.line), 5)
+        self.assertEqual(self.line[2], red)
+        self.assertEqual(self.line.text(), "a r b")
+        self.assertIsInstance(self.line[1:3], CompactLine)
+        self.assertEqual(list(self.line + [red]), chars + [red])
+
+    def test_arrays_widen_when_needed(self):
+        self.assertEqual((self.line.codes.typecode, self.line.attrs.typecode), ("B", "B"))
+
+        self.line.put_text(0, "caf\xe9", Char(" "))
+        self.assertEqual(self.line.codes.typecode, "B")
+        self.line.put(4, "中", Char(" "))
+        self.assertEqual(self.line.text(), "caf\xe9中")
+
+        for i in range(300):
+            self.line.put(0, "x", Char(" ", fg=str(i)))
+        self.assertEqual(self.line.attrs.typecode, "H")
+        self.assertEqual(self.line[0].fg, "299")
+        self.assertEqual(self.line[1].fg, "default")
+
+    def test_runs_merge_attributes_with_the_same_colors(self):
+        self.line[1:3] = [Char("a", bold=True), Char("b", fg="red", italics=True)]
+        self.assertEqual(_scan_runs(self.line), _scan_runs(list(self.line)))
+        self.assertEqual(_scan_runs(self.line, 1, 4), _scan_runs(list(self.line), 1, 4))
+
+
+class compact_screen(unittest.TestCase):
+    def test_same_as_list_screen(self):
+        pieces = ["abc", "\r\n", "\x1b[31mred\x1b[0m", "\x1b[1;44mbold\x1b[0m", "\x1b[2;4r",
+                  "\x1b[r", "\x1bM", "\x1b[2M", "\x1b[L", "\x1b[3;2H", "\x1b[K", "\x1b[1K",
+                  "\x1b[2J", "\x1b[J", "0123456789xyz", "\x1b[P", "\x1b[2@", "\x1b[3X",
+                  "caf\xe9 中文", "\x1b(0lqqk\x1b(B", "\x1b[4h", "\x1b[4l", "\x1b#8",
+                  "\x1b[?7l", "\x1b[?7h", "\t", "\x08"]
+        for seed in range(50):
+            random.seed(seed)
+            screens = [pyte.DiffScreen(10, 5), CompactDiffScreen(10, 5)]
+            for i in range(40):
+                data = "".join(random.choice(pieces) for _ in range(random.randint(1, 4)))
+                errors = 0
+                for screen in screens:
+                    stream = pyte.Stream()
+                    stream.attach(screen)
+                    try:
+                        stream.feed(data)
+                    except IndexError:
+                        # Both kinds of lines fail alike on the edge
+                        # cases pyte does not handle
+                        errors += 1
+                self.assertIn(errors, (0, 2))
+                if i == 20:
+                    for screen in screens:
+                        screen.resize(4, 12)
+
+            list_screen, compact = screens
+            self.assertTrue(all(isinstance(line, CompactLine) for line in compact.buffer))
+            self.assertEqual(compact.buffer, list_screen.buffer)
+            self.assertEqual(compact.display, list_screen.display)
+            self.assertEqual(compact.runs.lines, list_screen.runs.lines)
+            self.assertEqual(compact.dirty, list_screen.dirty)
@@ -0,0 +1,100 @@
+"""
+Unittests for the cell-span damage tracking of the pyte diff screen
+"""
+import unittest
+
+from TerminalView import pyte
+from TerminalView.pyte.screens import Damage
+
+
+class damage(unittest.TestCase):
+    def test_merge_overlapping_spans(self):
+        damage = Damage(3, 20)
+        damage.add(0, 2, 4)
+        damage.add(0, 8, 10)
+        damage.add(0, 3, 6)
+        self.assertEqual(damage.line_spans(), {0: [(2, 6), (8, 10)]})
+
+        # Touching spans are merged as well
+        damage.add(0, 6, 8)
+        self.assertEqual(damage.line_spans(), {0: [(2, 10)]})
+
+    def test_spans_are_clipped(self):
+        damage = Damage(3, 20)
+        damage.add(1, -5, 50)
+        damage.add(2, 7, 7)
+        self.assertEqual(damage.line_spans(), {1: [(0, 20)]})
+
+    def test_everything(self):
+        damage = Damage(3, 20)
+        damage.add(0, 2, 4)
+        damage.mark_all()
+        damage.add(1, 2, 4)
+
+        self.assertTrue(damage.everything)
+        self.assertEqual(set(damage), set([0, 1, 2]))
+        self.assertEqual(damage.line_spans(),
+                         dict((y, [(0, 20)]) for y in range(3)))
+
+        damage.clear()
+        self.assertEqual(len(damage), 0)
+        self.assertEqual(damage, set())
+
+
+class diff_screen(unittest.TestCase):
+    def setUp(self):
+        self.screen = pyte.DiffScreen(10, 4)
+        self.screen.dirty.clear()
+
+    def test_draw_single_character(self):
+        self.screen.cursor_position(2, 5)
+        self.screen.draw("x")
+        self.assertEqual(self.screen.dirty.line_spans(), {1: [(4, 5)]})
+
+    def test_draw_text_wraps(self):
+        self.screen.cursor_position(1, 8)
+        self.screen.draw_text("abcde")
+        self.assertEqual(self.screen.dirty.line_spans(),
+                         {0: [(7, 10)], 1: [(0, 2)]})
+
+    def test_erase_in_line(self):
+        self.screen.cursor_position(3, 4)
+        self.screen.erase_in_line(1)
+        self.screen.erase_characters(2)
+        self.assertEqual(self.screen.dirty.line_spans(), {2: [(0, 5)]})
+
+    def test_scroll_is_recorded(self):
+        self.screen.cursor_position(4, 1)
+        self.screen.draw_text("ab")
+        self.screen.linefeed()
+        self.screen.linefeed()
+        self.assertEqual(self.screen.dirty.scrolls, [(0, 3, 2)])
+        self.assertEqual(self.screen.dirty.line_spans(),
+                         {1: [(0, 2)], 2: [(0, 10)], 3: [(0, 10)]})
+
+    def test_scroll_wrapped_run(self):
+        self.screen.cursor_position(4, 6)
+        self.screen.draw_text("abcdefg")
+        self.assertEqual(self.screen.dirty.scrolls, [(0, 3, 1)])
+        self.assertEqual(self.screen.dirty.line_spans(),
+                         {2: [(5, 10)], 3: [(0, 10)]})
+
+    def test_scroll_in_region(self):
+        self.screen.set_margins(2, 3)
+        self.screen.cursor_position(2, 1)
+        self.screen.reverse_index()
+        self.assertEqual(self.screen.dirty.scrolls, [(1, 2, -1)])
+        self.assertEqual(self.screen.dirty.line_spans(), {1: [(0, 10)]})
+
+    def test_scroll_whole_screen_damages_everything(self):
+        self.screen.cursor_position(4, 1)
+        for _ in range(4):
+            self.screen.linefeed()
+        self.assertTrue(self.screen.dirty.everything)
+        self.assertEqual(self.screen.dirty.scrolls, [])
+        self.assertEqual(set(self.screen.dirty), set(range(4)))
+
+    def test_resize(self):
+        self.screen.resize(6, 12)
+        self.assertEqual(self.screen.dirty.line_spans(),
+                         dict((y, [(0, 12)]) for y in range(6)))
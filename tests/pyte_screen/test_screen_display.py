@@ -0,0 +1,50 @@
+"""
+Unittests for the per-line text cache of the pyte diff screen
+"""
+import unittest
+
+from TerminalView import pyte
+
+
+class display_cache(unittest.TestCase):
+    def setUp(self):
+        self.screen = pyte.DiffScreen(5, 3)
+        self.stream = pyte.Stream()
+        self.stream.attach(self.screen)
+
+    def assert_display(self, expected):
+        self.assertEqual(self.screen.display, expected)
+        self.assertEqual(self.screen.display,
+                         ["".join(char.data for char in line) for line in self.screen.buffer])
+
+    def test_only_changed_lines_are_joined(self):
+        self.stream.feed("ab\r\ncd")
+        self.assert_display(["ab   ", "cd   ", "     "])
+
+        self.stream.feed("e")
+        self.assertEqual(self.screen.display_cache.lines,
+                         ["ab   ", None, "     "])
+        self.assert_display(["ab   ", "cde  ", "     "])
+
+    def test_scroll_moves_text(self):
+        self.stream.feed("1\r\n2\r\n3")
+        self.screen.display
+        self.stream.feed("\r\n")
+        self.assertEqual(self.screen.display_cache.lines,
+                         ["2    ", "3    ", None])
+        self.assert_display(["2    ", "3    ", "     "])
+
+    def test_erase_and_insert(self):
+        self.stream.feed("abcde\x1b[2;1Hfghij")
+        self.screen.display
+        self.stream.feed("\x1b[1;2H\x1b[2P\x1b[2;3H\x1b[K\x1b[L")
+        self.assert_display(["ade  ", "     ", "fg   "])
+
+    def test_alignment_display_and_resize(self):
+        self.stream.feed("ab")
+        self.screen.display
+        self.stream.feed("\x1b#8")
+        self.assert_display(["EEEEE"] * 3)
+
+        self.screen.resize(2, 3)
+        self.assert_display(["EEE"] * 2)
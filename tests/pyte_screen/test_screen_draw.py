@@ -0,0 +1,126 @@
+"""
+Unittests for drawing text runs on the pyte screens
+"""
+import unittest
+
+from TerminalView import pyte
+from TerminalView.pyte import modes
+
+
+def draw_per_char(screen, text):
+    for char in text:
+        screen.draw(char)
+
+
+class draw_text(unittest.TestCase):
+    def _assert_same_as_per_char(self, text, columns=10, lines=4, setup=None):
+        run_screen = pyte.DiffScreen(columns, lines)
+        char_screen = pyte.DiffScreen(columns, lines)
+        for screen in (run_screen, char_screen):
+            if setup is not None:
+                setup(screen)
+            screen.dirty.clear()
+
+        run_screen.draw_text(text)
+        draw_per_char(char_screen, text)
+
+        self.assertEqual(run_screen.buffer, char_screen.buffer)
+        self.assertEqual((run_screen.cursor.x, run_screen.cursor.y),
+                         (char_screen.cursor.x, char_screen.cursor.y))
+        self.assertEqual(run_screen.dirty, char_screen.dirty)
+
+    def test_single_line(self):
+        self._assert_same_as_per_char("hello")
+
+    def test_wrap_and_scroll(self):
+        self._assert_same_as_per_char("0123456789" * 7)
+
+    def test_no_autowrap(self):
+        def setup(screen):
+            screen.reset_mode(modes.DECAWM)
+        self._assert_same_as_per_char("abcdefghijklmnop", setup=setup)
+
+    def test_insert_mode(self):
+        def setup(screen):
+            screen.draw_text("xyz")
+            screen.cursor_to_column(1)
+            screen.set_mode(modes.IRM)
+        self._assert_same_as_per_char("ab", setup=setup)
+
+    def test_charset_and_attributes(self):
+        def setup(screen):
+            screen.set_charset("0", "(")
+            screen.select_graphic_rendition(31, 44)
+        self._assert_same_as_per_char("lqqk x", setup=setup)
+
+    def test_mixed_width(self):
+        self._assert_same_as_per_char("café 中文 ok", columns=7)
+
+
+class wrapped_flags(unittest.TestCase):
+    def test_flags_follow_lines(self):
+        for draw in (draw_per_char, pyte.Screen.draw_text):
+            screen = pyte.Screen(4, 3)
+            draw(screen, "abcdef")
+            screen.linefeed()
+            screen.carriage_return()
+            draw(screen, "abcd")
+            self.assertEqual(screen.wrapped, [True, False, False])
+
+            # Scrolling moves the flags along with the lines
+            screen.cursor_position(1, 1)
+            screen.reverse_index()
+            self.assertEqual(screen.wrapped, [False, True, False])
+            screen.cursor_position(3, 1)
+            screen.linefeed()
+            self.assertEqual(screen.wrapped, [True, False, False])
+
+    def test_erase_clears_flag(self):
+        screen = pyte.Screen(4, 3)
+        screen.draw_text("abcdef")
+        screen.cursor_position(1, 3)
+        screen.erase_in_line(0)
+        self.assertEqual(screen.wrapped, [False, False, False])
+
+
+class stream_text_runs(unittest.TestCase):
+    def test_runs_between_control_codes(self):
+        class Recorder(object):
+            def __init__(self):
+                self.events = []
+
+            def draw_text(self, text):
+                self.events.append(("draw_text", text))
+
+            def linefeed(self):
+                self.events.append(("linefeed", ))
+
+            def select_graphic_rendition(self, *attrs):
+                self.events.append(("sgr", ) + attrs)
+
+        recorder = Recorder()
+        stream = pyte.Stream()
+        stream.attach(recorder)
+        stream.feed("foo bar\n\x1b[31mbaz")
+
+        self.assertEqual(recorder.events, [
+            ("draw_text", "foo bar"),
+            ("linefeed", ),
+            ("sgr", 31),
+            ("draw_text", "baz"),
+        ])
+
+    def test_draw_only_listener(self):
+        class DrawOnly(object):
+            def __init__(self):
+                self.chars = []
+
+            def draw(self, char):
+                self.chars.append(char)
+
+        listener = DrawOnly()
+        stream = pyte.Stream()
+        stream.attach(listener, only=["draw"])
+        stream.feed("ab\ncd")
+
+        self.assertEqual(listener.chars, ["a", "b", "c", "d"])
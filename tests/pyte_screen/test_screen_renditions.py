@@ -0,0 +1,50 @@
+"""
+Unittests for the shared cursor attributes of the pyte screens
+"""
+import unittest
+
+from TerminalView import pyte
+from TerminalView.pyte.screens import Char, Renditions
+
+
+class renditions(unittest.TestCase):
+    def test_same_rendition_is_same_object(self):
+        screen = pyte.Screen(10, 2)
+        screen.select_graphic_rendition(1, 34)
+        blue = screen.cursor.attrs
+        screen.select_graphic_rendition(0)
+        self.assertIs(screen.cursor.attrs, screen.renditions.intern(Char(" ")))
+        screen.select_graphic_rendition(34)
+        screen.select_graphic_rendition(1)
+        self.assertIs(screen.cursor.attrs, blue)
+        self.assertEqual(blue, Char(" ", fg="blue", bold=True))
+
+    def test_reset_goes_to_default(self):
+        screen = pyte.Screen(10, 2)
+        screen.select_graphic_rendition(31, 4)
+        screen.select_graphic_rendition(7, 0, 32)
+        self.assertEqual(screen.cursor.attrs, Char(" ", fg="green"))
+        screen.select_graphic_rendition()
+        self.assertEqual(screen.cursor.attrs, screen.default_char)
+
+    def test_cells_are_shared(self):
+        screen = pyte.Screen(10, 2)
+        screen.select_graphic_rendition(31)
+        screen.draw_text("ab")
+        screen.select_graphic_rendition(0)
+        screen.draw_text("ab")
+        screen.select_graphic_rendition(31)
+        screen.draw_text("ab")
+        line = screen.buffer[0]
+        self.assertIs(line[0], line[4])
+        self.assertIsNot(line[0], line[2])
+        self.assertEqual(line[4], Char("a", fg="red"))
+
+    def test_bounded(self):
+        table = Renditions(size=4)
+        char = Char(" ")
+        for color in range(30, 38):
+            selected = table.select(char, (color, ), char)
+            self.assertEqual(selected.fg, pyte.graphics.FG[color])
+        self.assertLessEqual(len(table._styles), 4)
+        self.assertLessEqual(len(table._transitions), 4)
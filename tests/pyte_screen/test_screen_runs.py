@@ -0,0 +1,97 @@
+"""
+Unittests for the attribute runs kept by the pyte diff screen
+"""
+import unittest
+
+from TerminalView import pyte
+from TerminalView.pyte.screens import Run, _scan_runs
+
+
+def _runs(screen, line):
+    return [(run.start, run.length, run.fg, run.bg, run.reverse)
+            for run in screen.runs[line]]
+
+
+class attribute_runs(unittest.TestCase):
+    def setUp(self):
+        self.screen = pyte.DiffScreen(10, 4)
+        self.stream = pyte.Stream()
+        self.stream.attach(self.screen)
+
+    def assert_runs_match_buffer(self):
+        self.assertEqual(self.screen.runs.lines,
+                         [_scan_runs(line) for line in self.screen.buffer])
+
+    def test_blank_screen(self):
+        for line in range(4):
+            self.assertEqual(self.screen.runs[line],
+                             [Run(0, 10, "default", "default", False)])
+
+    def test_draw_text(self):
+        self.stream.feed("ab\x1b[31mcd\x1b[0me")
+        self.assertEqual(_runs(self.screen, 0), [
+            (0, 2, "default", "default", False),
+            (2, 2, "red", "default", False),
+            (4, 6, "default", "default", False),
+        ])
+        self.assert_runs_match_buffer()
+
+    def test_same_attributes_are_merged(self):
+        self.stream.feed("\x1b[44mabc\x1b[0m\x1b[44mdef")
+        self.assertEqual(_runs(self.screen, 0), [
+            (0, 6, "default", "blue", False),
+            (6, 4, "default", "default", False),
+        ])
+
+    def test_wrap_and_scroll(self):
+        self.stream.feed("\x1b[4;6H\x1b[7mabcdefg")
+        self.assertEqual(_runs(self.screen, 2), [
+            (0, 5, "default", "default", False),
+            (5, 5, "default", "default", True),
+        ])
+        self.assertEqual(_runs(self.screen, 3), [
+            (0, 2, "default", "default", True),
+            (2, 8, "default", "default", False),
+        ])
+        self.assert_runs_match_buffer()
+
+    def test_erase_with_cursor_attributes(self):
+        self.stream.feed("abcdef\x1b[42m\x1b[3G\x1b[2X\x1b[2;1H\x1b[2K")
+        self.assertEqual(_runs(self.screen, 0), [
+            (0, 2, "default", "default", False),
+            (2, 2, "default", "green", False),
+            (4, 6, "default", "default", False),
+        ])
+        self.assertEqual(_runs(self.screen, 1), [(0, 10, "default", "green", False)])
+        self.assert_runs_match_buffer()
+
+    def test_insert_and_delete(self):
+        self.stream.feed("\x1b[31mab\x1b[0mcd\x1b[1G\x1b[2@\x1b[1P")
+        self.stream.feed("\x1b[3;1H\x1b[41m\x1b[M\x1b[1;1H\x1b[L")
+        self.assert_runs_match_buffer()
+
+    def test_scroll_region(self):
+        self.stream.feed("\x1b[32m1\r\n2\r\n3\r\n4\x1b[2;3r"
+                         "\x1b[2;1H\x1bM\x1bM\x1b[3;1H\x1bD\x1bD\x1b[r")
+        self.assert_runs_match_buffer()
+
+    def test_reverse_screen_and_resize(self):
+        self.stream.feed("\x1b[33mab\x1b[?5h")
+        self.assert_runs_match_buffer()
+        self.screen.resize(6, 12)
+        self.assertEqual(len(self.screen.runs), 6)
+        self.assert_runs_match_buffer()
+
+
+class history_runs(unittest.TestCase):
+    def test_pages(self):
+        screen = pyte.HistoryScreen(10, 4, history=20)
+        stream = pyte.Stream()
+        stream.attach(screen)
+        for i in range(10):
+            stream.feed("\x1b[3%dm%d\r\n" % (i % 8, i))
+
+        screen.prev_page()
+        self.assertEqual(screen.runs.lines, [_scan_runs(line) for line in screen.buffer])
+        screen.next_page()
+        self.assertEqual(screen.runs.lines, [_scan_runs(line) for line in screen.buffer])
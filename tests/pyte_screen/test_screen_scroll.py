@@ -0,0 +1,97 @@
+"""
+Unittests for scrolling and line recycling on the pyte screens
+"""
+import unittest
+
+from TerminalView import pyte
+from TerminalView import pyte_terminal_emulator
+
+
+def fill(screen):
+    for y in range(screen.lines):
+        screen.cursor_position(y + 1, 1)
+        screen.draw_text(str(y) * screen.columns)
+
+
+class index(unittest.TestCase):
+    def test_recycles_scrolled_off_line(self):
+        screen = pyte.Screen(3, 3)
+        fill(screen)
+        top_line = screen.buffer[0]
+
+        screen.index()
+
+        self.assertEqual(screen.display, ["111", "222", "   "])
+        self.assertIs(screen.buffer[-1], top_line)
+
+    def test_reverse_index(self):
+        screen = pyte.Screen(3, 3)
+        fill(screen)
+        screen.cursor_position()
+
+        screen.reverse_index()
+
+        self.assertEqual(screen.display, ["   ", "000", "111"])
+
+    def test_margins(self):
+        screen = pyte.Screen(3, 4)
+        fill(screen)
+        screen.set_margins(2, 3)
+        screen.cursor_position(3, 1)
+
+        screen.index()
+
+        self.assertEqual(screen.display, ["000", "222", "   ", "333"])
+
+    def test_history_keeps_scrolled_off_lines(self):
+        screen = pyte_terminal_emulator.CustomHistoryScreen(3, 2, 2, 0.5)
+        for y in range(4):
+            screen.draw_text(str(y) * 3)
+            screen.linefeed()
+            screen.carriage_return()
+
+        # The history holds the two newest lines frozen, the lines
+        # themselves are recycled.
+        self.assertEqual(len(screen.history.top), 2)
+        self.assertEqual(screen.display, ["333", "   "])
+        self.assertEqual([screen.thaw_line(screen.history.top.pop()).text()
+                          for _ in range(2)], ["222", "111"])
+
+
+class insert_delete_lines(unittest.TestCase):
+    def test_insert_lines(self):
+        screen = pyte.Screen(3, 5)
+        fill(screen)
+        screen.set_margins(2, 4)
+        screen.cursor_position(2, 2)
+
+        screen.insert_lines(2)
+
+        self.assertEqual(screen.display, ["000", "   ", "   ", "111", "444"])
+        self.assertEqual(screen.cursor.x, 0)
+
+    def test_delete_lines(self):
+        screen = pyte.Screen(3, 5)
+        fill(screen)
+        screen.set_margins(2, 4)
+        screen.cursor_position(2, 1)
+        screen.select_graphic_rendition(41)
+
+        screen.delete_lines(2)
+
+        self.assertEqual(screen.display, ["000", "333", "   ", "   ", "444"])
+        self.assertEqual(screen.buffer[3][0].bg, "red")
+        self.assertEqual(screen.buffer[4][0].bg, "default")
+
+    def test_count_larger_than_region(self):
+        screen = pyte.Screen(3, 4)
+        fill(screen)
+        screen.cursor_position(3, 1)
+
+        screen.delete_lines(10)
+        screen.cursor_position(1, 1)
+        screen.insert_lines(10)
+
+        self.assertEqual(screen.display, ["   "] * 4)
+        self.assertEqual(len(screen.buffer), 4)
+        self.assertEqual(len(set(map(id, screen.buffer))), 4)
@@ -0,0 +1,54 @@
+"""
+Unittests for decoding in the pyte byte streams
+"""
+import unittest
+
+from TerminalView import pyte
+
+
+def decode(*chunks, **kwargs):
+    drawn = []
+
+    class Listener(object):
+        def draw_text(self, text):
+            drawn.append(text)
+
+    stream = pyte.ByteStream(**kwargs)
+    stream.attach(Listener())
+    for chunk in chunks:
+        stream.feed(chunk)
+    return "".join(drawn)
+
+
+class byte_stream_decoding(unittest.TestCase):
+    def test_utf8(self):
+        self.assertEqual(decode("blåbær ✓".encode("utf-8")), "blåbær ✓")
+
+    def test_utf8_split_across_chunks(self):
+        data = "✓✓".encode("utf-8")
+        self.assertEqual(decode(data[:1], data[1:4], data[4:]), "✓✓")
+
+    def test_invalid_bytes_fall_back_per_byte(self):
+        # Only the invalid byte is decoded as cp437, the rest of the chunk
+        # is still utf-8
+        data = "æ".encode("utf-8") + b"\xff" + "ø".encode("utf-8")
+        self.assertEqual(decode(data), "æ" + b"\xff".decode("cp437") + "ø")
+
+    def test_truncated_sequence(self):
+        data = b"a\xe2\x28b"
+        self.assertEqual(decode(data), "a" + b"\xe2".decode("cp437") + "(b")
+
+    def test_bytes_like(self):
+        data = "✓✓".encode("utf-8")
+        buf = bytearray(data)
+        self.assertEqual(decode(memoryview(buf)[:4], memoryview(buf)[4:]), "✓✓")
+        self.assertEqual(decode(bytearray(data)), "✓✓")
+
+    def test_str_is_rejected(self):
+        with self.assertRaises(TypeError):
+            decode("✓")
+
+    def test_explicit_encodings(self):
+        encodings = [("utf-8", "strict"), ("cp437", "strict")]
+        data = "æ".encode("utf-8") + b"\xff"
+        self.assertEqual(decode(data, encodings=encodings), data.decode("cp437"))
@@ -0,0 +1,64 @@
+"""
+Unittests for the event dispatching of the pyte streams
+"""
+import unittest
+
+from TerminalView import pyte
+from TerminalView.pyte import streams
+
+
+class Recorder(object):
+    def __init__(self):
+        self.events = []
+
+    def __before__(self, event):
+        self.events.append(("before", event))
+
+    def __after__(self, event):
+        self.events.append(("after", event))
+
+    def bell(self):
+        self.events.append(("bell", ))
+
+
+class dispatch_table(unittest.TestCase):
+    def test_single_screen_resolves_to_bound_method(self):
+        screen = pyte.Screen(10, 2)
+        stream = pyte.Stream()
+        stream.attach(screen)
+
+        self.assertEqual(stream.compile_handler("linefeed"), screen.linefeed)
+        self.assertIs(stream.compile_handler("shift_in").__self__, screen)
+        self.assertIs(stream.compile_handler("debug"), streams.unhandled)
+
+    def test_hooks_are_called(self):
+        recorder = Recorder()
+        stream = pyte.Stream()
+        stream.attach(recorder)
+        stream.feed("\x07\x1b[31m")
+
+        self.assertEqual(recorder.events, [
+            ("before", "bell"),
+            ("bell", ),
+            ("after", "bell"),
+        ])
+
+    def test_only_and_multiple_listeners(self):
+        first, second = Recorder(), Recorder()
+        stream = pyte.Stream()
+        stream.attach(first)
+        stream.attach(second, only=["linefeed"])
+        stream.feed("\x07")
+
+        self.assertEqual(len(first.events), 3)
+        self.assertEqual(second.events, [])
+
+    def test_detach_invalidates_handlers(self):
+        recorder = Recorder()
+        stream = pyte.Stream()
+        stream.attach(recorder)
+        stream.feed("\x07")
+        stream.detach(recorder)
+        stream.feed("\x07")
+
+        self.assertEqual(len(recorder.events), 3)
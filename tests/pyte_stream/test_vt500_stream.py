@@ -0,0 +1,74 @@
+"""
+Unittests for the table-driven VT500 stream parser
+"""
+import unittest
+
+from TerminalView import pyte
+from TerminalView.pyte import streams
+
+
+class EventRecorder(object):
+    __before__ = __after__ = staticmethod(streams.noop)
+
+    def __init__(self):
+        self.events = []
+
+    def __getattr__(self, event):
+        def record(*args, **kwargs):
+            self.events.append((event, args, kwargs))
+        return record
+
+
+def record_events(stream_cls, *chunks):
+    recorder = EventRecorder()
+    stream = stream_cls()
+    stream.attach(recorder)
+    for chunk in chunks:
+        stream.feed(chunk)
+    return recorder.events
+
+
+class vt500_stream(unittest.TestCase):
+    def test_same_events_as_generator_parser(self):
+        chunks = [
+            "plain text\r\n",
+            "\x1b[1;31mred\x1b[0m\x1b[K",
+            "\x1b[?25l\x1b[?1049h\x1b[10;20H\x1b[2J",
+            "\x1b(0lqk\x1b(B\x1b7\x1b8\x1bM\x1bD",
+            "\x9b5A\x1b[m\x1b[;5H\t\x08\x07",
+        ]
+        for chunk in chunks:
+            self.assertEqual(record_events(pyte.VT500Stream, chunk),
+                             record_events(pyte.Stream, chunk), msg=repr(chunk))
+
+    def test_sequence_split_across_feeds(self):
+        whole = record_events(pyte.VT500Stream, "ab\x1b[12;34Hcd")
+        split = record_events(pyte.VT500Stream, "ab\x1b", "[1", "2;3", "4H", "cd")
+        self.assertEqual(whole, split)
+
+    def test_osc_title(self):
+        events = record_events(pyte.VT500Stream,
+                               "\x1b]0;user@host: ~\x07$ ",
+                               "\x1b]2;split", " title\x1b\\")
+        self.assertEqual(events, [
+            ("set_title", ("user@host: ~", ), {}),
+            ("set_icon_name", ("user@host: ~", ), {}),
+            ("draw_text", ("$ ", ), {}),
+            ("set_title", ("split title", ), {}),
+            ("debug", (), {}),
+        ])
+
+    def test_dcs_and_apc_are_swallowed(self):
+        events = record_events(pyte.VT500Stream,
+                               "a\x1bP1$r0m\x1b\\b\x1b_payload\x1b\\c")
+        draws = [args[0] for event, args, _ in events if event == "draw_text"]
+        self.assertEqual(draws, ["a", "b", "c"])
+
+    def test_screen_title(self):
+        screen = pyte.Screen(20, 2)
+        stream = pyte.VT500Stream()
+        stream.attach(screen)
+        stream.feed("\x1b]0;title\x07prompt$ ")
+
+        self.assertEqual(screen.title, "title")
+        self.assertEqual(screen.display[0], "prompt$ ".ljust(20))
@@ -0,0 +1,207 @@
+"""
+Unittests for the compressed scrollback store and paging through it
+"""
+import unittest
+
+from TerminalView import pyte
+from TerminalView import scrollback
+from TerminalView import pyte_terminal_emulator
+
+
+def record(i):
+    return ("line %u" % i).encode() * 4
+
+
+class scrollback_store(unittest.TestCase):
+    def test_pop_newest_first_across_blocks(self):
+        store = scrollback.Scrollback(2**20)
+        count = scrollback.BLOCK_LINES * 2 + 10
+        store.extend(record(i) for i in range(count))
+        self.assertEqual(len(store), count)
+        self.assertEqual(store.stats()["blocks"], 2)
+        self.assertEqual([store.pop() for _ in range(count)],
+                         [record(i) for i in reversed(range(count))])
+        self.assertFalse(store)
+        self.assertRaises(IndexError, store.pop)
+
+    def test_line_limit_drops_oldest(self):
+        store = scrollback.Scrollback(2**20, max_lines=300)
+        for i in range(1000):
+            store.append(record(i))
+        self.assertEqual(len(store), 300)
+        self.assertEqual([store.pop() for _ in range(300)],
+                         [record(i) for i in reversed(range(700, 1000))])
+
+    def test_memory_budget(self):
+        store = scrollback.Scrollback(64 * 1024)
+        for i in range(20000):
+            store.append(record(i))
+        self.assertLessEqual(store.memory(), 64 * 1024)
+        # More lines than would fit uncompressed
+        self.assertGreater(len(store) * len(record(19999)), 64 * 1024)
+        self.assertEqual(store.pop(), record(19999))
+
+        store.clear()
+        self.assertEqual((len(store), store.memory()), (0, 0))
+
+    def test_index_oldest_first(self):
+        store = scrollback.Scrollback(2**20, max_lines=1000)
+        store.extend(record(i) for i in range(1300))
+        self.assertEqual([store[i] for i in range(1000)],
+                         [record(i) for i in range(300, 1300)])
+        self.assertEqual(store[-1], record(1299))
+        self.assertRaises(IndexError, store.__getitem__, 1000)
+        self.assertEqual(store.pop(), record(1299))
+        self.assertEqual(store[-1], record(1298))
+
+
+class spill(unittest.TestCase):
+    def test_spilled_lines_come_back(self):
+        store = scrollback.Scrollback(32 * 1024, spill=True)
+        count = scrollback.BLOCK_LINES * 60
+        store.extend(record(i) for i in range(count))
+        stats = store.stats()
+        self.assertEqual(len(store), count)
+        self.assertLessEqual(store.memory(), 32 * 1024)
+        self.assertGreater(stats["spilled_blocks"], 0)
+        self.assertGreater(stats["spilled_bytes"], 0)
+
+        # Paging down again spills the lines again, in the same space
+        popped = [store.pop() for _ in range(count // 2)]
+        store.extend(reversed(popped))
+        self.assertLess(store.stats()["spilled_bytes"], stats["spilled_bytes"] * 1.1)
+
+        self.assertEqual([store[i] for i in range(0, count, 97)],
+                         [record(i) for i in range(0, count, 97)])
+        self.assertEqual([store.pop() for _ in range(count)],
+                         [record(i) for i in reversed(range(count))])
+
+    def test_line_limit_compacts_file(self):
+        store = scrollback.Scrollback(32 * 1024, max_lines=scrollback.BLOCK_LINES * 10,
+                                      spill=True)
+        for i in range(scrollback.BLOCK_LINES * 100):
+            store.append(record(i))
+        self.assertEqual(len(store), scrollback.BLOCK_LINES * 10)
+        # Blocks are about 1.5 kB
+        self.assertLess(store.stats()["spilled_bytes"], 2 * 2048 * 10)
+        self.assertEqual(store.pop(), record(scrollback.BLOCK_LINES * 100 - 1))
+        while len(store) > 1:
+            store.pop()
+        self.assertEqual(store.pop(), record(scrollback.BLOCK_LINES * 90))
+
+    def test_close_deletes_spilled_lines(self):
+        store = scrollback.Scrollback(32 * 1024, spill=True)
+        store.extend(record(i) for i in range(scrollback.BLOCK_LINES * 60))
+        spill_file = store._spill_file._file
+        in_memory = len(store) - store._spilled_lines
+
+        store.close()
+        self.assertTrue(spill_file.closed)
+        self.assertEqual(len(store), in_memory)
+        self.assertEqual(store.stats()["spilled_blocks"], 0)
+
+        # Lines over the budget are dropped from now on
+        store.extend(record(i) for i in range(scrollback.BLOCK_LINES * 60))
+        self.assertIsNone(store._spill_file)
+        self.assertLessEqual(store.memory(), 32 * 1024)
+
+
+class history_paging(unittest.TestCase):
+    def _screen(self, compact=True):
+        cls = pyte_terminal_emulator.CustomHistoryScreen
+        if not compact:
+            cls = type("ListHistoryScreen", (cls, ), {"compact": False})
+        screen = cls(12, 4, 0, 0.5, history_mb=1)
+        stream = pyte.Stream()
+        stream.attach(screen)
+        for i in range(1000):
+            stream.feed("\x1b[3%umline\x1b[0m %u\r\n" % (i % 8, i))
+        return screen
+
+    def test_page_through_whole_history(self):
+        for compact in (True, False):
+            screen = self._screen(compact)
+            bottom = screen.display
+            self.assertEqual(len(screen.history.top), 997)
+
+            seen = []
+            while screen.viewport < len(screen.history.top):
+                screen.prev_page()
+                seen.append(screen.view_text(0))
+            self.assertEqual(seen[-1], "line 0      ")
+            self.assertEqual(screen.view_line(0)[0].fg, "black")
+            self.assertEqual(screen.view_line(1)[0].fg, "red")
+            self.assertEqual(screen.view_runs(1)[0].fg, "red")
+            self.assertEqual(type(screen.buffer[0]) is list, not compact)
+
+            # The screen itself never changed
+            self.assertEqual(screen.display, bottom)
+            screen.scroll_to_bottom()
+            self.assertEqual(screen.viewport, 0)
+            self.assertEqual([screen.view_text(y) for y in range(4)], bottom)
+            self.assertEqual(len(screen.history.top), 997)
+
+
+class viewport(unittest.TestCase):
+    def setUp(self):
+        self.emulator = pyte_terminal_emulator.PyteTerminalEmulator(8, 4, 0, 0.5, history_mb=1)
+        self.emulator.feed(b"".join(("%u\r\n" % i).encode() for i in range(100)))
+        self.emulator.clear_dirty()
+
+    def test_scroll_by_line(self):
+        self.emulator.prev_line()
+        self.assertEqual(self.emulator.dirty_scrolls(), [(0, 3, -1)])
+        self.assertEqual(self.emulator.dirty_lines(), {0: "96      "})
+        self.assertEqual(self.emulator.display(), ["96      ", "97      ", "98      ", "99      "])
+        self.emulator.clear_dirty()
+
+        self.emulator.next_line()
+        self.assertEqual(self.emulator.dirty_scrolls(), [(0, 3, 1)])
+        self.assertEqual(self.emulator.dirty_lines(), {3: "        "})
+
+    def test_jump_to_bottom_damages_screen(self):
+        for _ in range(50):
+            self.emulator.prev_page()
+        self.assertEqual(self.emulator.display()[0], "0       ")
+        self.emulator.clear_dirty()
+
+        self.emulator.feed(b"x")
+        frame = self.emulator.take_frame()
+        self.assertEqual(frame.scrolls, ())
+        self.assertEqual(frame.lines, {0: "97      ", 1: "98      ", 2: "99      ",
+                                       3: "x       "})
+        self.assertEqual(frame.cursor, (3, 1))
+
+    def test_history_reflowed_when_scrolled_into_view(self):
+        emulator = pyte_terminal_emulator.PyteTerminalEmulator(8, 2, 0, 1, history_mb=1)
+        emulator.feed(b"".join(("%06uabcdefgh\r\n" % i).encode() for i in range(50)))
+        screen = emulator._screen
+        self.assertEqual(len(screen.history.top), 99)
+
+        emulator.resize(2, 16)
+        self.assertEqual(emulator.display(), ["000049abcdefgh  ", " " * 16])
+        self.assertEqual(screen._reflow_read, 0)
+
+        # Only the lines scrolled into view are reflowed
+        emulator.prev_page()
+        self.assertEqual(emulator.display(), ["000047abcdefgh  ", "000048abcdefgh  "])
+        self.assertEqual(screen._reflow_read, 2 * 2)
+        while screen.viewport < 49:
+            emulator.prev_line()
+        self.assertEqual(emulator.display()[0], "000000abcdefgh  ")
+        emulator.prev_page()
+        self.assertEqual(screen.viewport, 49)
+
+        # Lines scrolled off after the resize are read as they are
+        emulator.feed(b"new\r\n")
+        self.assertEqual(screen._same_width, 1)
+        emulator.prev_line()
+        self.assertEqual(emulator.display(), ["000049abcdefgh  ", "new             "])
+
+    def test_colors_of_history_rows(self):
+        self.emulator.feed(b"\x1b[31mred\x1b[0m\r\n" * 4)
+        self.emulator.prev_page()
+        self.assertEqual(self.emulator.display()[:2], ["99      ", "red     "])
+        self.assertEqual(self.emulator.color_map([0, 1, 2, 3]), {
+            row: {0: {"color": ("black", "red"), "field_length": 3}} for row in (1, 2, 3)
+        })
@@ -970,6 +970,9 @@ class SublimeViewStub(View):
         self._line_height = 20
         self._em_width = 10
         self._replace_calls = []
+        self._text = ""
+        self._regions = {}
+        self._add_regions_calls = []
 
     def settings(self):
         return self._settings
@@ -994,6 +997,36 @@ class SublimeViewStub(View):
 
     def replace(self, edit, region, str):
         self._replace_calls.append(ReplaceCall(region, str))
+        self._text = self._text[:region.begin()] + str + self._text[region.end():]
+
+    def insert(self, edit, pt, text):
+        self._text = self._text[:pt] + text + self._text[pt:]
+        return len(text)
+
+    def erase(self, edit, region):
+        self._text = self._text[:region.begin()] + self._text[region.end():]
+
+    def get_text(self):
+        return self._text
+
+    def size(self):
+        return len(self._text)
+
+    def add_regions(self, key, regions, scope="", icon="", flags=0):
+        self._add_regions_calls.append(key)
+        self._regions[key] = list(regions)
+
+    def get_regions(self, key):
+        return self._regions.get(key, [])
+
+    def erase_regions(self, key):
+        self._regions.pop(key, None)
+
+    def get_add_regions_calls(self):
+        return self._add_regions_calls
+
+    def clear_add_regions_calls(self):
+        self._add_regions_calls = []
 
     def get_replace_calls(self):
         return self._replace_calls
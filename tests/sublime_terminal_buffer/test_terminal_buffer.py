@@ -1,12 +1,16 @@
 """
 Unittests for the SublimeTerminalBuffer module
 """
+import random
+import threading
 import unittest
+from unittest import mock
 
 # Import sublime stub
 import sublime
 
 # Module to test
+from TerminalView import pyte_terminal_emulator
 from TerminalView import sublime_terminal_buffer
 
 
@@ -69,6 +73,250 @@ class line_updates(unittest.TestCase):
         self.assertEqual(replaces[1].content, self._expected_buffer_contents[2])
         self._test_view.clear_replace_calls()
 
+    def test_span_replace(self):
+        # Only the changed spans of line 1 should be replaced, line 3 has no
+        # spans and is replaced as a whole
+        lines = {
+            1: "  ab     c ",
+            3: "line 3     ",
+        }
+        spans = {
+            1: [(2, 4), (8, 11)],
+        }
+
+        self._expected_buffer_contents[1] = "  ab     c \n"
+        self._expected_buffer_contents[3] = "line 3     \n"
+        self._sublime_cmd._update_lines(None, lines, {}, spans)
+
+        # Check that local copy of buffer is correct
+        buffer_cache = self._sub_buffer.view_content_cache()
+        for i in range(5):
+            self.assertEqual(buffer_cache.get_line(i), self._expected_buffer_contents[i])
+
+        # Check that replace calls are done correctly
+        replaces = self._test_view.get_replace_calls()
+        self.assertEqual(len(replaces), 3)
+        self.assertEqual(replaces[0].region.a, 14)
+        self.assertEqual(replaces[0].region.b, 16)
+        self.assertEqual(replaces[0].content, "ab")
+        self.assertEqual(replaces[1].region.a, 20)
+        self.assertEqual(replaces[1].region.b, 23)
+        self.assertEqual(replaces[1].content, " c ")
+        self.assertEqual(replaces[2].region.a, 36)
+        self.assertEqual(replaces[2].region.b, 48)
+        self.assertEqual(replaces[2].content, self._expected_buffer_contents[3])
+        self._test_view.clear_replace_calls()
+
+
+class scroll_updates(unittest.TestCase):
+    def setUp(self):
+        self._test_view = sublime.SublimeViewStub(1)
+        self._sub_buffer = sublime_terminal_buffer.SublimeTerminalBuffer(self._test_view, "Title",
+                                                                         None)
+        self._sublime_cmd = sublime_terminal_buffer.TerminalViewUpdate(self._test_view)
+        self._sublime_cmd._sub_buffer = self._sub_buffer
+        self._emulator = self._sub_buffer.terminal_emulator()
+        self._emulator.resize(5, 10)
+
+    def _update(self):
+        # Same steps as the update command without the cursor handling
+        dirty_lines = self._emulator.dirty_lines()
+        scrolls = self._emulator.dirty_scrolls()
+        self._sublime_cmd._scroll_lines(None, scrolls)
+        self._sublime_cmd._update_lines(None, dirty_lines, {}, self._emulator.dirty_spans())
+        self._emulator.clear_dirty()
+        return scrolls
+
+    def _assert_view_matches_display(self):
+        expected = "".join(line + "\n" for line in self._emulator.display())
+        self.assertEqual(self._test_view.get_text(), expected)
+
+    def test_scroll_up(self):
+        self._emulator.feed(b"1\r\n2\r\n3\r\n4\r\n5")
+        self.assertEqual(self._update(), [])
+        self._assert_view_matches_display()
+        self._test_view.clear_replace_calls()
+
+        self._emulator.feed(b"\r\n6\r\n7")
+        self.assertEqual(self._update(), [(0, 4, 2)])
+        self._assert_view_matches_display()
+
+        # Only the two lines scrolled in are written
+        replaces = self._test_view.get_replace_calls()
+        self.assertEqual([r.content for r in replaces], ["6         \n", "7         \n"])
+
+    def test_scroll_regions(self):
+        self._emulator.feed(b"1\r\n2\r\n3\r\n4\r\n5")
+        self._update()
+
+        # Reverse index in a scroll region and delete a line
+        self._emulator.feed(b"\x1b[2;4r\x1b[2;1H\x1bMa\x1b[3;1H\x1b[Mb\x1b[r")
+        self.assertEqual(self._update(), [(1, 3, -1), (2, 3, 1)])
+        self._assert_view_matches_display()
+
+
+class color_updates(unittest.TestCase):
+    def setUp(self):
+        self._test_view = sublime.SublimeViewStub(1)
+        self._sub_buffer = sublime_terminal_buffer.SublimeTerminalBuffer(self._test_view, "Title",
+                                                                         None)
+        self._sublime_cmd = sublime_terminal_buffer.TerminalViewUpdate(self._test_view)
+        self._sublime_cmd._sub_buffer = self._sub_buffer
+
+        lines = {}
+        for i in range(3):
+            lines[i] = " " * 11
+        self._sublime_cmd._update_lines(None, lines, {})
+
+    def _regions(self, scope):
+        return [(r.a, r.b) for r in self._test_view.get_regions(scope)]
+
+    def test_one_add_regions_call_per_color(self):
+        red = {"color": ("red", "black"), "field_length": 2}
+        blue = {"color": ("blue", "black"), "field_length": 3}
+        lines = {0: "ab  cde    ", 2: "fg         "}
+        color_map = {0: {0: red, 4: blue}, 2: {0: red}}
+        self._sublime_cmd._update_lines(None, lines, color_map)
+
+        calls = self._test_view.get_add_regions_calls()
+        self.assertEqual(sorted(calls), ["terminalview.blue_black", "terminalview.red_black"])
+        self.assertEqual(self._regions("terminalview.red_black"), [(0, 2), (24, 26)])
+        self.assertEqual(self._regions("terminalview.blue_black"), [(4, 7)])
+        self._test_view.clear_add_regions_calls()
+
+        # Only the color that changed is added again
+        color_map = {0: {0: red, 4: blue}, 2: {0: dict(red, field_length=1)}}
+        self._sublime_cmd._update_lines(None, {2: "f          "}, color_map)
+        self.assertEqual(self._test_view.get_add_regions_calls(), ["terminalview.red_black"])
+        self.assertEqual(self._regions("terminalview.red_black"), [(0, 2), (24, 25)])
+
+        # Colors without any fields left are erased
+        self._sublime_cmd._update_lines(None, {0: " " * 11}, {})
+        self.assertEqual(self._regions("terminalview.blue_black"), [])
+
+
+class frame_updates(unittest.TestCase):
+    def _make_buffer(self):
+        view = sublime.SublimeViewStub(1)
+        sub_buffer = sublime_terminal_buffer.SublimeTerminalBuffer(view, "Title", None)
+        cmd = sublime_terminal_buffer.TerminalViewUpdate(view)
+        cmd._sub_buffer = sub_buffer
+        sub_buffer.terminal_emulator().resize(5, 10)
+        return view, sub_buffer, cmd
+
+    def _render(self, cmd, frame):
+        # Same steps as the update command without the cursor handling
+        cmd._scroll_lines(None, frame.scrolls)
+        if frame.truncate is not None:
+            cmd._truncate_lines(None, frame.truncate)
+        cmd._update_lines(None, frame.lines, frame.colors, frame.spans)
+
+    def test_pending_frames_are_merged(self):
+        view, sub_buffer, _ = self._make_buffer()
+        emulator = sub_buffer.terminal_emulator()
+        sub_buffer.update_view()
+        emulator.feed(b"a")
+        sub_buffer.update_view()
+        emulator.feed(b"\r\nb")
+        sub_buffer.update_view()
+
+        frame = sub_buffer.pop_frame()
+        self.assertEqual(frame.lines[0], "a         ")
+        self.assertEqual(frame.lines[1], "b         ")
+        self.assertIsNone(sub_buffer.pop_frame())
+        self.assertEqual(sub_buffer.frame_stats(), {"frames": 3, "dropped": 2})
+
+    def test_busy_emulator_is_not_waited_for(self):
+        view, sub_buffer, _ = self._make_buffer()
+        sub_buffer.update_view()
+        sub_buffer.pop_frame()
+        sub_buffer.terminal_emulator().feed(b"a")
+
+        # Hold the emulator lock in another thread like the parser does
+        locked = threading.Event()
+        release = threading.Event()
+
+        def parser():
+            with sub_buffer._emulator_lock:
+                locked.set()
+                release.wait()
+        thread = threading.Thread(target=parser)
+        thread.start()
+        locked.wait()
+
+        sub_buffer.update_view()
+        sub_buffer.update_terminal_size(4, 10)
+        self.assertIsNone(sub_buffer.pop_frame())
+        self.assertEqual(sub_buffer.terminal_emulator().nb_lines(), 5)
+        release.set()
+        thread.join()
+
+        # The parser does what was requested once done with its batch
+        sub_buffer.insert_data(b"b")
+        frame = sub_buffer.pop_frame()
+        self.assertEqual(frame.lines[0], "ab        ")
+        self.assertEqual(sub_buffer.terminal_emulator().nb_lines(), 4)
+
+    def test_last_frame_is_rendered_after_deactivate(self):
+        view = sublime.SublimeViewStub(7)
+        sub_buffer = sublime_terminal_buffer.SublimeTerminalBuffer(view, "Title", None)
+        sub_buffer.terminal_emulator().resize(5, 10)
+
+        # Run the UI callbacks only once the buffer was deactivated, like when
+        # the shell exits while the UI thread is busy
+        callbacks = []
+        cmd = sublime_terminal_buffer.TerminalViewUpdate(view)
+        cmd._update_viewport_position = lambda: None
+        cmd._update_cursor = lambda cursor: None
+        view.is_valid = lambda: True
+        view.run_command = lambda name: cmd.run(None)
+        timeout = mock.patch.object(sublime, "set_timeout",
+                                    lambda func, timeout_ms=0: callbacks.append(func))
+        with timeout:
+            sub_buffer.insert_data(b"hi")
+            sub_buffer.deactivate()
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(view.get_text().split("\n")[0], "hi        ")
+        with self.assertRaises(Exception):
+            sublime_terminal_buffer.SublimeBufferManager.load_from_id(view.id())
+
+    def test_merged_frames_render_the_same(self):
+        pieces = [b"abc", b"\r\n", b"\x1b[31mred\x1b[0m", b"\x1b[2;4r", b"\x1b[r",
+                  b"\x1bM", b"\x1b[2M", b"\x1b[L", b"\x1b[3;2H", b"\x1b[K", b"\x1b[2J",
+                  b"\x1b[44m  \x1b[0m", b"0123456789xyz", b"\x1b[P", b"\x1b[2@"]
+        for seed in range(20):
+            random.seed(seed)
+            view, sub_buffer, cmd = self._make_buffer()
+            merged_view, merged_buffer, merged_cmd = self._make_buffer()
+            emulator = sub_buffer.terminal_emulator()
+            pending = None
+            for i in range(30):
+                emulator.feed(b"".join(random.choice(pieces) for _ in range(random.randint(1, 4))))
+                if i == 15:
+                    emulator.resize(3, 10)
+                frame = emulator.take_frame()
+                self._render(cmd, frame)
+                if pending is None:
+                    pending = frame
+                else:
+                    pending = pyte_terminal_emulator.merge_frames(pending, frame)
+                if random.random() < 0.3:
+                    self._render(merged_cmd, pending)
+                    pending = None
+            if pending is not None:
+                self._render(merged_cmd, pending)
+
+            expected = "".join(line + "\n" for line in emulator.display())
+            self.assertEqual(view.get_text(), expected)
+            self.assertEqual(merged_view.get_text(), expected)
+
+            def regions(view):
+                return dict((key, [(r.a, r.b) for r in value])
+                            for key, value in view._regions.items() if value)
+            self.assertEqual(regions(merged_view), regions(view))
+
 
 class terminal_buffer(unittest.TestCase):
     def test_view_size(self):
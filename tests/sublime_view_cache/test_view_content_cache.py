@@ -0,0 +1,39 @@
+"""
+Unittests for the SublimeViewContentCache line offsets
+"""
+import unittest
+
+from TerminalView import sublime_view_cache
+
+
+class line_start_points(unittest.TestCase):
+    def setUp(self):
+        self._cache = sublime_view_cache.SublimeViewContentCache()
+        for i in range(5):
+            self._cache.update_line(i, "line %i\n" % i)
+
+    def test_start_and_end_points(self):
+        for i in range(5):
+            self.assertEqual(self._cache.get_line_start_and_end_points(i), (i * 7, i * 7 + 7))
+
+        # Lines after the last cached line start at the end of the content
+        self.assertEqual(self._cache.get_line_start_and_end_points(7), (35, 35))
+
+    def test_update_line_length(self):
+        self._cache.get_line_start_and_end_points(4)
+        self._cache.update_line(1, "longer line 1\n")
+        self.assertEqual(self._cache.get_line_start_and_end_points(1), (7, 21))
+        self.assertEqual(self._cache.get_line_start_and_end_points(4), (35, 42))
+
+    def test_delete_line(self):
+        self._cache.get_line_start_and_end_points(4)
+        self._cache.delete_line(0)
+        self.assertEqual(self._cache.get_line_start_and_end_points(0), (0, 0))
+        self.assertEqual(self._cache.get_line_start_and_end_points(4), (21, 28))
+
+    def test_scroll_lines(self):
+        self._cache.get_line_start_and_end_points(4)
+        self._cache.scroll_lines(1, 4, 2)
+        self.assertEqual(self._cache.get_line(1), "line 3\n")
+        self.assertEqual(self._cache.get_line(3), "\n")
+        self.assertEqual(self._cache.get_line_start_and_end_points(4), (22, 23))
@@ -0,0 +1,61 @@
+"""
+Unittests for the SublimeViewRegionCache color grouping
+"""
+import unittest
+
+from TerminalView import sublime_view_cache
+
+
+def _field(color, length):
+    return {"color": color, "field_length": length}
+
+
+class color_regions(unittest.TestCase):
+    def setUp(self):
+        self._cache = sublime_view_cache.SublimeViewRegionCache()
+        self._cache.set_line_colors(0, {0: _field(("red", "black"), 3)})
+        self._cache.set_line_colors(2, {1: _field(("red", "black"), 2),
+                                        5: _field(("green", "black"), 4)})
+
+    def test_fields_grouped_by_color(self):
+        self.assertEqual(self._cache.pop_dirty_colors(), {
+            ("red", "black"): [(0, 0, 3), (2, 1, 2)],
+            ("green", "black"): [(2, 5, 4)],
+        })
+
+        # Nothing is dirty after popping
+        self.assertEqual(self._cache.pop_dirty_colors(), {})
+
+    def test_unchanged_colors_are_not_dirty(self):
+        self._cache.pop_dirty_colors()
+        self._cache.set_line_colors(0, {0: _field(("red", "black"), 3)})
+        self.assertEqual(self._cache.pop_dirty_colors(), {})
+
+        # Only the colors on the changed line are dirty
+        self._cache.set_line_colors(0, {0: _field(("red", "black"), 4)})
+        self.assertEqual(self._cache.pop_dirty_colors(), {
+            ("red", "black"): [(0, 0, 4), (2, 1, 2)],
+        })
+
+    def test_removed_color(self):
+        self._cache.pop_dirty_colors()
+        self._cache.set_line_colors(2, {})
+        self.assertEqual(self._cache.get_line_colors(2), {})
+
+        # A color without fields left has an empty list so it can be erased
+        self.assertEqual(self._cache.pop_dirty_colors(), {
+            ("red", "black"): [(0, 0, 3)],
+            ("green", "black"): [],
+        })
+
+    def test_scroll_lines(self):
+        self._cache.pop_dirty_colors()
+        self._cache.scroll_lines(0, 3, 2)
+        self.assertEqual(self._cache.get_line_colors(0), {1: _field(("red", "black"), 2),
+                                                          5: _field(("green", "black"), 4)})
+        self.assertEqual(self._cache.get_line_colors(2), {})
+
+        # Line 0 was scrolled out so its color has to be redone
+        self.assertEqual(self._cache.pop_dirty_colors(), {
+            ("red", "black"): [(0, 1, 2)],
+        })
@@ -1,6 +1,7 @@
 import unittest
 
 from TerminalView import pyte_terminal_emulator
+from TerminalView.pyte.screens import CompactLine
 
 class terminal_resize(unittest.TestCase):
     def test_lines_resize(self):
@@ -46,6 +47,35 @@ class terminal_resize(unittest.TestCase):
         for i in range(len(display)):
             self.assertEqual(display[i], lines[i+1].ljust(nb_cols))
 
+    def test_narrow_rewraps_lines(self):
+        emulator = pyte_terminal_emulator.PyteTerminalEmulator(cols=10, lines=4, history=100,
+                                                               ratio=0.5)
+        emulator.feed(b"0123456789abcdef\r\n$ ls")
+        emulator.resize(4, 6)
+        self.assertEqual(emulator.display(), ["012345", "6789ab", "cdef  ", "$ ls  "])
+        self.assertEqual(emulator.cursor(), (3, 4))
+        self.assertEqual(emulator._screen.wrapped, [True, True, False, False])
+
+        # Widening again joins the wrapped lines
+        emulator.resize(4, 20)
+        self.assertEqual(emulator.display(), ["0123456789abcdef    ", "$ ls                ",
+                                              " " * 20, " " * 20])
+        self.assertEqual(emulator.cursor(), (1, 4))
+
+    def test_rows_that_do_not_fit_go_to_history(self):
+        emulator = pyte_terminal_emulator.PyteTerminalEmulator(cols=8, lines=3, history=100,
+                                                               ratio=0.5)
+        emulator.feed(b"first\r\nabcdefghijkl\r\n$ ")
+        emulator.resize(3, 4)
+        self.assertEqual(emulator.display(), ["efgh", "ijkl", "$   "])
+        history = emulator._screen.history.top
+        self.assertEqual(len(history), 2)
+        self.assertTrue(pyte_terminal_emulator.is_wrapped(history[-1]))
+
+        emulator.prev_page()
+        emulator.prev_page()
+        self.assertEqual(emulator.display(), ["firs", "t   ", "abcd"])
+
 
 class pyte_buffer_to_color_map(unittest.TestCase):
     def test_no_colors(self):
@@ -208,6 +238,107 @@ class pyte_buffer_to_color_map(unittest.TestCase):
         self.assertDictEqual(color_map, expected)
 
 
+class attribute_runs_to_color_map(unittest.TestCase):
+    def test_same_as_buffer(self):
+        emulator = pyte_terminal_emulator.PyteTerminalEmulator(cols=20, lines=5, history=100,
+                                                               ratio=0.5)
+        emulator.feed(b"\x1b[31mred\x1b[0m plain \x1b[7mreverse\x1b[27m\r\n")
+        emulator.feed(b"\x1b[44;37mwhite on blue\x1b[0m\x1b[37m white\r\n")
+        emulator.feed(b"\x1b[7m\x1b[2K\x1b[0m\r\n\x1b[32;42mx\x1b[4;20H\x1b[1@")
+
+        lines = range(5)
+        expected = pyte_terminal_emulator.convert_pyte_buffer_to_colormap(emulator._screen.buffer,
+                                                                          lines)
+        self.assertEqual(emulator.color_map(lines), expected)
+
+    def test_runs_with_same_color_are_combined(self):
+        emulator = pyte_terminal_emulator.PyteTerminalEmulator(cols=10, lines=2, history=100,
+                                                               ratio=0.5)
+
+        # Explicit white on black is the same color as the defaults
+        emulator.feed(b"\x1b[41mab\x1b[1mcd\x1b[0m\x1b[37;40mef")
+        self.assertEqual(emulator.color_map([0, 1, 7]), {
+            0: {0: {"color": ("red", "white"), "field_length": 4}},
+        })
+
+
+class reverse_video(unittest.TestCase):
+    def test_lines_stay_compact(self):
+        emulator = pyte_terminal_emulator.PyteTerminalEmulator(cols=10, lines=3, history=100,
+                                                               ratio=0.5)
+        screen = emulator._screen
+        emulator.feed(b"\x1b[31mred\x1b[0m\r\nplain")
+        lines = list(screen.buffer)
+
+        emulator.feed(b"\x1b[?5h")
+        self.assertTrue(all(line is row for line, row in zip(lines, screen.buffer)))
+        self.assertTrue(all(char.reverse for line in screen.buffer for char in line))
+        self.assertEqual((screen.buffer[0][0].data, screen.buffer[0][0].fg), ("r", "red"))
+
+        emulator.feed(b"\x1b[2J\x1b[K\x1b[?5l")
+        for line in screen.buffer:
+            self.assertIsInstance(line, CompactLine)
+            self.assertFalse(any(char.reverse for char in line))
+        self.assertEqual(emulator.display(), [" " * 10] * 3)
+        lines = range(3)
+        expected = pyte_terminal_emulator.convert_pyte_buffer_to_colormap(screen.buffer, lines)
+        self.assertEqual(emulator.color_map(lines), expected)
+
+
+class frames(unittest.TestCase):
+    def setUp(self):
+        self._emulator = pyte_terminal_emulator.PyteTerminalEmulator(cols=10, lines=4,
+                                                                     history=100, ratio=0.5)
+        self._emulator.take_frame()
+
+    def test_take_frame(self):
+        self._emulator.feed(b"ab\x1b[31mc\x1b[0m")
+        frame = self._emulator.take_frame()
+        self.assertEqual(frame.lines, {0: "abc       "})
+        self.assertEqual(frame.spans, {0: [(0, 3)]})
+        self.assertEqual(frame.colors, {0: {2: {"color": ("black", "red"), "field_length": 1}}})
+        self.assertEqual(frame.cursor, (0, 3))
+        self.assertIsNone(frame.truncate)
+
+        # The emulator is clean after taking a frame and the frame is not
+        # changed by more output
+        self.assertFalse(self._emulator.modified())
+        self._emulator.feed(b"d")
+        self.assertEqual(frame.lines, {0: "abc       "})
+        self.assertEqual(self._emulator.take_frame(colors=False).colors, {})
+
+    def test_shrink(self):
+        self._emulator.resize(2, 10)
+        self._emulator.resize(3, 10)
+        self.assertEqual(self._emulator.take_frame().truncate, 2)
+        self.assertIsNone(self._emulator.take_frame().truncate)
+
+    def test_merge_scrolled_lines(self):
+        self._emulator.feed(b"1\r\n2\r\n3\r\n4")
+        older = self._emulator.take_frame()
+        self._emulator.feed(b"\r\n5")
+        newer = self._emulator.take_frame()
+        self.assertEqual(newer.scrolls, ((0, 3, 1), ))
+
+        merged = pyte_terminal_emulator.merge_frames(older, newer)
+        self.assertEqual(merged.scrolls, ((0, 3, 1), ))
+        self.assertEqual(merged.lines, {0: "2         ", 1: "3         ",
+                                        2: "4         ", 3: "5         "})
+        self.assertEqual(merged.cursor, newer.cursor)
+
+    def test_merge_spans_and_colors(self):
+        Frame = pyte_terminal_emulator.Frame
+        red = {0: {"color": ("black", "red"), "field_length": 1}}
+        older = Frame({0: "a", 1: "b", 2: "c"}, {0: [(0, 2)], 1: [(4, 6)]}, (), 3,
+                      {0: red, 1: red}, (0, 0), None)
+        newer = Frame({0: "d", 1: "e"}, {0: [(1, 3), (5, 6)]}, (), None, {}, (1, 1), None)
+        merged = pyte_terminal_emulator.merge_frames(older, newer)
+        self.assertEqual(merged.lines, {0: "d", 1: "e", 2: "c"})
+        self.assertEqual(merged.spans, {0: [(0, 3), (5, 6)]})
+        self.assertEqual(merged.colors, {})
+        self.assertEqual(merged.truncate, 3)
+
+
 class PyteBufferStubFactory():
     def __init__(self, nb_lines, nb_cols):
         default_char = CharStub("default", "default", reverse=False)
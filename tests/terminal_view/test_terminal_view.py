@@ -0,0 +1,116 @@
+"""
+Unittests for the shell output pipeline of a terminal view
+"""
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+# Module to test
+from TerminalView import TerminalView
+from TerminalView import io_hub
+from TerminalView import linux_pty
+from TerminalView import output_ring
+
+
+class RecordingBuffer():
+    """
+    Terminal buffer keeping all data fed to it, the first feed is held back
+    until the release event is set
+    """
+    def __init__(self):
+        self.data = bytearray()
+        self.release = threading.Event()
+
+    def insert_data(self, data):
+        self.release.wait(5)
+        self.data += data
+
+    def update_view(self):
+        pass
+
+    def update_terminal_size(self, nb_rows, nb_cols):
+        pass
+
+    def view_size(self):
+        return (24, 80)
+
+    def is_open(self):
+        return True
+
+    def frame_stats(self):
+        return {}
+
+
+class RecordingTerminalView(TerminalView.TerminalView):
+    def __init__(self, cmd):
+        self._shell = linux_pty.LinuxPty(cmd, os.getcwd())
+        self._terminal_buffer = RecordingBuffer()
+        self._view_closed = False
+        self._terminal_rows = 0
+        self._terminal_columns = 0
+        self._start_time = time.time()
+        self.stopped = threading.Event()
+        self._start_output_pipeline()
+
+    def on_tick(self):
+        running = self._shell.is_running()
+        result = super().on_tick()
+        if not running:
+            # Let the parser go once the shell exit was noticed
+            self._terminal_buffer.release.set()
+        return result
+
+    def _show_close_message_in_terminal(self, run_time):
+        pass
+
+    def _stop(self):
+        self._shell.stop()
+        self.stopped.set()
+
+
+def wait_for(condition, timeout=5.0):
+    end = time.time() + timeout
+    while not condition():
+        if time.time() > end:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+class output_pipeline(unittest.TestCase):
+    def test_output_is_drained_after_exit(self):
+        # The ring is full when the shell exits, the rest is still in the PTY
+        script = "import sys; sys.stdout.write('x' * 19999 + 'E')"
+        with mock.patch.object(TerminalView, "OUTPUT_RING_SIZE", 2**13):
+            terminal_view = RecordingTerminalView([sys.executable, "-c", script])
+        self.assertTrue(terminal_view.stopped.wait(10))
+
+        data = terminal_view._terminal_buffer.data
+        self.assertEqual(len(data), 20000)
+        self.assertEqual(data[-1:], b"E")
+
+    def test_threads_are_shared(self):
+        hub = io_hub.get_hub()
+        parser = output_ring.get_parser()
+        self.assertTrue(wait_for(lambda: hub._thread is None and parser._thread is None))
+        nb_threads = threading.active_count()
+
+        terminal_views = [RecordingTerminalView(["/bin/cat"]) for _ in range(10)]
+        for terminal_view in terminal_views:
+            terminal_view._terminal_buffer.release.set()
+            terminal_view._shell.send_string("%u\n" % (id(terminal_view), ))
+        for terminal_view in terminal_views:
+            self.assertTrue(wait_for(lambda: str(id(terminal_view)).encode() in
+                                     terminal_view._terminal_buffer.data))
+
+        # One I/O thread and one parser thread however many terminals there are
+        self.assertEqual(threading.active_count(), nb_threads + 2)
+
+        for terminal_view in terminal_views:
+            terminal_view.view_closed()
+        for terminal_view in terminal_views:
+            self.assertTrue(terminal_view.stopped.wait(5))
+        self.assertTrue(wait_for(lambda: hub._thread is None and parser._thread is None))
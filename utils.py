@@ -2,8 +2,14 @@
 Some utility functions for the TerminalView plugin
 """
 import time
-import sublime
-import sublime_plugin
+
+try:
+    import sublime
+    import sublime_plugin
+except ImportError:
+    # Terminal worker processes run outside of Sublime Text, they enable the
+    # logger themselves
+    sublime = None
 
 
 class ConsoleLogger():